@@ -0,0 +1,190 @@
+"""
+Async Workflow Driver for AI Product Imagery Workflow
+
+Runs a workflow's stages as coroutines so many products can be in flight
+on one event loop. Stages with an async variant (`_astage_<name>`: ghost
+image fetch on httpx, vision analysis and generation on the async Gemini
+client) are awaited directly; the rest (lookup, compose, audit) are the
+same `_stage_<name>` methods run() uses, executed on a worker thread so
+they never block the loop.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+from timing import arun_stage, run_stage, summarize_timings
+from usage import load_pricing, summarize_usage
+from write_behind import reconcile_writes
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    print("Warning: httpx not installed, async image downloads use threads. Run: pip install httpx")
+
+
+def _http_client() -> Optional["httpx.AsyncClient"]:
+    """Shared async HTTP client for image downloads (None without httpx)."""
+    if not HTTPX_AVAILABLE:
+        return None
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    )
+
+
+async def _run_context(workflow, ctx: dict, queue_seconds: float = 0.0) -> dict:
+    """Run every stage for one context (queue_seconds: wait before the first stage)."""
+    for stage in workflow.PIPELINE_STAGES:
+        if ctx.get('done'):
+            break
+        async_stage = getattr(workflow, f"_astage_{stage}", None)
+        if async_stage:
+            ctx = await arun_stage(ctx, stage, async_stage, queue_seconds)
+        else:
+            ctx = await asyncio.to_thread(run_stage, ctx, stage, getattr(workflow, f"_stage_{stage}"), queue_seconds)
+        queue_seconds = 0.0
+    return ctx
+
+
+async def arun_workflow(
+    workflow,
+    product_id: str,
+    skip_vision: bool = False,
+    verbose: bool = False,
+    http=None,
+    **kwargs
+) -> dict:
+    """
+    Async equivalent of workflow.run() for a single product.
+
+    Args:
+        workflow: ProductImageryWorkflow or ProductImageryWorkflowV2
+        product_id: SKU or cupidName
+        skip_vision: Skip ghost image analysis
+        verbose: Print detailed progress
+        http: Shared httpx.AsyncClient (one is created if omitted)
+        **kwargs: Same options as run() (selected_ghost_urls, defer_flush)
+
+    Returns:
+        Result dict with generated image paths and metadata
+    """
+    ctx = workflow._new_context(product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+
+    owned_http = _http_client() if http is None else None
+    ctx['http'] = http or owned_http
+    try:
+        ctx = await _run_context(workflow, ctx)
+    finally:
+        ctx.pop('http', None)
+        if owned_http:
+            await owned_http.aclose()
+
+    return workflow._finish_context(ctx)
+
+
+async def abatch_run_workflow(
+    workflow,
+    product_ids: list[str],
+    max_concurrency: int = 8,
+    verbose: bool = False,
+    stop_on_error: bool = False,
+    skip_vision: bool = False
+) -> dict:
+    """
+    Async equivalent of workflow.batch_run().
+
+    At most max_concurrency products are in flight at once. If the caller
+    is cancelled, every in-flight product is cancelled and already-queued
+    writes are flushed before CancelledError propagates. With
+    stop_on_error, the first failure cancels the products not yet finished.
+
+    Returns:
+        Batch result with summary and individual results
+    """
+    batch_result = {
+        'total': len(product_ids),
+        'success': 0,
+        'failed': 0,
+        'cancelled': 0,
+        'results': [],
+        'max_concurrency': max_concurrency,
+        'timestamp': datetime.now().isoformat()
+    }
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    contexts = [
+        workflow._new_context(product_id, skip_vision=skip_vision, defer_flush=True)
+        for product_id in product_ids
+    ]
+
+    async def run_one(ctx: dict) -> dict:
+        queued_at = time.monotonic()
+        async with semaphore:
+            try:
+                return await _run_context(workflow, ctx, queue_seconds=time.monotonic() - queued_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                ctx['result']['errors'].append(f"Product failed: {e}")
+                ctx['done'] = True
+                return ctx
+
+    http = _http_client()
+    for ctx in contexts:
+        ctx['http'] = http
+
+    tasks = [asyncio.create_task(run_one(ctx)) for ctx in contexts]
+    finished = 0
+    stopping = False
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                ctx = await next_done
+            except asyncio.CancelledError:
+                # Products cancelled by stop_on_error are expected; anything
+                # else means the caller was cancelled
+                if not stopping:
+                    raise
+                continue
+
+            finished += 1
+            result = workflow._finish_context(ctx)
+            if verbose:
+                status = f"✓ {len(result['images'])} image(s)" if result['success'] else f"✗ {result['errors']}"
+                print(f"[{finished}/{len(product_ids)}] {result['product_id']}: {status}")
+
+            if stop_on_error and not result['success']:
+                if verbose:
+                    print(f"Stopping due to error: {result['errors']}")
+                stopping = True
+                for task in tasks:
+                    task.cancel()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if http:
+            await http.aclose()
+        # Whatever was generated before a stop or cancel still lands on disk
+        await asyncio.to_thread(workflow.generator.flush)
+
+    for task, ctx in zip(tasks, contexts):
+        ctx.pop('http', None)
+        result = ctx['result']
+        if task.cancelled():
+            result['errors'].append('Cancelled')
+            batch_result['cancelled'] += 1
+        reconcile_writes(result, verbose=verbose)
+        batch_result['results'].append(workflow._finish_context(ctx))
+        if result['success']:
+            batch_result['success'] += 1
+        else:
+            batch_result['failed'] += 1
+
+    batch_result['timing'] = summarize_timings(batch_result['results'])
+    batch_result['usage'] = summarize_usage(batch_result['results'], load_pricing(workflow.config))
+    return batch_result
@@ -0,0 +1,333 @@
+"""
+Batch Journal for AI Product Imagery Workflow
+
+Append-only JSONL record of a batch run, one file per batch under
+output/jobs/batches/<batch_id>.jsonl. It records:
+
+    batch      product list and engine when the batch starts
+    stage      a product finished a stage (with the data needed to skip it)
+    variation  a variation was saved under its idempotency key
+    product    a product finished (success, images, errors)
+
+`--resume <batch_id>` replays the file: finished products are skipped,
+vision and compose results are restored instead of recomputed, and a
+variation whose idempotency key is already on disk (journal or audit log)
+is reused instead of generated and saved again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+
+# Context fields restored on resume so a stage can be skipped
+STAGE_CHECKPOINTS = {
+    'vision': ('visible_features', 'reference_urls'),
+    'compose': ('constraints', 'scene_templates', 'prompts'),
+}
+
+
+def idempotency_key(
+    batch_id: str,
+    cupid_name: str,
+    variation_index: int,
+    positive_prompt: str,
+    negative_prompt: str
+) -> str:
+    """Stable key for one variation of one product within a batch."""
+    raw = f"{batch_id}\0{cupid_name}\0{variation_index}\0{positive_prompt}\0{negative_prompt}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def _saved(path: Optional[str]) -> bool:
+    """True if an output file exists and is not an empty counter reservation."""
+    try:
+        return bool(path) and os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+class BatchJournal:
+    """Append-only journal of one batch run."""
+
+    def __init__(self, batch_id: str, journal_dir: str = "./output/jobs/batches"):
+        """
+        Initialize journal.
+
+        Args:
+            batch_id: Batch identifier (file name stem)
+            journal_dir: Directory holding <batch_id>.jsonl files
+        """
+        self.batch_id = batch_id
+        self.path = Path(journal_dir) / f"{batch_id}.jsonl"
+        self.resumed = False
+
+        self.product_ids: list[str] = []
+        self.meta: dict = {}
+        self._products: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(
+        cls,
+        product_ids: list[str],
+        journal_dir: str = "./output/jobs/batches",
+        **meta
+    ) -> "BatchJournal":
+        """Create a journal for a new batch."""
+        batch_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        journal = cls(batch_id, journal_dir)
+        journal.product_ids = list(product_ids)
+        journal.meta = meta
+        journal._append({'op': 'batch', 'product_ids': journal.product_ids, **meta})
+        return journal
+
+    @classmethod
+    def load(cls, batch_id: str, journal_dir: str = "./output/jobs/batches") -> "BatchJournal":
+        """
+        Read an existing batch journal without resuming it.
+
+        Raises:
+            FileNotFoundError: If no journal exists for batch_id
+        """
+        journal = cls(batch_id, journal_dir)
+        if not journal.path.exists():
+            raise FileNotFoundError(f"No batch journal for {batch_id} in {journal_dir}")
+        journal._replay()
+        return journal
+
+    @classmethod
+    def resume(cls, batch_id: str, journal_dir: str = "./output/jobs/batches") -> "BatchJournal":
+        """
+        Load an existing batch journal for resuming.
+
+        Raises:
+            FileNotFoundError: If no journal exists for batch_id
+        """
+        journal = cls.load(batch_id, journal_dir)
+        journal.resumed = True
+        journal._append({'op': 'resume'})
+        return journal
+
+    def _append(self, event: dict) -> None:
+        """Append one event line (single O_APPEND write)."""
+        event = {**event, 'at': datetime.now().isoformat()}
+        line = (json.dumps(event) + "\n").encode('utf-8')
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def _product(self, product_id: str) -> dict:
+        """Replayed state for a product (caller holds the lock or is replaying)."""
+        return self._products.setdefault(product_id, {
+            'stages': {},
+            'variations': {},
+            'result': None,
+        })
+
+    def _replay(self) -> None:
+        """Rebuild state from the event file."""
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from the crash being recovered from
+                    continue
+
+                op = event.get('op')
+                if op == 'batch':
+                    self.product_ids = event.get('product_ids', [])
+                    self.meta = {k: v for k, v in event.items() if k not in ('op', 'product_ids', 'at')}
+                elif op == 'stage':
+                    self._product(event['product_id'])['stages'][event['stage']] = event.get('checkpoint', {})
+                elif op == 'variation':
+                    self._product(event['product_id'])['variations'][event['key']] = {
+                        'path': event.get('path'),
+                        'metadata_path': event.get('metadata_path'),
+                    }
+                elif op == 'product':
+                    self._product(event['product_id'])['result'] = {
+                        k: event.get(k) for k in ('success', 'images', 'errors')
+                    }
+
+    def finished_result(self, product_id: str) -> Optional[dict]:
+        """Recorded result of a product that completed without errors and whose images are all on disk."""
+        with self._lock:
+            result = self._products.get(product_id, {}).get('result')
+        if (result and result.get('success') and not result.get('errors')
+                and all(_saved(p) for p in result.get('images', []))):
+            return result
+        return None
+
+    def wrap_stage(self, name: str, fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+        """
+        Wrap a workflow stage so it is journaled, and skipped on resume when
+        its checkpoint can be restored.
+        """
+        checkpoint_keys = STAGE_CHECKPOINTS.get(name)
+
+        def run_stage(ctx: dict) -> dict:
+            if checkpoint_keys is not None:
+                with self._lock:
+                    checkpoint = self._products.get(ctx['product_id'], {}).get('stages', {}).get(name)
+                if checkpoint is not None:
+                    self._restore(ctx, checkpoint)
+                    return ctx
+
+            ctx = fn(ctx)
+            if not ctx.get('done'):
+                self.record_stage(ctx, name)
+            return ctx
+
+        return run_stage
+
+    def record_stage(self, ctx: dict, name: str) -> None:
+        """Record a completed stage with its checkpoint data."""
+        checkpoint = {}
+        for key in STAGE_CHECKPOINTS.get(name, ()):
+            checkpoint[key] = ctx['result'][key] if key == 'prompts' else ctx.get(key)
+
+        with self._lock:
+            self._product(ctx['product_id'])['stages'][name] = checkpoint
+        self._append({'op': 'stage', 'product_id': ctx['product_id'], 'stage': name, 'checkpoint': checkpoint})
+
+    @staticmethod
+    def _restore(ctx: dict, checkpoint: dict) -> None:
+        """Put checkpointed stage output back on the context."""
+        for key, value in checkpoint.items():
+            if key == 'prompts':
+                ctx['result']['prompts'] = value
+            else:
+                ctx[key] = value
+
+        # Reference bytes are not journaled; they come from the fetch stage
+        if 'reference_urls' in checkpoint:
+            ctx['reference_images'] = [
+                ctx['images'][url] for url in checkpoint['reference_urls'] if ctx.get('images', {}).get(url)
+            ]
+            ctx['images'] = {}
+
+    def replay_variation(self, product_id: str, request: dict, output_base: Path) -> Optional[dict]:
+        """
+        Return a generate_and_save-style result if this variation was
+        already saved, else None.
+
+        Checks the journal first, then the product's audit logs (a crash
+        after the save but before the journal line leaves only the log).
+        """
+        key = (request.get('metadata') or {}).get('idempotency_key')
+        if not key:
+            return None
+
+        with self._lock:
+            recorded = self._products.get(product_id, {}).get('variations', {}).get(key)
+
+        if not recorded:
+            logs_dir = Path(output_base) / "logs" / request['tranche']
+            for log_path in sorted(logs_dir.glob(f"{request['cupid_name']}_l*.json")):
+                try:
+                    with open(log_path) as f:
+                        audit = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                if audit.get('idempotency_key') == key:
+                    image_path = Path(output_base) / request['tranche'] / audit.get('image_file', '')
+                    recorded = {'path': str(image_path), 'metadata_path': str(log_path)}
+                    break
+
+        if not recorded or not (_saved(recorded['path']) and _saved(recorded['metadata_path'])):
+            return None
+
+        return {
+            'success': True,
+            'path': recorded['path'],
+            'metadata_path': recorded['metadata_path'],
+            'persisted': True,
+            'error': None,
+            'replayed': True,
+        }
+
+    def record_variation(self, product_id: str, request: dict, gen_result: dict) -> None:
+        """Record a saved variation under its idempotency key."""
+        key = (request.get('metadata') or {}).get('idempotency_key')
+        if not key or not gen_result.get('success'):
+            return
+
+        with self._lock:
+            self._product(product_id)['variations'][key] = {
+                'path': gen_result['path'],
+                'metadata_path': gen_result['metadata_path'],
+            }
+        self._append({
+            'op': 'variation',
+            'product_id': product_id,
+            'key': key,
+            'path': gen_result['path'],
+            'metadata_path': gen_result['metadata_path'],
+        })
+
+    def record_product(self, result: dict) -> None:
+        """Record a finished product."""
+        with self._lock:
+            self._product(result['product_id'])['result'] = {
+                'success': result['success'],
+                'images': result['images'],
+                'errors': result['errors'],
+            }
+        self._append({
+            'op': 'product',
+            'product_id': result['product_id'],
+            'success': result['success'],
+            'images': result['images'],
+            'errors': result['errors'],
+        })
+
+    def record_end(self, batch_result: dict) -> None:
+        """Record the batch summary."""
+        self._append({'op': 'end', 'success': batch_result['success'], 'failed': batch_result['failed']})
+
+
+def open_batch_journal(
+    product_ids: list[str],
+    resume_batch_id: Optional[str] = None,
+    config: Optional[dict] = None,
+    **meta
+) -> Optional[BatchJournal]:
+    """
+    Start or resume a batch journal from workflow.journal config.
+
+    Returns:
+        BatchJournal, or None when journaling is disabled and not resuming
+    """
+    config = config or {}
+    journal_dir = config.get('dir', './output/jobs/batches')
+    if resume_batch_id:
+        return BatchJournal.resume(resume_batch_id, journal_dir)
+    if not config.get('enabled', True):
+        return None
+    return BatchJournal.start(product_ids, journal_dir, **meta)
+
+
+def journal_engine(batch_id: str, config: Optional[dict] = None) -> str:
+    """
+    Engine a journaled batch was started with, so it is resumed on the same one.
+
+    Raises:
+        FileNotFoundError: If no journal exists for batch_id
+    """
+    config = config or {}
+    journal = BatchJournal.load(batch_id, config.get('dir', './output/jobs/batches'))
+    return journal.meta.get('engine', 'v1')
@@ -36,9 +36,42 @@ def ensure_dependencies():
 
 def cmd_generate(args):
     """Generate images for product(s)."""
-    from workflow import create_workflow
+    from parallel_batch import create_engine_workflow
     
-    workflow = create_workflow(args.config)
+    if args.resume:
+        # A batch is finished on the engine that started it
+        from batch_journal import journal_engine
+        from data_layer import load_config
+        
+        try:
+            args.engine = journal_engine(args.resume, load_config(args.config).get('workflow', {}).get('journal'))
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return 1
+    
+    if args.results_file and args.id:
+        # Results files record batches; a single product's images are printed
+        print("Error: --results-file is for batches (--tranche, --class or --resume), not --id")
+        return 1
+    
+    if args.workers > 1 and not args.id and not args.resume:
+        if args.results_file:
+            # Worker processes return whole products; nothing streams records
+            print("Error: --results-file is not supported with --workers (omit --workers to stream results)")
+            return 1
+        return cmd_generate_parallel(args)
+    
+    workflow = create_engine_workflow(args.engine, args.config)
+    
+    if args.results_file and not args.id:
+        return cmd_generate_stream(args, workflow)
+    
+    if args.resume:
+        # Product list comes from the batch journal
+        result = workflow.batch_run([], verbose=args.verbose, resume_batch_id=args.resume)
+        print(f"\nBatch {result['batch_id']} complete: {result['success']} succeeded, {result['failed']} failed")
+        write_timing_report(result.get('timing'), args.timing_report)
+        return 0 if result['failed'] == 0 else 1
     
     if args.id:
         # Single product
@@ -66,6 +99,9 @@ def cmd_generate(args):
             verbose=args.verbose
         )
         print(f"\nBatch complete: {result['success']} succeeded, {result['failed']} failed")
+        if result.get('batch_id'):
+            print(f"Batch ID: {result['batch_id']} (rerun with --resume {result['batch_id']} to finish failed products)")
+        write_timing_report(result.get('timing'), args.timing_report)
         return 0 if result['failed'] == 0 else 1
     
     elif args.class_name:
@@ -76,11 +112,110 @@ def cmd_generate(args):
             verbose=args.verbose
         )
         print(f"\nBatch complete: {result['success']} succeeded, {result['failed']} failed")
+        if result.get('batch_id'):
+            print(f"Batch ID: {result['batch_id']} (rerun with --resume {result['batch_id']} to finish failed products)")
+        write_timing_report(result.get('timing'), args.timing_report)
         return 0 if result['failed'] == 0 else 1
     
     else:
-        print("Error: Must specify --id, --tranche, or --class")
+        print("Error: Must specify --id, --tranche, --class or --resume")
+        return 1
+
+
+def write_timing_report(timing, path):
+    """Write a batch timing summary as JSON ('-' prints it)."""
+    import json
+    
+    if not timing or not path:
+        return
+    if path == '-':
+        print(json.dumps(timing, indent=2))
+        return
+    
+    report_path = Path(path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(timing, f, indent=2)
+    print(f"Timing report: {report_path}")
+
+
+def cmd_generate_stream(args, workflow):
+    """Generate a batch, streaming image and product records to a JSONL file."""
+    import json
+    
+    if args.resume:
+        product_ids = []
+    elif args.tranche:
+        products = workflow.data.get_products_by_tranche(args.tranche, limit=args.limit)
+        product_ids = [p['cupidName'] for p in products if p.get('cupidName')]
+    elif args.class_name:
+        products = workflow.data.get_products_by_class(args.class_name, limit=args.limit)
+        product_ids = [p['cupidName'] for p in products if p.get('cupidName')]
+    else:
+        print("Error: Must specify --tranche, --class or --resume with --results-file")
         return 1
+    
+    # Only rolling counters are kept; every record goes straight to disk
+    counts = {'products': 0, 'failed': 0, 'images': 0, 'image_failures': 0}
+    summary = {}
+    
+    results_path = Path(args.results_file)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, 'a') as f:
+        for record in workflow.iter_batch(product_ids, verbose=args.verbose, resume_batch_id=args.resume):
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            
+            if record['type'] == 'image':
+                counts['images' if record['success'] else 'image_failures'] += 1
+            elif record['type'] == 'product':
+                counts['products'] += 1
+                counts['failed'] += 0 if record['success'] else 1
+                if not args.verbose:
+                    print(f"\r{counts['products']} products ({counts['failed']} failed), "
+                          f"{counts['images']} images ({counts['image_failures']} failed)", end='', flush=True)
+            else:
+                summary = record
+    
+    print(f"\nBatch complete: {summary.get('success', 0)} succeeded, {summary.get('failed', 0)} failed, "
+          f"{counts['images']} images")
+    print(f"Results: {results_path}")
+    if summary.get('batch_id'):
+        print(f"Batch ID: {summary['batch_id']} (rerun with --resume {summary['batch_id']} to finish failed products)")
+    write_timing_report(summary.get('timing'), args.timing_report)
+    return 0 if summary.get('failed', 0) == 0 else 1
+
+
+def cmd_generate_parallel(args):
+    """Generate a tranche or class across worker processes."""
+    from parallel_batch import create_parallel_batch_runner
+    
+    runner = create_parallel_batch_runner(args.config, workers=args.workers, engine=args.engine)
+    
+    if args.tranche:
+        result = runner.run_by_tranche(
+            tranche=args.tranche,
+            limit=args.limit,
+            verbose=args.verbose,
+            skip_vision=args.skip_vision
+        )
+    elif args.class_name:
+        result = runner.run_by_class(
+            class_description=args.class_name,
+            limit=args.limit,
+            verbose=args.verbose,
+            skip_vision=args.skip_vision
+        )
+    else:
+        print("Error: Must specify --tranche or --class with --workers")
+        return 1
+    
+    print(f"\nBatch complete: {result['success']} succeeded, {result['failed']} failed "
+          f"({result['workers']} workers, {result['elapsed_seconds']}s)")
+    if result.get('batch_id'):
+        print(f"Batch ID: {result['batch_id']} (rerun with --resume {result['batch_id']} to finish failed products)")
+    write_timing_report(result.get('timing'), args.timing_report)
+    return 0 if result['failed'] == 0 else 1
 
 
 def cmd_feedback(args):
@@ -92,7 +227,7 @@ def cmd_feedback(args):
     issues = args.issues.split('|') if args.issues else None
     suggestions = args.suggestions.split('|') if args.suggestions else None
     
-    manager.add_feedback(
+    finalize_job = manager.add_feedback(
         cupid_name=args.id,
         rating=args.rating,
         issues=issues,
@@ -110,7 +245,7 @@ def cmd_feedback(args):
     if args.regenerate:
         print(f"  Marked for regeneration")
     if args.approve:
-        print(f"  Approved")
+        print("  Approved (drafts queued for finalize)" if finalize_job else "  Approved")
     
     return 0
 
@@ -144,6 +279,41 @@ def cmd_regenerate(args):
     return 0 if result['failed'] == 0 else 1
 
 
+def cmd_finalize(args):
+    """Re-render approved V2 drafts at the final resolution."""
+    from workflow_v2 import create_workflow_v2
+    
+    workflow = create_workflow_v2(args.config)
+    
+    result = workflow.process_finalize_queue(cupid_name=args.id, verbose=args.verbose)
+    if not result['total']:
+        print("No finalize jobs pending")
+        return 0
+    
+    for product_result in result['results']:
+        for path in product_result['images']:
+            print(f"  - {path}")
+    
+    print(f"\nFinalize complete: {result['success']} succeeded, {result['failed']} failed")
+    return 0 if result['failed'] == 0 else 1
+
+
+def cmd_rerender_fallbacks(args):
+    """Re-render fallback-model images on the primary model."""
+    from workflow_v2 import create_workflow_v2
+    
+    workflow = create_workflow_v2(args.config)
+    
+    result = workflow.process_rerender_queue(cupid_name=args.id, verbose=args.verbose)
+    if not result['total']:
+        print("No fallback images queued for re-render")
+        return 0
+    
+    print(f"\nRe-render complete: {result['success']} succeeded, {result['failed']} failed, "
+          f"{result['deferred']} deferred (primary model unavailable)")
+    return 0 if result['failed'] == 0 else 1
+
+
 def cmd_validate_rules(args):
     """Validate governance rules and show sample prompts."""
     from governance import create_governance_engine
@@ -241,10 +411,15 @@ def cmd_stats(args):
     # Count generated images
     output_path = Path(args.output)
     if output_path.exists():
-        image_count = len(list(output_path.rglob("*.jpg")))
+        # Skip audit logs, UI derivatives and job queues
+        tranche_dirs = [
+            d for d in sorted(output_path.iterdir())
+            if d.is_dir() and d.name not in ('logs', 'derivatives', 'jobs')
+        ]
+        image_count = sum(len(list(d.rglob("*.jpg"))) for d in tranche_dirs)
         print(f"\n=== Generated Images ===")
         print(f"Total images: {image_count}")
-        for tranche_dir in sorted(output_path.iterdir()):
+        for tranche_dir in tranche_dirs:
             if tranche_dir.is_dir():
                 count = len(list(tranche_dir.glob("*.jpg")))
                 print(f"  {tranche_dir.name}: {count}")
@@ -252,6 +427,94 @@ def cmd_stats(args):
     return 0
 
 
+def cmd_usage_report(args):
+    """Show token usage and cost per tranche from the usage ledger."""
+    import json
+    from data_layer import load_config
+    from feedback import create_feedback_manager
+    from usage import UsageLedger, cost_report, load_pricing
+    
+    config = load_config(args.config)
+    ledger = UsageLedger(config.get('usage', {}).get('ledger', './output/jobs/usage.jsonl'))
+    if not ledger.path.exists():
+        print(f"No usage recorded yet ({ledger.path})")
+        return 1
+    
+    report = cost_report(
+        ledger,
+        load_pricing(config),
+        create_feedback_manager().get_approved_products(),
+        tranche=args.tranche,
+        batch_id=args.batch
+    )
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    
+    def money(value):
+        return f"${value:.4f}" if value is not None else "-"
+    
+    print(f"=== Usage ({ledger.path}) ===")
+    print(f"  {'tranche':<16}{'calls':>7}{'tokens':>12}{'cached':>10}{'cost':>11}{'images':>8}{'approved':>10}"
+          f"{'per image':>11}{'per approved':>14}")
+    rows = list(report['tranches'].items()) + [('TOTAL', report['total'])]
+    for name, entry in rows:
+        print(f"  {name:<16}{entry['calls']:>7}{entry['total_tokens']:>12}{entry['cached_tokens']:>10}"
+              f"{money(entry['cost_usd']):>11}{entry['images']:>8}{entry['approved_images']:>10}"
+              f"{money(entry['cost_per_image_usd']):>11}{money(entry['cost_per_approved_image_usd']):>14}")
+    
+    print("\n=== By Stage ===")
+    for stage, entry in report['total']['by_stage'].items():
+        print(f"  {stage}: {entry['calls']} call(s), {entry['total_tokens']} tokens, {money(entry['cost_usd'])}")
+    
+    print("\n=== By Model ===")
+    for model, entry in report['total']['by_model'].items():
+        print(f"  {model}: {entry['calls']} call(s), {entry['total_tokens']} tokens, {money(entry['cost_usd'])}"
+              f" (cache saved {money(entry['cache_savings_usd'])})")
+    
+    return 0
+
+
+def cmd_precompress_assets(args):
+    """Write .gz/.br siblings of the frontend build for the review UI to serve."""
+    from http_cache import BROTLI_AVAILABLE, precompress_directory
+    
+    if not Path(args.dir).is_dir():
+        print(f"No build at {args.dir} (run npm run build in frontend/)")
+        return 1
+    
+    summary = precompress_directory(args.dir)
+    print(f"Precompressed {summary['files']} file(s) in {args.dir}: {summary['bytes']} bytes"
+          f" -> gzip {summary['gzip_bytes']}" + (f", brotli {summary['br_bytes']}" if BROTLI_AVAILABLE else
+                                                 " (pip install brotli for .br)"))
+    return 0
+
+
+def cmd_serve(args):
+    """Run the review UI (development server, or gunicorn workers with --production)."""
+    if not args.production:
+        import review_ui
+        review_ui.main()
+        return 0
+    
+    try:
+        import gunicorn
+    except ImportError:
+        print("gunicorn is not installed. Run: pip install gunicorn")
+        return 1
+    
+    # Settings come from gunicorn.conf.py (review_ui.production); flags override
+    argv = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    if args.workers:
+        argv += ['--workers', str(args.workers)]
+    if args.threads:
+        argv += ['--threads', str(args.threads)]
+    if args.bind:
+        argv += ['--bind', args.bind]
+    os.execv(sys.executable, argv)
+
+
 def cmd_list_products(args):
     """List products with optional filtering."""
     from data_layer import create_data_layer
@@ -302,6 +565,15 @@ def main():
     gen_parser.add_argument('--limit', type=int, help='Limit number of products')
     gen_parser.add_argument('--model', help='Override image generation model')
     gen_parser.add_argument('--skip-vision', action='store_true', help='Skip ghost image analysis')
+    gen_parser.add_argument('--resume', metavar='BATCH_ID', help='Resume an interrupted batch from its journal')
+    gen_parser.add_argument('--results-file', metavar='PATH',
+                            help='Stream batch results to a JSONL file as products finish (not with --id or --workers)')
+    gen_parser.add_argument('--timing-report', metavar='PATH',
+                            help="Write per-stage latency percentiles as JSON ('-' for stdout)")
+    gen_parser.add_argument('--engine', choices=['v1', 'v2_nanobananapro'], default='v1',
+                            help="Workflow engine, with or without --workers (default: v1; --resume uses the batch's engine)")
+    gen_parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes for --tranche/--class')
     gen_parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     
     # Feedback command
@@ -318,12 +590,40 @@ def main():
     regen_parser.add_argument('--id', help='Specific product (or all from feedback)')
     regen_parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     
+    # Finalize command
+    fin_parser = subparsers.add_parser('finalize', help='Re-render approved drafts at final size (V2)')
+    fin_parser.add_argument('--id', help='Specific product (or all queued)')
+    fin_parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    
+    # Re-render fallbacks command
+    rr_parser = subparsers.add_parser('rerender-fallbacks', help='Re-render fallback images on the primary model (V2)')
+    rr_parser.add_argument('--id', help='Specific product (or all queued)')
+    rr_parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    
     # Validate command
     val_parser = subparsers.add_parser('validate-rules', help='Validate governance rules')
     
     # Stats command
     stats_parser = subparsers.add_parser('stats', help='Show statistics')
     
+    # Usage report command
+    usage_parser = subparsers.add_parser('usage-report', help='Show token usage and cost per tranche')
+    usage_parser.add_argument('--tranche', help='Only this tranche')
+    usage_parser.add_argument('--batch', metavar='BATCH_ID', help='Only calls made by this batch')
+    usage_parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    
+    # Precompress frontend build
+    pre_parser = subparsers.add_parser('precompress-assets', help='Precompress the review UI frontend build')
+    pre_parser.add_argument('--dir', default='frontend/dist', help='Build directory')
+    
+    # Review UI server
+    serve_parser = subparsers.add_parser('serve', help='Run the review UI server')
+    serve_parser.add_argument('--production', action='store_true',
+                              help='Multi-process gunicorn server (review_ui.production config)')
+    serve_parser.add_argument('--workers', type=int, help='Worker processes (with --production)')
+    serve_parser.add_argument('--threads', type=int, help='Threads per worker (with --production)')
+    serve_parser.add_argument('--bind', help='Address to listen on, e.g. 0.0.0.0:8080 (with --production)')
+    
     # List command
     list_parser = subparsers.add_parser('list', help='List products')
     list_parser.add_argument('--tranche', help='Filter by tranche')
@@ -336,16 +636,23 @@ def main():
         parser.print_help()
         return 1
     
-    # Check dependencies
-    ensure_dependencies()
+    # Check dependencies (the frontend build's postbuild step only
+    # precompresses files and must not need the generation stack)
+    if args.command != 'precompress-assets':
+        ensure_dependencies()
     
     # Execute command
     commands = {
         'generate': cmd_generate,
         'feedback': cmd_feedback,
         'regenerate': cmd_regenerate,
+        'finalize': cmd_finalize,
+        'rerender-fallbacks': cmd_rerender_fallbacks,
         'validate-rules': cmd_validate_rules,
         'stats': cmd_stats,
+        'usage-report': cmd_usage_report,
+        'precompress-assets': cmd_precompress_assets,
+        'serve': cmd_serve,
         'list': cmd_list_products,
     }
     
@@ -0,0 +1,273 @@
+"""
+Context Cache for Nano Banana Pro Architecture
+
+Holds the per-product request prefix (Safety Constitution system instruction
+plus identity-locking reference images) in a provider-side cached content
+entry so every variation and regeneration references it instead of
+resending it.
+
+Two interchangeable backends:
+- GeminiContextCache: explicit caching via client.caches (provider-side)
+- LocalContextCache: offline stand-in that keeps the prefix in memory and
+  inlines it into each request
+"""
+
+import hashlib
+import threading
+import time
+from typing import Optional
+
+try:
+    from google.genai import types
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+
+def context_cache_key(
+    model_name: str,
+    system_instruction: str,
+    reference_images: list[bytes]
+) -> str:
+    """
+    Build a content-addressed key for a request prefix.
+
+    The same product with the same selected references always maps to the
+    same entry; a different selection or edited constitution gets a new one.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode())
+    digest.update(b"\0")
+    digest.update((system_instruction or "").encode())
+    for img_bytes in reference_images:
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(img_bytes).digest())
+    return digest.hexdigest()
+
+
+class LocalContextCache:
+    """
+    Offline stand-in for provider-side context caching.
+
+    Entries live in process memory with the same TTL semantics as the
+    provider cache. Requests built from a local entry inline the system
+    instruction and reference parts, so no network access is needed.
+    """
+
+    provider = "local"
+
+    def __init__(self, ttl_seconds: int = 3600):
+        """
+        Initialize local cache.
+
+        Args:
+            ttl_seconds: Lifetime of each entry
+        """
+        self.ttl_seconds = ttl_seconds
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(
+        self,
+        key: str,
+        system_instruction: str,
+        reference_parts: list,
+        display_name: str = ""
+    ) -> Optional[dict]:
+        """
+        Return a live entry for key, creating it if missing or expired.
+
+        Returns:
+            Entry dict with 'name', 'provider', 'expires_at',
+            'system_instruction' and 'parts' keys
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            entry = self._entries.get(key)
+            if entry:
+                entry['hits'] += 1
+                return entry
+
+            entry = {
+                'name': f"local/{key[:16]}",
+                'provider': self.provider,
+                'display_name': display_name,
+                'expires_at': now + self.ttl_seconds,
+                'system_instruction': system_instruction,
+                'parts': list(reference_parts),
+                'token_count': None,
+                'hits': 0,
+            }
+            self._entries[key] = entry
+            return entry
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def _prune(self, now: float) -> None:
+        """Remove expired entries (caller holds the lock)."""
+        expired = [k for k, e in self._entries.items() if e['expires_at'] <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+class GeminiContextCache(LocalContextCache):
+    """
+    Provider-side context cache backed by the Gemini caches API.
+
+    If the provider rejects an entry (e.g. prefix below the model's minimum
+    cacheable size, or caching unsupported for the model), the key is
+    remembered as uncacheable and callers fall back to inline requests.
+    Transient failures (rate limits, timeouts, server errors) only skip
+    caching for that key for a backoff period that doubles per failure.
+    """
+
+    provider = "gemini"
+
+    # Refresh entries this long before provider expiry to avoid racing the TTL
+    EXPIRY_MARGIN_SECONDS = 30
+
+    # First retry delay after a transient caches.create failure
+    RETRY_BACKOFF_SECONDS = 30
+
+    def __init__(self, client, model_name: str, ttl_seconds: int = 3600):
+        """
+        Initialize provider cache.
+
+        Args:
+            client: genai.Client instance
+            model_name: Model the cached content is bound to
+            ttl_seconds: Lifetime of each provider entry
+        """
+        super().__init__(ttl_seconds=ttl_seconds)
+        self._client = client
+        self.model_name = model_name
+        # key -> time before which requests go inline (inf: never cacheable)
+        self._uncacheable: dict[str, float] = {}
+        self._failures: dict[str, int] = {}
+        # Keys with a caches.create in flight (the call runs without the lock)
+        self._creating: set[str] = set()
+        self._entries_changed = threading.Condition(self._lock)
+
+    @staticmethod
+    def _is_definitive(error) -> bool:
+        """Whether a caches.create error will recur on retry (a 4xx other than timeout / rate limit)."""
+        code = getattr(error, 'code', None)
+        return isinstance(code, int) and 400 <= code < 500 and code not in (408, 429)
+
+    def get_or_create(
+        self,
+        key: str,
+        system_instruction: str,
+        reference_parts: list,
+        display_name: str = ""
+    ) -> Optional[dict]:
+        """
+        Return a live provider entry for key, creating it if needed.
+
+        Returns:
+            Entry dict, or None if this prefix cannot be cached
+        """
+        if not self._client or not GENAI_AVAILABLE:
+            return None
+
+        with self._entries_changed:
+            # Callers of a key that is being created wait for that create;
+            # other keys (and hits) are not held up by the network call
+            while key in self._creating:
+                self._entries_changed.wait()
+            now = time.time()
+            self._prune(now + self.EXPIRY_MARGIN_SECONDS)
+            if self._uncacheable.get(key, 0.0) > now:
+                return None
+            entry = self._entries.get(key)
+            if entry:
+                entry['hits'] += 1
+                return entry
+            self._creating.add(key)
+
+        entry = None
+        error = None
+        try:
+            contents = []
+            if reference_parts:
+                contents.append(types.Content(role='user', parts=list(reference_parts)))
+
+            cached = self._client.caches.create(
+                model=self.model_name,
+                config=types.CreateCachedContentConfig(
+                    display_name=display_name[:128] or key[:16],
+                    system_instruction=system_instruction or None,
+                    contents=contents or None,
+                    ttl=f"{self.ttl_seconds}s",
+                )
+            )
+            usage = getattr(cached, 'usage_metadata', None)
+            entry = {
+                'name': cached.name,
+                'provider': self.provider,
+                'display_name': display_name,
+                'expires_at': now + self.ttl_seconds,
+                'system_instruction': system_instruction,
+                'parts': list(reference_parts),
+                'token_count': getattr(usage, 'total_token_count', None),
+                'hits': 0,
+            }
+        except Exception as e:
+            error = e
+        finally:
+            with self._entries_changed:
+                self._creating.discard(key)
+                if entry is not None:
+                    self._entries[key] = entry
+                    self._uncacheable.pop(key, None)
+                    self._failures.pop(key, None)
+                elif error is not None:
+                    self._record_failure(key, error, now)
+                self._entries_changed.notify_all()
+        return entry
+
+    def _record_failure(self, key: str, error: Exception, now: float) -> None:
+        """Stop caching a key for good or for a backoff period (caller holds the lock)."""
+        if self._is_definitive(error):
+            print(f"Warning: Context cache unavailable, sending inline ({error})")
+            self._uncacheable[key] = float('inf')
+            return
+        failures = self._failures[key] = self._failures.get(key, 0) + 1
+        backoff = min(self.RETRY_BACKOFF_SECONDS * 2 ** (failures - 1), self.ttl_seconds)
+        print(f"Warning: Context cache create failed, sending inline; retrying in {backoff}s ({error})")
+        self._uncacheable[key] = now + backoff
+
+    def clear(self) -> None:
+        """Delete all provider entries created by this cache."""
+        with self._lock:
+            for entry in self._entries.values():
+                try:
+                    self._client.caches.delete(name=entry['name'])
+                except Exception as e:
+                    print(f"Warning: Could not delete cached content {entry['name']}: {e}")
+            self._entries.clear()
+
+
+def create_context_cache(
+    client,
+    model_name: str,
+    config: Optional[dict] = None
+):
+    """
+    Factory function to create a context cache from generation.v2.context_cache config.
+
+    Returns:
+        GeminiContextCache, LocalContextCache, or None when disabled
+    """
+    config = config or {}
+    if not config.get('enabled', False):
+        return None
+
+    ttl_seconds = int(config.get('ttl_seconds', 3600))
+    if config.get('backend', 'gemini') == 'local':
+        return LocalContextCache(ttl_seconds=ttl_seconds)
+    return GeminiContextCache(client, model_name, ttl_seconds=ttl_seconds)
@@ -0,0 +1,161 @@
+"""
+Counter Allocation for AI Product Imagery Workflow
+
+Allocates the {cupidName}_l{counter}.jpg output counters without globbing
+the tranche directory on every save, and without two concurrent saves
+(threads or processes) picking the same counter.
+"""
+
+import glob
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+COUNTER_FILE_PATTERN = re.compile(r"^(?P<cupid>.+)_l(?P<counter>\d+)\.jpg$")
+
+
+class CounterRangeExhausted(RuntimeError):
+    """Raised when every counter in the configured range is taken."""
+
+
+class CounterAllocator:
+    """
+    In-memory per-tranche counter index with atomic on-disk reservation.
+
+    Each tranche directory is scanned once and indexed by cupidName. A
+    counter is reserved by creating its image file with O_CREAT | O_EXCL,
+    which is atomic across processes; losing that race just marks the
+    counter as used and moves on to the next one.
+    """
+
+    def __init__(self, counter_start: int = 101, counter_max: int = 110):
+        """
+        Initialize allocator.
+
+        Args:
+            counter_start: First counter in the range (inclusive)
+            counter_max: Last counter in the range (inclusive)
+        """
+        self.counter_start = counter_start
+        self.counter_max = counter_max
+
+        self._index: dict[Path, dict[str, set[int]]] = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, tranche_dir: Path) -> dict[str, set[int]]:
+        """Index a tranche directory once (caller holds the lock)."""
+        tranche_index = self._index.get(tranche_dir)
+        if tranche_index is not None:
+            return tranche_index
+
+        tranche_index = {}
+        tranche_dir.mkdir(parents=True, exist_ok=True)
+        with os.scandir(tranche_dir) as entries:
+            for entry in entries:
+                match = COUNTER_FILE_PATTERN.match(entry.name)
+                if match:
+                    tranche_index.setdefault(match.group('cupid'), set()).add(
+                        int(match.group('counter'))
+                    )
+
+        self._index[tranche_dir] = tranche_index
+        return tranche_index
+
+    def reserve(self, tranche_dir: Path, cupid_name: str) -> int:
+        """
+        Reserve the next free counter for a cupidName.
+
+        The image path is created empty as the reservation; the caller
+        overwrites it with the real image.
+
+        Args:
+            tranche_dir: Path to tranche output directory
+            cupid_name: Product cupidName
+
+        Returns:
+            Reserved counter within [counter_start, counter_max]
+
+        Raises:
+            CounterRangeExhausted: If every counter in the range is taken
+        """
+        tranche_dir = Path(tranche_dir)
+        with self._lock:
+            used = self._seed(tranche_dir).setdefault(cupid_name, set())
+
+            for counter in range(self.counter_start, self.counter_max + 1):
+                if counter in used:
+                    continue
+
+                image_path = tranche_dir / f"{cupid_name}_l{counter}.jpg"
+                try:
+                    fd = os.open(image_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+                except FileExistsError:
+                    # Taken by another process since we seeded
+                    used.add(counter)
+                    continue
+                os.close(fd)
+
+                used.add(counter)
+                return counter
+
+        raise CounterRangeExhausted(
+            f"All counters {self.counter_start}-{self.counter_max} are used for "
+            f"{cupid_name} in {tranche_dir}"
+        )
+
+    def release(self, tranche_dir: Path, cupid_name: str, counter: int) -> None:
+        """
+        Give back a reserved counter whose image was never written.
+
+        Only removes the reservation file if it is still empty.
+        """
+        tranche_dir = Path(tranche_dir)
+        image_path = tranche_dir / f"{cupid_name}_l{counter}.jpg"
+        with self._lock:
+            try:
+                if image_path.stat().st_size == 0:
+                    image_path.unlink()
+            except FileNotFoundError:
+                pass
+            self._index.get(tranche_dir, {}).get(cupid_name, set()).discard(counter)
+
+    def reclaim_stale(self, tranche_dir: Path, cupid_name: str, min_age_seconds: float = 600) -> list[int]:
+        """
+        Release empty reservations left behind by a crashed run.
+
+        Only placeholders older than min_age_seconds are removed, so
+        reservations of saves still in flight are left alone.
+
+        Returns:
+            Counters that were released
+        """
+        tranche_dir = Path(tranche_dir)
+        cutoff = time.time() - min_age_seconds
+        released = []
+        for image_path in tranche_dir.glob(f"{glob.escape(cupid_name)}_l*.jpg"):
+            match = COUNTER_FILE_PATTERN.match(image_path.name)
+            if not match or match.group('cupid') != cupid_name:
+                continue
+            try:
+                stat = image_path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.st_size == 0 and stat.st_mtime < cutoff:
+                counter = int(match.group('counter'))
+                self.release(tranche_dir, cupid_name, counter)
+                released.append(counter)
+        return released
+
+    def peek(self, tranche_dir: Path, cupid_name: str) -> Optional[int]:
+        """Return the next free counter without reserving it (None if exhausted)."""
+        tranche_dir = Path(tranche_dir)
+        with self._lock:
+            used = self._seed(tranche_dir).get(cupid_name, set())
+            for counter in range(self.counter_start, self.counter_max + 1):
+                if counter not in used:
+                    return counter
+        return None
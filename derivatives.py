@@ -0,0 +1,168 @@
+"""
+Output Derivatives for AI Product Imagery Workflow
+
+Normalizes generated images to real optimized/progressive JPEG (the model
+often returns PNG bytes) and renders smaller derivatives for the review UI:
+
+    output/Tranche 1/cupid_l101.jpg                      (normalized full size)
+    output/derivatives/thumb/Tranche 1/cupid_l101.jpg    (grid cells)
+    output/derivatives/preview/Tranche 1/cupid_l101.jpg  (compare view)
+
+Rendering runs on a thread pool (Pillow releases the GIL while decoding,
+resizing and encoding) and is driven from the write-behind worker, so it
+never blocks generation.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    print("Warning: Pillow not installed, derivatives disabled. Run: pip install Pillow")
+
+
+DERIVATIVES_DIR = "derivatives"
+
+
+class DerivativeStage:
+    """Renders normalized JPEGs and thumbnail/preview derivatives."""
+
+    DEFAULT_SIZES = {'thumb': 256, 'preview': 1024}
+
+    def __init__(
+        self,
+        output_base: str = "./output",
+        jpeg_quality: int = 90,
+        sizes: Optional[dict] = None,
+        workers: int = 2
+    ):
+        """
+        Initialize derivative stage.
+
+        Args:
+            output_base: Base directory for output images
+            jpeg_quality: JPEG quality for the normalized image and derivatives
+            sizes: Derivative name -> longest edge in pixels
+            workers: Thread pool size
+        """
+        self.output_base = Path(output_base)
+        self.jpeg_quality = jpeg_quality
+        self.sizes = dict(sizes or self.DEFAULT_SIZES)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="derivatives")
+
+    def derivative_path(self, tranche: str, image_file: str, size_name: str) -> Path:
+        """Path of a named derivative for a generated image."""
+        return self.output_base / DERIVATIVES_DIR / size_name / tranche / image_file
+
+    def render(self, image_bytes: bytes) -> Optional[dict[str, bytes]]:
+        """
+        Render the normalized image and every derivative in parallel.
+
+        Args:
+            image_bytes: Raw bytes returned by the model
+
+        Returns:
+            Dict with 'full' plus one entry per configured size, or None if
+            the bytes could not be decoded
+        """
+        try:
+            source = Image.open(io.BytesIO(image_bytes))
+            source.load()
+            source = self._to_rgb(source)
+        except Exception as e:
+            print(f"Warning: Could not decode generated image, keeping original bytes: {e}")
+            return None
+
+        # Source is fully loaded and only read from here on, so tasks can share it
+        futures = {'full': self._pool.submit(self._encode, source)}
+        for size_name, edge in self.sizes.items():
+            futures[size_name] = self._pool.submit(self._resize_and_encode, source, edge)
+
+        return {name: future.result() for name, future in futures.items()}
+
+    def expand_writes(
+        self,
+        image_path: Path,
+        image_bytes: bytes,
+        tranche: str,
+        audit_data: dict
+    ) -> list[tuple[Path, bytes]]:
+        """
+        Turn one raw image write into normalized image + derivative writes.
+
+        Records the derivative paths (relative to output_base) in audit_data.
+        """
+        rendered = self.render(image_bytes)
+        if not rendered:
+            return [(image_path, image_bytes)]
+
+        writes = [(image_path, rendered.pop('full'))]
+        derivatives = {}
+        for size_name, data in rendered.items():
+            path = self.derivative_path(tranche, image_path.name, size_name)
+            writes.append((path, data))
+            derivatives[size_name] = path.relative_to(self.output_base).as_posix()
+
+        audit_data['output_format'] = {
+            'format': 'jpeg',
+            'quality': self.jpeg_quality,
+            'progressive': True,
+        }
+        audit_data['derivatives'] = derivatives
+        return writes
+
+    def _encode(self, image) -> bytes:
+        """Encode as optimized progressive JPEG."""
+        buffer = io.BytesIO()
+        image.save(
+            buffer,
+            format='JPEG',
+            quality=self.jpeg_quality,
+            optimize=True,
+            progressive=True
+        )
+        return buffer.getvalue()
+
+    def _resize_and_encode(self, image, edge: int) -> bytes:
+        """Downscale to fit within edge x edge, then encode."""
+        resized = ImageOps.contain(image, (edge, edge), method=Image.LANCZOS)
+        return self._encode(resized)
+
+    @staticmethod
+    def _to_rgb(image):
+        """Flatten alpha onto white and convert to RGB for JPEG."""
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        if image.mode != 'RGB':
+            return image.convert('RGB')
+        return image
+
+
+def create_derivative_stage(
+    output_base: str = "./output",
+    config: Optional[dict] = None
+) -> Optional[DerivativeStage]:
+    """
+    Factory function to create DerivativeStage from output.derivatives config.
+
+    Returns:
+        DerivativeStage, or None when disabled or Pillow is unavailable
+    """
+    config = config or {}
+    if not config.get('enabled', False) or not PIL_AVAILABLE:
+        return None
+
+    return DerivativeStage(
+        output_base=output_base,
+        jpeg_quality=int(config.get('jpeg_quality', 90)),
+        sizes=config.get('sizes'),
+        workers=int(config.get('workers', 2))
+    )
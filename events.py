@@ -0,0 +1,217 @@
+"""
+Live Event Stream for AI Product Imagery Workflow
+
+The review UI pushes generation progress to browsers as server-sent events
+(GET /api/events) instead of having them poll and refetch:
+
+    job       job status / stage changes   {'job_id', 'cupid_name', 'status', 'stage', ...}
+    image     an image was saved           {'cupid_name', 'image': <generated image entry>}
+    product   catalog fields changed       {'cupid_name', 'has_images': True, ...}
+    reset     events were missed; refetch  {}
+
+Every event has an increasing id. Recent events are kept so a browser that
+reconnects (EventSource sends Last-Event-ID) gets what it missed; if it was
+gone too long it receives 'reset' instead. A subscriber that stops reading
+is disconnected rather than slowing down publishers.
+
+With a StateDB (production serving, several worker processes) events are
+appended to its events table instead, and each process tails the table
+and delivers new rows to its own subscribers; ids are then global, so a
+browser can reconnect to any worker.
+"""
+
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+
+class EventBus:
+    """In-process publish/subscribe of review UI events, rendered as SSE."""
+
+    def __init__(
+        self,
+        history: int = 500,
+        max_pending: int = 1000,
+        heartbeat_seconds: float = 15.0,
+        store=None,
+        poll_seconds: float = 0.25
+    ):
+        """
+        Initialize event bus.
+
+        Args:
+            history: Recent events kept for reconnecting subscribers
+            max_pending: Undelivered events a subscriber may fall behind by
+                before it is disconnected
+            heartbeat_seconds: Idle time after which a keep-alive comment is
+                sent (keeps proxies from closing the stream)
+            store: StateDB shared with other processes (None: this process only)
+            poll_seconds: How often the store is checked for new events
+        """
+        self.history = history
+        self.max_pending = max_pending
+        self.heartbeat_seconds = heartbeat_seconds
+        self.store = store
+        self.poll_seconds = poll_seconds
+
+        self._history: deque[dict] = deque(maxlen=history)
+        self._subscribers: set[queue.Queue] = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Last store event delivered to this process's subscribers
+        self._tail_id = 0
+        self._tail_pid = None
+
+    def start(self) -> None:
+        """Start delivering store events in this process (no-op without a store)."""
+        if not self.store or self._tail_pid == os.getpid():
+            return
+        with self._lock:
+            if self._tail_pid == os.getpid():
+                return
+            self._tail_pid = os.getpid()
+            self._tail_id = self.store.query("SELECT COALESCE(MAX(id), 0) FROM events")[0][0]
+        threading.Thread(target=self._tail, name="event-tail", daemon=True).start()
+
+    def publish(self, kind: str, data: dict) -> int:
+        """
+        Send an event to every subscriber (never blocks).
+
+        Returns:
+            Event id
+        """
+        if self.store:
+            self.start()
+            with self.store.transaction() as conn:
+                cursor = conn.execute("INSERT INTO events (kind, data) VALUES (?, ?)", (kind, json.dumps(data)))
+            return cursor.lastrowid
+
+        with self._lock:
+            event = {'id': next(self._ids), 'event': kind, 'data': data}
+            self._history.append(event)
+            self._deliver(event)
+        return event['id']
+
+    def _deliver(self, event: dict) -> None:
+        """Queue an event for every subscriber (caller holds the lock)."""
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Too far behind; the browser reconnects and replays
+                self._subscribers.discard(subscriber)
+
+    def _tail(self) -> None:
+        """Deliver events other processes (and this one) appended to the store."""
+        polls = 0
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                rows = self.store.query(
+                    "SELECT id, kind, data FROM events WHERE id > ? ORDER BY id", (self._tail_id,)
+                )
+                polls += 1
+                # Keep the table at about `history` rows
+                if polls % 240 == 0:
+                    with self.store.transaction() as conn:
+                        conn.execute("DELETE FROM events WHERE id <= ?", (self._tail_id - self.history,))
+            except sqlite3.Error as e:
+                print(f"Warning: could not read events: {e}")
+                continue
+            with self._lock:
+                for row in rows:
+                    self._deliver(_row_event(row))
+                    self._tail_id = row['id']
+
+    def _subscribe(self, last_event_id: Optional[int]) -> tuple[queue.Queue, list[dict]]:
+        """Register a subscriber; returns its queue and the events it missed."""
+        subscriber: queue.Queue = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if last_event_id is None:
+                return subscriber, []
+            if self.store:
+                return subscriber, self._missed_in_store(last_event_id)
+            oldest = self._history[0]['id'] if self._history else 1
+            newest = self._history[-1]['id'] if self._history else 0
+            # Missed events already dropped from history, or ids from before
+            # a server restart
+            if last_event_id + 1 < oldest or last_event_id > newest:
+                return subscriber, [{'id': newest, 'event': 'reset', 'data': {}}]
+            return subscriber, [event for event in self._history if event['id'] > last_event_id]
+
+    def stream(self, last_event_id: Optional[int] = None) -> Iterator[str]:
+        """
+        SSE stream for one subscriber (Flask response body).
+
+        Args:
+            last_event_id: Last-Event-ID header of a reconnecting browser
+
+        Yields:
+            SSE-formatted events and keep-alive comments
+        """
+        self.start()
+        subscriber, missed = self._subscribe(last_event_id)
+        try:
+            # Tell EventSource how soon to reconnect after a drop
+            yield "retry: 2000\n\n"
+            for event in missed:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = subscriber.get_nowait()
+                except queue.Empty:
+                    # Disconnected for falling behind: end once caught up
+                    with self._lock:
+                        if subscriber not in self._subscribers:
+                            return
+                    try:
+                        event = subscriber.get(timeout=self.heartbeat_seconds)
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+                        continue
+                yield format_sse(event)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def _missed_in_store(self, last_event_id: int) -> list[dict]:
+        """Store events after last_event_id up to the tail (caller holds the lock)."""
+        oldest = self.store.query("SELECT MIN(id) FROM events")[0][0] or self._tail_id + 1
+        if last_event_id + 1 < oldest or last_event_id > self._tail_id:
+            return [{'id': self._tail_id, 'event': 'reset', 'data': {}}]
+        rows = self.store.query(
+            "SELECT id, kind, data FROM events WHERE id > ? AND id <= ? ORDER BY id", (last_event_id, self._tail_id)
+        )
+        return [_row_event(row) for row in rows]
+
+    def subscriber_count(self) -> int:
+        """Number of connected subscribers."""
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _row_event(row) -> dict:
+    """Event dict from an events table row."""
+    return {'id': row['id'], 'event': row['kind'], 'data': json.loads(row['data'])}
+
+
+def format_sse(event: dict) -> str:
+    """Render an event as an SSE message."""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def create_event_bus(config: Optional[dict] = None, store=None) -> EventBus:
+    """Factory function to create EventBus from the review_ui config section."""
+    config = config or {}
+    return EventBus(
+        history=config.get('event_history', 500),
+        heartbeat_seconds=config.get('event_heartbeat_seconds', 15.0),
+        store=store
+    )
@@ -2,39 +2,127 @@
 Feedback Management for AI Product Imagery Workflow
 
 Handles loading, saving, and aggregating user feedback.
+
+feedback.yaml is shared by the CLI and every review server worker process.
+Each change re-reads the file under an exclusive lock (feedback.yaml.lock),
+applies itself to the latest entries and replaces the file atomically, so
+writers never lose each other's entries and readers never see a partial file.
 """
 
+import threading
 import yaml
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 from datetime import datetime
 from collections import defaultdict
 
+from render_queue import RenderQueue, has_unfinalized_drafts
+from write_behind import atomic_write_bytes
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
 
 class FeedbackManager:
     """Manages feedback for generated images."""
     
-    def __init__(self, feedback_path: str = "feedback.yaml"):
-        """Initialize feedback manager."""
+    def __init__(
+        self,
+        feedback_path: str = "feedback.yaml",
+        render_queue: Optional[RenderQueue] = None,
+        output_base: str = "./output"
+    ):
+        """
+        Initialize feedback manager.
+        
+        Args:
+            feedback_path: Path to feedback YAML
+            render_queue: Queue that receives finalize jobs on approval
+            output_base: Output directory whose audit logs show which
+                products have drafts to finalize
+        """
         self.feedback_path = Path(feedback_path)
+        self.render_queue = render_queue or RenderQueue()
+        self.output_base = output_base
         self._feedback: dict = {}
+        # Bumped on every load/save; keys memoized constraint compiles
+        self.version = 0
+        self._mtime: Optional[float] = None
+        # One manager is shared by concurrent review UI requests
+        self._lock = threading.RLock()
         self._load_feedback()
     
     def _load_feedback(self) -> None:
         """Load feedback from YAML file."""
-        if self.feedback_path.exists():
-            with open(self.feedback_path, 'r') as f:
-                self._feedback = yaml.safe_load(f) or {}
-        else:
-            self._feedback = {
-                'feedback_entries': {},
-                'rule_refinements': {}
-            }
+        with self._lock:
+            if self.feedback_path.exists():
+                self._mtime = self.feedback_path.stat().st_mtime
+                with open(self.feedback_path, 'r') as f:
+                    self._feedback = yaml.safe_load(f) or {}
+            else:
+                self._mtime = None
+                self._feedback = {
+                    'feedback_entries': {},
+                    'rule_refinements': {}
+                }
+            self.version += 1
     
     def _save_feedback(self) -> None:
-        """Save feedback to YAML file."""
-        with open(self.feedback_path, 'w') as f:
-            yaml.dump(self._feedback, f, default_flow_style=False, sort_keys=False)
+        """Save feedback to YAML file (atomic replace)."""
+        with self._lock:
+            self.version += 1
+            data = yaml.dump(self._feedback, default_flow_style=False, sort_keys=False)
+            atomic_write_bytes(self.feedback_path, data.encode('utf-8'))
+            self._mtime = self.feedback_path.stat().st_mtime
+    
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock on the feedback file across processes (no-op without fcntl)."""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        lock_path = self.feedback_path.with_name(f"{self.feedback_path.name}.lock")
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _update(self, change: Callable[[dict], bool]) -> None:
+        """
+        Apply a change to the latest feedback on disk and save it.
+        
+        Args:
+            change: Mutates the feedback dict; returns False if nothing changed
+        """
+        with self._lock, self._file_lock():
+            # Another process may have saved since this one last read
+            self.reload_if_changed()
+            if change(self._feedback) is not False:
+                self._save_feedback()
+    
+    def reload_if_changed(self) -> bool:
+        """
+        Reload feedback if the file was changed by another process (e.g.
+        the CLI) since this manager last read or wrote it.
+        
+        Returns:
+            True if feedback was reloaded
+        """
+        try:
+            mtime = self.feedback_path.stat().st_mtime
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            self._load_feedback()
+            return True
     
     def add_feedback(
         self,
@@ -44,7 +132,7 @@ class FeedbackManager:
         suggestions: Optional[list[str]] = None,
         regenerate: bool = False,
         approved: bool = False
-    ) -> None:
+    ) -> Optional[str]:
         """
         Add or update feedback for a product.
         
@@ -54,11 +142,13 @@ class FeedbackManager:
             issues: List of issues observed
             suggestions: List of improvement suggestions
             regenerate: Whether to regenerate images
-            approved: Whether images are approved
+            approved: Whether images are approved (queues a finalize job
+                that re-renders the product's drafts at full resolution when
+                its latest images are unfinalized V2 drafts)
+            
+        Returns:
+            Id of the finalize job queued by this approval, if any
         """
-        if 'feedback_entries' not in self._feedback:
-            self._feedback['feedback_entries'] = {}
-        
         entry = {
             'rating': max(1, min(5, rating)),
             'timestamp': datetime.now().isoformat(),
@@ -73,28 +163,49 @@ class FeedbackManager:
         if approved:
             entry['approved'] = True
         
-        self._feedback['feedback_entries'][cupid_name] = entry
-        self._save_feedback()
+        def change(feedback: dict) -> None:
+            feedback.setdefault('feedback_entries', {})[cupid_name] = entry
+        
+        self._update(change)
+        
+        # Draft-then-finalize: approval promotes drafts to the target size
+        # (V1 images and already finalized products have nothing to promote)
+        if (approved and has_unfinalized_drafts(self.output_base, cupid_name)
+                and not self.render_queue.pending('finalize', cupid_name)):
+            return self.render_queue.enqueue('finalize', cupid_name, {'reason': 'approved'})
+        return None
     
     def get_feedback(self, cupid_name: str) -> Optional[dict]:
         """Get feedback for a specific product."""
-        return self._feedback.get('feedback_entries', {}).get(cupid_name)
+        with self._lock:
+            return self._feedback.get('feedback_entries', {}).get(cupid_name)
     
     def get_products_to_regenerate(self) -> list[str]:
         """Get list of products marked for regeneration."""
-        entries = self._feedback.get('feedback_entries', {})
-        return [
-            cupid for cupid, data in entries.items()
-            if data.get('regenerate', False) and not data.get('approved', False)
-        ]
+        with self._lock:
+            entries = self._feedback.get('feedback_entries', {})
+            return [
+                cupid for cupid, data in entries.items()
+                if data.get('regenerate', False) and not data.get('approved', False)
+            ]
+    
+    def get_approved_products(self) -> set[str]:
+        """Get the cupidNames whose images have been approved."""
+        with self._lock:
+            entries = self._feedback.get('feedback_entries', {})
+            return {cupid for cupid, data in entries.items() if data.get('approved', False)}
     
     def mark_regenerated(self, cupid_name: str) -> None:
         """Mark a product as regenerated (clear regenerate flag)."""
-        entries = self._feedback.get('feedback_entries', {})
-        if cupid_name in entries:
+        def change(feedback: dict) -> bool:
+            entries = feedback.get('feedback_entries', {})
+            if cupid_name not in entries:
+                return False
             entries[cupid_name]['regenerate'] = False
             entries[cupid_name]['regenerated_at'] = datetime.now().isoformat()
-            self._save_feedback()
+            return True
+        
+        self._update(change)
     
     def aggregate_learnings(self, class_mapping: dict) -> dict:
         """
@@ -106,7 +217,8 @@ class FeedbackManager:
         Returns:
             Aggregated refinements by category
         """
-        entries = self._feedback.get('feedback_entries', {})
+        with self._lock:
+            entries = dict(self._feedback.get('feedback_entries', {}))
         
         # Collect issues and suggestions by implied category
         category_issues = defaultdict(list)
@@ -139,8 +251,10 @@ class FeedbackManager:
                     refinements[category]['suggested_improvements'] = list(set(suggestions))
         
         # Update stored refinements
-        self._feedback['rule_refinements'] = refinements
-        self._save_feedback()
+        def change(feedback: dict) -> None:
+            feedback['rule_refinements'] = refinements
+        
+        self._update(change)
         
         return refinements
     
@@ -150,7 +264,8 @@ class FeedbackManager:
     
     def get_stats(self) -> dict:
         """Get feedback statistics."""
-        entries = self._feedback.get('feedback_entries', {})
+        with self._lock:
+            entries = dict(self._feedback.get('feedback_entries', {}))
         
         if not entries:
             return {
@@ -170,9 +285,12 @@ class FeedbackManager:
         }
 
 
-def create_feedback_manager(feedback_path: str = "feedback.yaml") -> FeedbackManager:
+def create_feedback_manager(
+    feedback_path: str = "feedback.yaml",
+    render_queue_path: str = "./output/jobs/render_queue.jsonl"
+) -> FeedbackManager:
     """Factory function to create FeedbackManager."""
-    return FeedbackManager(feedback_path)
+    return FeedbackManager(feedback_path, render_queue=RenderQueue(render_queue_path))
 
 
 if __name__ == "__main__":
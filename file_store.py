@@ -0,0 +1,159 @@
+"""
+Reference File Store for AI Product Imagery Workflow
+
+Uploads each unique reference image once through the Gemini Files API and
+reuses the returned file URI for every generation call until it expires,
+instead of inlining the same megabytes on every request.
+"""
+
+import hashlib
+import io
+import threading
+import time
+from typing import Optional
+
+try:
+    from google.genai import types
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+
+class ReferenceFileStore:
+    """Content-addressed registry of uploaded reference images."""
+
+    # Files API keeps uploads for 48h; re-upload a little before that
+    DEFAULT_TTL_SECONDS = 47 * 3600
+
+    # How long to wait for an upload to leave the PROCESSING state
+    ACTIVATION_TIMEOUT_SECONDS = 10
+
+    def __init__(
+        self,
+        client,
+        inline_threshold_bytes: int = 256 * 1024,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS
+    ):
+        """
+        Initialize file store.
+
+        Args:
+            client: genai.Client instance (None disables uploads)
+            inline_threshold_bytes: Images smaller than this are sent inline
+            ttl_seconds: How long an uploaded file URI is reused
+        """
+        self._client = client
+        self.inline_threshold_bytes = inline_threshold_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._files: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._upload_locks: dict[str, threading.Lock] = {}
+
+        self.uploads = 0
+        self.reuses = 0
+
+    def part_for(self, image_bytes: bytes, mime_type: str = "image/jpeg"):
+        """
+        Build a content part for an image, uploading it on first use.
+
+        Args:
+            image_bytes: Raw image data
+            mime_type: Image MIME type
+
+        Returns:
+            types.Part referencing the uploaded file, or inline bytes when the
+            image is below the threshold or the upload fails
+        """
+        if not self._client or len(image_bytes) < self.inline_threshold_bytes:
+            return types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+
+        uploaded = self._get_or_upload(image_bytes, mime_type)
+        if not uploaded:
+            return types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+
+        return types.Part.from_uri(file_uri=uploaded['uri'], mime_type=uploaded['mime_type'])
+
+    def parts_for(self, images: list[bytes], mime_type: str = "image/jpeg") -> list:
+        """Build content parts for a list of images."""
+        return [self.part_for(img_bytes, mime_type) for img_bytes in images]
+
+    def _get_or_upload(self, image_bytes: bytes, mime_type: str) -> Optional[dict]:
+        """Return a live registry entry for these bytes, uploading if needed."""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+
+        with self._lock:
+            upload_lock = self._upload_locks.setdefault(digest, threading.Lock())
+
+        # Per-hash lock so concurrent variations don't upload the same image twice
+        with upload_lock:
+            entry = self._files.get(digest)
+            if entry and entry['expires_at'] > time.time():
+                self.reuses += 1
+                return entry
+
+            try:
+                uploaded = self._client.files.upload(
+                    file=io.BytesIO(image_bytes),
+                    config=types.UploadFileConfig(
+                        mime_type=mime_type,
+                        display_name=f"ref_{digest[:16]}"
+                    )
+                )
+                uploaded = self._wait_until_active(uploaded)
+            except Exception as e:
+                print(f"Warning: Reference upload failed, sending inline ({e})")
+                return None
+
+            entry = {
+                'name': uploaded.name,
+                'uri': uploaded.uri,
+                'mime_type': getattr(uploaded, 'mime_type', None) or mime_type,
+                'size_bytes': len(image_bytes),
+                'expires_at': time.time() + self.ttl_seconds,
+            }
+            self._files[digest] = entry
+            self.uploads += 1
+            return entry
+
+    def _wait_until_active(self, uploaded):
+        """Poll an uploaded file until the provider marks it ACTIVE."""
+        deadline = time.time() + self.ACTIVATION_TIMEOUT_SECONDS
+        while True:
+            state = str(getattr(uploaded, 'state', '') or '')
+            if 'PROCESSING' not in state:
+                break
+            if time.time() > deadline:
+                raise TimeoutError(f"{uploaded.name} still processing")
+            time.sleep(0.5)
+            uploaded = self._client.files.get(name=uploaded.name)
+
+        if 'FAILED' in str(getattr(uploaded, 'state', '') or ''):
+            raise RuntimeError(f"{uploaded.name} failed processing")
+        return uploaded
+
+    def get_stats(self) -> dict:
+        """Get upload/reuse counters."""
+        return {
+            'files': len(self._files),
+            'uploads': self.uploads,
+            'reuses': self.reuses,
+        }
+
+
+def create_file_store(client, config: Optional[dict] = None) -> Optional[ReferenceFileStore]:
+    """
+    Factory function to create ReferenceFileStore from generation.file_store config.
+
+    Returns:
+        ReferenceFileStore, or None when disabled or the SDK is unavailable
+    """
+    config = config or {}
+    if not config.get('enabled', False) or not GENAI_AVAILABLE:
+        return None
+
+    return ReferenceFileStore(
+        client,
+        inline_threshold_bytes=int(config.get('inline_threshold_bytes', 256 * 1024)),
+        ttl_seconds=int(config.get('ttl_hours', 47)) * 3600
+    )
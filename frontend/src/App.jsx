@@ -1,15 +1,26 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import Sidebar from './components/Sidebar';
 import ProductDetail from './components/ProductDetail';
 import ComparisonModal from './components/ComparisonModal';
 import { Loader2 } from 'lucide-react';
 
+// Products fetched per sidebar page
+const PAGE_SIZE = 200;
+
 function App() {
+  // Loaded pages of the filtered product list (filtered and paged server-side)
   const [products, setProducts] = useState([]);
+  const [productTotal, setProductTotal] = useState(0);
+  const [facets, setFacets] = useState({ tranches: [], classes: [] });
+  const [filters, setFilters] = useState({ q: '', tranche: '', class: '', has_images: false });
+  const filtersRef = useRef(filters);
   const [selectedCupid, setSelectedCupid] = useState(null);
   const [currentProductData, setCurrentProductData] = useState(null);
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const [loading, setLoading] = useState(true);
+  // Latest progress of each product's generation job (from /api/events)
+  const [jobs, setJobs] = useState({});
+  const selectedCupidRef = useRef(null);
 
   // Comparison State
   const [compareModalOpen, setCompareModalOpen] = useState(false);
@@ -20,19 +31,81 @@ function App() {
   const [aiListForCompare, setAiListForCompare] = useState([]);
   const [aiIndexForCompare, setAiIndexForCompare] = useState(0);
 
+  // Refetch the first page when filters change (typing is debounced)
+  useEffect(() => {
+    filtersRef.current = filters;
+    const timer = setTimeout(() => fetchProducts(0), 250);
+    return () => clearTimeout(timer);
+  }, [filters]);
+
+  // Live updates: job progress, each saved image and catalog changes are
+  // applied to the affected entries only
   useEffect(() => {
-    fetchProducts();
+    const source = new EventSource('http://localhost:8080/api/events');
+
+    source.addEventListener('job', (e) => {
+      const job = JSON.parse(e.data);
+      setJobs((prev) => ({ ...prev, [job.cupid_name]: job }));
+      if (job.status === 'failed' && job.cupid_name === selectedCupidRef.current) {
+        alert(`Generation failed: ${job.error}`);
+      }
+    });
+
+    source.addEventListener('image', (e) => {
+      const { cupid_name, image } = JSON.parse(e.data);
+      setCurrentProductData((prev) => {
+        if (!prev || prev.cupid_name !== cupid_name) return prev;
+        const others = (prev.generated_images || []).filter((img) => img.filename !== image.filename);
+        const generated_images = [...others, image].sort((a, b) => a.filename.localeCompare(b.filename));
+        return { ...prev, generated_images };
+      });
+    });
+
+    source.addEventListener('product', (e) => {
+      const changes = JSON.parse(e.data);
+      setProducts((prev) => {
+        const index = prev.findIndex((p) => p.cupid_name === changes.cupid_name);
+        if (index < 0) return prev;
+        const updated = [...prev];
+        updated[index] = { ...prev[index], ...changes };
+        return updated;
+      });
+    });
+
+    // Missed too many events while disconnected: reload once
+    source.addEventListener('reset', () => {
+      fetchProducts(0);
+      if (selectedCupidRef.current) handleSelectProduct(selectedCupidRef.current);
+    });
+
+    return () => source.close();
   }, []);
 
-  // Also refresh products when a generation happens
-  const fetchProducts = async () => {
+  // Current sidebar filters as /api/products query parameters
+  const filterParams = (extra = {}) => {
+    const { q, tranche, class: classDescription, has_images } = filtersRef.current;
+    const params = new URLSearchParams(extra);
+    if (q) params.set('q', q);
+    if (tranche) params.set('tranche', tranche);
+    if (classDescription) params.set('class', classDescription);
+    if (has_images) params.set('has_images', 'true');
+    return params;
+  };
+
+  // Fetch one page; offset 0 replaces the list, later pages append.
+  // Unchanged pages are revalidated by the browser (ETag -> 304).
+  const fetchProducts = async (offset = 0) => {
     try {
       // In dev mode we might need CORS or proxy. 
       // Assuming Flask serves this app or proxy is set up.
       // For now, hardcode localhost:8080 if running separately
-      const res = await fetch('http://localhost:8080/api/products');
+      const params = filterParams({ offset, limit: PAGE_SIZE });
+
+      const res = await fetch(`http://localhost:8080/api/products?${params}`);
       const data = await res.json();
-      setProducts(data.products);
+      setProducts((prev) => (offset === 0 ? data.products : [...prev, ...data.products]));
+      setProductTotal(data.total);
+      setFacets({ tranches: data.tranches, classes: data.classes });
       setLoading(false);
     } catch (e) {
       console.error("Failed to fetch products", e);
@@ -42,9 +115,11 @@ function App() {
 
   const handleSelectProduct = async (cupid) => {
     setSelectedCupid(cupid);
-    // Fetch detail
+    selectedCupidRef.current = cupid;
+    // Fetch detail; the filters let the server prefetch the products
+    // that follow this one in the sidebar
     try {
-      const res = await fetch(`http://localhost:8080/api/product/${cupid}`);
+      const res = await fetch(`http://localhost:8080/api/product/${encodeURIComponent(cupid)}?${filterParams()}`);
       const data = await res.json();
       setCurrentProductData(data);
     } catch (e) {
@@ -53,10 +128,11 @@ function App() {
   };
 
   // Accept activeSourceUrlList from the child component
+  // Generation runs as a background job; progress and images arrive as events
   const handleGenerate = async (activeSourceUrlList) => {
     if (!selectedCupid) return;
     try {
-      await fetch('http://localhost:8080/api/generate', {
+      const res = await fetch('http://localhost:8080/api/generate', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -64,9 +140,12 @@ function App() {
           active_sources: activeSourceUrlList // Send as list
         })
       });
-      // Refresh data
-      handleSelectProduct(selectedCupid);
-      fetchProducts();
+      const submitted = await res.json();
+      if (!submitted.job_id) throw new Error(submitted.error);
+      // Events for this job may already have arrived; keep the newer state
+      setJobs((prev) => (
+        prev[selectedCupid]?.job_id === submitted.job_id ? prev : { ...prev, [selectedCupid]: submitted.job }
+      ));
     } catch (e) {
       alert("Generation failed");
     }
@@ -76,6 +155,12 @@ function App() {
     <div className="flex h-screen overflow-hidden bg-background text-text">
       <Sidebar
         products={products}
+        total={productTotal}
+        tranches={facets.tranches}
+        classes={facets.classes}
+        filters={filters}
+        onFiltersChange={setFilters}
+        onLoadMore={() => fetchProducts(products.length)}
         selectedCupid={selectedCupid}
         onSelect={handleSelectProduct}
         isOpen={sidebarOpen}
@@ -86,9 +171,10 @@ function App() {
         {selectedCupid && currentProductData ? (
           <ProductDetail
             data={currentProductData}
+            job={jobs[selectedCupid]}
             onGenerate={handleGenerate}
             onCompare={(srcIdx, aiIdx) => {
-              setSrcListForCompare(currentProductData.ghost_images || []);
+              setSrcListForCompare((currentProductData.ghost_previews || []).map(p => `http://localhost:8080${p.large}`));
               setSrcIndexForCompare(srcIdx);
 
               setAiListForCompare(currentProductData.generated_images || []);
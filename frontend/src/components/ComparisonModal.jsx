@@ -142,7 +142,7 @@ export default function ComparisonModal({ sourceImages, initialSourceIndex, aiIm
                     )}
 
                     <img
-                        src={`${currentSrcUrl}?wid=1600&hei=1600`}
+                        src={currentSrcUrl}
                         draggable={false}
                         style={getStyle(srcState)}
                         className="max-h-full max-w-full object-contain"
@@ -184,7 +184,7 @@ export default function ComparisonModal({ sourceImages, initialSourceIndex, aiIm
                     )}
 
                     <img
-                        src={`http://localhost:8080/output/${currentAiImg?.path}`}
+                        src={`http://localhost:8080/output/${aiState.scale > 1.5 ? currentAiImg?.path : (currentAiImg?.preview_path || currentAiImg?.path)}?v=${currentAiImg?.version}`}
                         draggable={false}
                         style={getStyle(aiState)}
                         className="max-h-full max-w-full object-contain"
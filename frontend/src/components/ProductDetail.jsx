@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Sparkles, ArrowRightLeft } from 'lucide-react';
 
-export default function ProductDetail({ data, onGenerate, onCompare }) {
+export default function ProductDetail({ data, job, onGenerate, onCompare }) {
     // Now managing a LIST of selected sources
     const [selectedSources, setSelectedSources] = useState([]);
 
@@ -9,13 +9,15 @@ export default function ProductDetail({ data, onGenerate, onCompare }) {
     const [lastClickedIndex, setLastClickedIndex] = useState(0);
 
     const [activeGenIndex, setActiveGenIndex] = useState(0);
-    const [generating, setGenerating] = useState(false);
+    const [submitting, setSubmitting] = useState(false);
+    const generating = submitting || job?.status === 'queued' || job?.status === 'running';
 
     // Layout States
     const [isDataExpanded, setIsDataExpanded] = useState(false);
     const [promptTab, setPromptTab] = useState('positive');
 
-    // Auto-select first source by default
+    // Auto-select first source by default (on product change only; images
+    // arriving while generating must not reset the selection)
     useEffect(() => {
         if (data.ghost_images?.length) {
             setSelectedSources([data.ghost_images[0]]);
@@ -25,15 +27,15 @@ export default function ProductDetail({ data, onGenerate, onCompare }) {
             setLastClickedIndex(0);
         }
         setActiveGenIndex(0);
-    }, [data]);
+    }, [data.cupid_name]);
 
     const activeGen = data.generated_images?.[activeGenIndex];
 
     const handleGenerateClick = async () => {
-        setGenerating(true);
+        setSubmitting(true);
         // Pass the LIST of selected source image URLs
         await onGenerate(selectedSources);
-        setGenerating(false);
+        setSubmitting(false);
     };
 
     const handleSourceClick = (url, index, e) => {
@@ -101,7 +103,7 @@ export default function ProductDetail({ data, onGenerate, onCompare }) {
                         {generating ? (
                             <div className="w-3.5 h-3.5 border-2 border-white/30 border-t-white rounded-full animate-spin" />
                         ) : <Sparkles size={14} />}
-                        Generate ({selectedSources.length})
+                        {generating && job?.status ? (job.stage || job.status) : `Generate (${selectedSources.length})`}
                     </button>
                 </div>
             </div>
@@ -129,7 +131,7 @@ export default function ProductDetail({ data, onGenerate, onCompare }) {
                                         onClick={(e) => handleSourceClick(url, i, e)}
                                         className={`aspect-square border rounded-lg overflow-hidden cursor-pointer transition-all hover:border-primary bg-black/20 ${isSelected ? 'ring-2 ring-primary border-transparent shadow-lg shadow-primary/10' : 'border-border'}`}
                                     >
-                                        <img src={`${url}?wid=200&hei=200`} className="w-full h-full object-contain p-2" />
+                                        <img src={`http://localhost:8080${data.ghost_previews[i].thumb}`} className="w-full h-full object-contain p-2" />
                                         {isSelected && (
                                             <div className="absolute top-1 right-1 w-4 h-4 bg-primary text-white rounded-full flex items-center justify-center text-[10px] font-bold">
                                                 ✓
@@ -202,7 +204,7 @@ export default function ProductDetail({ data, onGenerate, onCompare }) {
                                     onClick={() => setActiveGenIndex(i)}
                                     className={`aspect-square border rounded-lg overflow-hidden cursor-pointer bg-surface relative ${i === activeGenIndex ? 'ring-2 ring-success border-transparent shadow-lg shadow-success/10' : 'border-border'}`}
                                 >
-                                    <img src={`http://localhost:8080/output/${img.path}`} className="w-full h-full object-cover" />
+                                    <img src={`http://localhost:8080/output/${img.thumb_path || img.path}?v=${img.version}`} className="w-full h-full object-cover" loading="lazy" />
                                     <div className="absolute bottom-1 left-1 flex gap-1">
                                         <span className={`px-1.5 py-0.5 text-[9px] font-bold rounded backdrop-blur-sm ${img.engine_version === 'v2_nanobananapro'
                                             ? 'bg-purple-600/80 text-white'
@@ -1,34 +1,17 @@
-import React, { useState, useMemo } from 'react';
+import React from 'react';
 import { Search, ChevronLeft, Menu, Sparkles, Filter } from 'lucide-react';
 
-export default function Sidebar({ products, selectedCupid, onSelect, isOpen, setIsOpen }) {
-    const [search, setSearch] = useState("");
-    const [trancheFilter, setTrancheFilter] = useState("");
-    const [classFilter, setClassFilter] = useState("");
-    const [generatedOnly, setGeneratedOnly] = useState(false);
-
-    // Extract unique tranches
-    const tranches = useMemo(() => {
-        return [...new Set(products.map(p => p.tranche))].filter(Boolean).sort();
-    }, [products]);
-
-    // Extract unique classes
-    const classes = useMemo(() => {
-        return [...new Set(products.map(p => p.class_description))].filter(Boolean).sort();
-    }, [products]);
-
-    // Filtering
-    const filteredProducts = useMemo(() => {
-        return products.filter(p => {
-            const matchesSearch = !search ||
-                p.name.toLowerCase().includes(search.toLowerCase()) ||
-                p.cupid_name.toLowerCase().includes(search.toLowerCase());
-            const matchesTranche = !trancheFilter || p.tranche === trancheFilter;
-            const matchesClass = !classFilter || p.class_description === classFilter;
-            const matchesGen = !generatedOnly || p.has_images;
-            return matchesSearch && matchesTranche && matchesClass && matchesGen;
-        });
-    }, [products, search, trancheFilter, classFilter, generatedOnly]);
+// Filtering and paging happen on the server; products holds the pages
+// loaded so far out of total matches
+export default function Sidebar({
+    products, total, tranches, classes, filters, onFiltersChange, onLoadMore,
+    selectedCupid, onSelect, isOpen, setIsOpen
+}) {
+    const search = filters.q;
+    const trancheFilter = filters.tranche;
+    const classFilter = filters.class;
+    const generatedOnly = filters.has_images;
+    const setFilter = (key, value) => onFiltersChange({ ...filters, [key]: value });
 
     if (!isOpen) {
         return (
@@ -69,7 +52,7 @@ export default function Sidebar({ products, selectedCupid, onSelect, isOpen, set
                                 placeholder="Search products..."
                                 className="w-full bg-background border border-border rounded-lg pl-9 pr-2 py-2 text-xs focus:ring-1 focus:ring-primary focus:border-primary outline-none text-text placeholder-text-muted/70 transition-all shadow-sm"
                                 value={search}
-                                onChange={e => setSearch(e.target.value)}
+                                onChange={e => setFilter('q', e.target.value)}
                             />
                         </div>
                         <button
@@ -78,7 +61,7 @@ export default function Sidebar({ products, selectedCupid, onSelect, isOpen, set
                                 ? "bg-primary border-primary text-white shadow-md shadow-primary/20"
                                 : "bg-background border-border text-text-muted hover:text-text hover:border-text-muted"
                                 }`}
-                            onClick={() => setGeneratedOnly(!generatedOnly)}
+                            onClick={() => setFilter('has_images', !generatedOnly)}
                         >
                             <Sparkles size={16} className={generatedOnly ? "fill-white/20" : ""} />
                         </button>
@@ -90,7 +73,7 @@ export default function Sidebar({ products, selectedCupid, onSelect, isOpen, set
                             <select
                                 className="w-full appearance-none bg-background border border-border rounded-lg px-2.5 py-1.5 text-xs text-text outline-none focus:ring-1 focus:ring-primary cursor-pointer hover:border-text-muted transition-colors"
                                 value={trancheFilter}
-                                onChange={e => setTrancheFilter(e.target.value)}
+                                onChange={e => setFilter('tranche', e.target.value)}
                             >
                                 <option value="">All Tranches</option>
                                 {tranches.map(t => <option key={t} value={t}>{t}</option>)}
@@ -102,7 +85,7 @@ export default function Sidebar({ products, selectedCupid, onSelect, isOpen, set
                             <select
                                 className="w-full appearance-none bg-background border border-border rounded-lg px-2.5 py-1.5 text-xs text-text outline-none focus:ring-1 focus:ring-primary cursor-pointer hover:border-text-muted transition-colors"
                                 value={classFilter}
-                                onChange={e => setClassFilter(e.target.value)}
+                                onChange={e => setFilter('class', e.target.value)}
                             >
                                 <option value="">All Classes</option>
                                 {classes.map(c => <option key={c} value={c}>{c}</option>)}
@@ -114,7 +97,7 @@ export default function Sidebar({ products, selectedCupid, onSelect, isOpen, set
             </div>
 
             <div className="flex-1 overflow-y-auto p-2 space-y-1 custom-scrollbar">
-                {filteredProducts.slice(0, 500).map(p => (
+                {products.map(p => (
                     <div
                         key={p.cupid_name}
                         onClick={() => onSelect(p.cupid_name)}
@@ -147,17 +130,20 @@ export default function Sidebar({ products, selectedCupid, onSelect, isOpen, set
                     </div>
                 ))}
 
-                {filteredProducts.length === 0 && (
+                {products.length === 0 && (
                     <div className="text-center py-8 text-text-muted flex flex-col items-center gap-2">
                         <Search size={24} className="opacity-20" />
                         <span className="text-xs">No products found</span>
                     </div>
                 )}
 
-                {filteredProducts.length > 500 && (
-                    <div className="text-center text-[10px] text-text-muted py-4 uppercase tracking-wider">
-                        • {filteredProducts.length - 500} more products •
-                    </div>
+                {total > products.length && (
+                    <button
+                        onClick={onLoadMore}
+                        className="w-full text-center text-[10px] text-text-muted hover:text-text py-4 uppercase tracking-wider"
+                    >
+                        • Load {total - products.length} more products •
+                    </button>
                 )}
             </div>
         </div>
@@ -0,0 +1,376 @@
+"""
+Generated Image Index for AI Product Imagery Workflow
+
+Maps cupidName -> generated images (the review UI entries built from each
+image's audit log under output/logs/<tranche>/), so the review API answers
+"which products have images" and "this product's images" from memory
+instead of walking and parsing the logs tree on every request.
+
+The index is kept current three ways:
+
+    build()          one scan of output/logs at server startup
+    on save          generators report every audit log they persist
+                     (notify_image_saved); attach() subscribes the index
+    watch()          optional background refresh for images written by
+                     other processes (CLI batches, parallel workers), with
+                     watchdog if installed, else a periodic mtime scan
+
+Listeners registered with on_change() are told about every added image
+(the review UI turns them into server-sent events).
+
+With a StateDB (production serving, several worker processes) the index
+is also written to its images table; each process applies the others'
+changes before answering, the version is the table's change counter, and
+an image is announced only by the process that indexed it first.
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+
+# Process-wide listeners for audit logs persisted by generators
+_save_listeners: list[Callable[[str, dict], None]] = []
+
+
+def notify_image_saved(metadata_path, audit_data: dict) -> None:
+    """Report a persisted image audit log (called by generators after a write)."""
+    for listener in list(_save_listeners):
+        try:
+            listener(str(metadata_path), audit_data)
+        except Exception as e:
+            print(f"Warning: image index update failed for {metadata_path}: {e}")
+
+
+def image_entry(meta: dict, output_base) -> Optional[dict]:
+    """Review UI entry for a generated image from its audit log (None if the image is gone)."""
+    tranche = meta.get('tranche', 'Unknown')
+    img_name = meta.get('image_file', '')
+    if not img_name or not (Path(output_base) / tranche / img_name).exists():
+        return None
+    derivatives = meta.get('derivatives', {})
+    return {
+        'filename': img_name,
+        # Changes when a counter is reused for a new image; URLs carrying
+        # it (?v=) are cached as immutable
+        'version': f"{zlib.crc32(str(meta.get('generated_at', '')).encode()):08x}",
+        'path': f"{tranche}/{img_name}",
+        # Smaller JPEGs for grid/compare views (fall back to full size)
+        'thumb_path': derivatives.get('thumb', f"{tranche}/{img_name}"),
+        'preview_path': derivatives.get('preview', f"{tranche}/{img_name}"),
+        'model_id': meta.get('model_id', meta.get('model', 'unknown')),
+        'engine_version': meta.get('engine_version', 'v1'),
+        'generated_at': meta.get('generated_at', ''),
+        'prompts': meta.get('prompts', {})
+    }
+
+
+class GeneratedImageIndex:
+    """In-memory cupidName -> generated images index over output/logs."""
+
+    def __init__(self, output_base: str = "./output", store=None, watch_interval: Optional[float] = None):
+        """
+        Initialize an empty index (see build()).
+
+        Args:
+            output_base: output.base_path; audit logs live under its logs/
+            store: StateDB shared with other processes (None: this process only)
+            watch_interval: If set, start() keeps the index current with
+                logs written by other processes (seconds between scans
+                without watchdog)
+        """
+        self.output_base = Path(output_base)
+        self.logs_dir = self.output_base / "logs"
+        self.store = store
+        self.watch_interval = watch_interval
+
+        # cupid -> {metadata path: entry}
+        self._by_cupid: dict[str, dict[str, dict]] = {}
+        # absolute metadata path -> (cupid, mtime) for refresh()
+        self._files: dict[str, tuple[str, float]] = {}
+        self._listeners: list[Callable[[str, dict], None]] = []
+        # Bumped on every change (cache validators for the review API)
+        self._version = 0
+        # Last applied images.seq of the store
+        self._seq = 0
+        self._built = False
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def build(self) -> None:
+        """Scan the logs tree once (no-op if already built)."""
+        with self._lock:
+            if self._built:
+                return
+            self._built = True
+            if self.store:
+                self._sync()
+            self.refresh(notify=False)
+            print(f"Image index: {sum(len(v) for v in self._by_cupid.values())} image(s) "
+                  f"for {len(self._by_cupid)} product(s)")
+
+    @property
+    def version(self) -> int:
+        """Change counter; equal versions mean an unchanged index."""
+        if self.store:
+            self._sync()
+            return self._seq
+        return self._version
+
+    def cupids(self) -> set[str]:
+        """cupidNames that have at least one generated image."""
+        self.build()
+        self._sync()
+        with self._lock:
+            return set(self._by_cupid)
+
+    def has_images(self, cupid_name: str) -> bool:
+        """Whether a product has generated images."""
+        self.build()
+        self._sync()
+        with self._lock:
+            return bool(self._by_cupid.get(cupid_name))
+
+    def images(self, cupid_name: str) -> list[dict]:
+        """A product's generated image entries, ordered by filename."""
+        self.build()
+        self._sync()
+        with self._lock:
+            entries = list(self._by_cupid.get(cupid_name, {}).values())
+        return sorted(entries, key=lambda x: x['filename'])
+
+    def on_change(self, listener: Callable[[str, dict], None]) -> None:
+        """Call listener(cupid_name, entry) for every image added to the index."""
+        self._listeners.append(listener)
+
+    def add(self, metadata_path, meta: Optional[dict] = None, notify: bool = True) -> Optional[dict]:
+        """
+        Index (or re-index) one audit log.
+
+        Args:
+            metadata_path: Audit log JSON path
+            meta: Its parsed contents (read from disk if None)
+            notify: Tell on_change() listeners about the image
+
+        Returns:
+            The image entry, or None if the log is unreadable or its image
+            is gone
+        """
+        path = Path(metadata_path)
+        key = os.path.abspath(path)
+        self._sync()
+        try:
+            mtime = path.stat().st_mtime
+            with self._lock:
+                known = self._files.get(key)
+                # Already indexed from the generator's save report
+                if known and known[1] == mtime:
+                    return self._by_cupid.get(known[0], {}).get(key)
+            if meta is None:
+                with open(path) as f:
+                    meta = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading log {path}: {e}")
+            return None
+
+        cupid = str(meta.get('cupid_name') or path.stem.rsplit('_', 1)[0])
+        entry = image_entry(meta, self.output_base)
+        changed = self._put(key, cupid, mtime, entry)
+        if not entry:
+            return None
+
+        for listener in (self._listeners if notify and changed else []):
+            try:
+                listener(cupid, entry)
+            except Exception as e:
+                print(f"Warning: image index listener failed: {e}")
+        return entry
+
+    def remove(self, metadata_path) -> None:
+        """Drop an audit log (its image was deleted)."""
+        self._put(os.path.abspath(metadata_path), '', 0.0, None)
+
+    def _put(self, key: str, cupid: str, mtime: float, entry: Optional[dict]) -> bool:
+        """
+        Set or (entry None) drop an indexed log.
+
+        Returns:
+            False if the store already had this version of the log (another
+            process indexed it), else True
+        """
+        if not self.store:
+            with self._lock:
+                self._remove(key)
+                if entry:
+                    self._by_cupid.setdefault(cupid, {})[key] = entry
+                    self._files[key] = (cupid, mtime)
+                    self._version += 1
+            return True
+
+        with self.store.transaction() as conn:
+            row = conn.execute("SELECT mtime, entry FROM images WHERE key = ?", (key,)).fetchone()
+            if entry is None:
+                changed = bool(row and row['entry'] is not None)
+            else:
+                changed = not row or row['entry'] is None or row['mtime'] != mtime
+            if changed:
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM images").fetchone()[0]
+                conn.execute(
+                    "INSERT INTO images (key, cupid, mtime, entry, seq) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET cupid = excluded.cupid, mtime = excluded.mtime, "
+                    "entry = excluded.entry, seq = excluded.seq",
+                    (key, cupid, mtime, json.dumps(entry) if entry else None, seq)
+                )
+        self._sync()
+        return changed
+
+    def _sync(self) -> None:
+        """Apply changes other processes made to the store since the last call."""
+        if not self.store:
+            return
+        rows = self.store.query(
+            "SELECT key, cupid, mtime, entry, seq FROM images WHERE seq > ? ORDER BY seq", (self._seq,)
+        )
+        with self._lock:
+            for row in rows:
+                # Another thread may have applied it meanwhile
+                if row['seq'] <= self._seq:
+                    continue
+                self._remove(row['key'])
+                if row['entry'] is not None:
+                    self._by_cupid.setdefault(row['cupid'], {})[row['key']] = json.loads(row['entry'])
+                    self._files[row['key']] = (row['cupid'], row['mtime'])
+                self._seq = row['seq']
+
+    def _remove(self, key: str) -> None:
+        """Drop an indexed log (caller holds the lock)."""
+        cupid, _ = self._files.pop(key, (None, None))
+        if cupid is None:
+            return
+        images = self._by_cupid.get(cupid, {})
+        images.pop(key, None)
+        if not images:
+            self._by_cupid.pop(cupid, None)
+        self._version += 1
+
+    def refresh(self, notify: bool = True) -> None:
+        """Pick up audit logs added, changed or removed on disk since the last scan."""
+        seen = set()
+        if self.logs_dir.exists():
+            for path in self.logs_dir.rglob('*.json'):
+                key = os.path.abspath(path)
+                seen.add(key)
+                try:
+                    mtime = path.stat().st_mtime
+                except OSError:
+                    continue
+                with self._lock:
+                    known = self._files.get(key)
+                if not known or known[1] != mtime:
+                    self.add(path, notify=notify)
+        with self._lock:
+            gone = set(self._files) - seen
+        for key in gone:
+            self._put(key, '', 0.0, None)
+
+    def attach(self) -> None:
+        """Receive audit logs persisted by generators in this process."""
+        if self._on_saved not in _save_listeners:
+            _save_listeners.append(self._on_saved)
+
+    def _on_saved(self, metadata_path: str, audit_data: dict) -> None:
+        self.add(metadata_path, audit_data)
+
+    def start(self) -> None:
+        """Start watching if watch_interval is set (again in a forked worker)."""
+        if self.watch_interval is not None:
+            self.watch(self.watch_interval)
+
+    def watch(self, interval: float = 10.0) -> None:
+        """
+        Keep the index current with logs written by other processes.
+
+        Args:
+            interval: Seconds between scans when watchdog is not installed
+        """
+        # Threads do not survive a fork; a forked worker starts its own
+        if self._watcher and self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        self.build()
+        if WATCHDOG_AVAILABLE:
+            self.logs_dir.mkdir(parents=True, exist_ok=True)
+            observer = Observer()
+            observer.schedule(_LogsEventHandler(self), str(self.logs_dir), recursive=True)
+            observer.daemon = True
+            observer.start()
+            self._watcher = observer
+            return
+
+        def poll() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Warning: image index refresh failed: {e}")
+
+        self._watcher = threading.Thread(target=poll, name="image-index-watch", daemon=True)
+        self._watcher.start()
+
+
+if WATCHDOG_AVAILABLE:
+    class _LogsEventHandler(FileSystemEventHandler):
+        """Forward audit log changes under output/logs to the index."""
+
+        def __init__(self, index: GeneratedImageIndex):
+            self.index = index
+
+        def on_created(self, event) -> None:
+            self._update(event.src_path, event.is_directory)
+
+        def on_modified(self, event) -> None:
+            self._update(event.src_path, event.is_directory)
+
+        def on_moved(self, event) -> None:
+            # Atomic writes land as a rename onto the final name
+            self._update(event.dest_path, event.is_directory)
+
+        def on_deleted(self, event) -> None:
+            if str(event.src_path).endswith('.json'):
+                self.index.remove(event.src_path)
+
+        def _update(self, path, is_directory: bool) -> None:
+            if not is_directory and str(path).endswith('.json'):
+                self.index.add(path)
+
+
+def create_generated_image_index(config: Optional[dict] = None, store=None) -> GeneratedImageIndex:
+    """
+    Factory function to create GeneratedImageIndex from config.
+
+    Uses output.base_path; review_ui.image_index.watch makes start() run the
+    background refresh (watch_interval_seconds between scans without
+    watchdog). store shares the index between worker processes.
+    """
+    config = config or {}
+    index_config = (config.get('review_ui') or {}).get('image_index') or {}
+    index = GeneratedImageIndex(
+        config.get('output', {}).get('base_path', './output'),
+        store=store,
+        watch_interval=index_config.get('watch_interval_seconds', 10.0) if index_config.get('watch', False) else None
+    )
+    index.attach()
+    return index
@@ -0,0 +1,291 @@
+"""
+Ghost Image Cache for AI Product Imagery Workflow
+
+Scene7 ghost images are downloaded once into a local cache and shared by
+everything that needs them: vision analysis, reference images for
+generation and the review UI (GET /api/ghost/<cupid>/<idx>?size=).
+
+    output/cache/ghost/ab/<sha256(url)>.jpg          master (Scene7 1024px rendition)
+    output/cache/ghost/ab/<sha256(url)>_200.jpg      variant resized from the master
+    output/cache/ghost/ab/<sha256(url)>_1600.jpg     variant larger than the master (fetched once)
+
+The master is the exact rendition generation has always downloaded, so
+reference hashes in audit logs are unchanged. Entries older than the TTL are
+refetched; if Scene7 is slow or down, the stale copy is used instead.
+Concurrent requests for the same image wait for one download. Only the
+configured sizes are served, so clients cannot create arbitrary variants.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+import requests
+
+from write_behind import atomic_write_bytes
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+class GhostImageCache:
+    """Disk cache of Scene7 ghost images and resized variants."""
+
+    # Longest edge of the rendition generation and vision analysis use
+    MASTER_EDGE = 1024
+
+    # Named sizes the review UI asks for
+    DEFAULT_SIZES = {'thumb': 200, 'preview': 1024, 'large': 1600}
+
+    # Download / resize locks, shared by files whose paths hash alike
+    LOCK_STRIPES = 64
+
+    def __init__(
+        self,
+        cache_dir: str = "./output/cache/ghost",
+        ttl_seconds: int = 7 * 24 * 3600,
+        timeout_seconds: float = 30.0,
+        jpeg_quality: int = 85,
+        sizes: Optional[dict] = None
+    ):
+        """
+        Initialize ghost image cache.
+
+        Args:
+            cache_dir: Directory for cached masters and variants
+            ttl_seconds: Age after which a master is refetched from Scene7
+            timeout_seconds: Scene7 request timeout
+            jpeg_quality: JPEG quality of locally resized variants
+            sizes: Size name -> longest edge in pixels
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self.jpeg_quality = jpeg_quality
+        self.sizes = dict(sizes or self.DEFAULT_SIZES)
+
+        # requests.Session is not thread-safe; one per thread
+        self._local = threading.local()
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._locks_guard = threading.Lock()
+        self._refreshing: set[str] = set()
+
+        self.hits = 0
+        self.fetches = 0
+        self.stale_served = 0
+
+    def size_edge(self, size: Union[str, int, None]) -> Optional[int]:
+        """
+        Longest edge for a size name or its pixel count (None: the master).
+
+        Raises:
+            ValueError: Not a configured size name or edge
+        """
+        if size is None or size == '':
+            return None
+        edges = {int(edge) for edge in self.sizes.values()} | {self.MASTER_EDGE}
+        if isinstance(size, str) and not size.isdigit():
+            if size not in self.sizes:
+                raise ValueError(f"Unknown size '{size}' (expected one of {sorted(self.sizes)})")
+            edge = int(self.sizes[size])
+        else:
+            edge = int(size)
+            if edge not in edges:
+                raise ValueError(f"Unsupported size {size} (expected one of {sorted(edges)})")
+        return None if edge == self.MASTER_EDGE else edge
+
+    def request_url(self, url: str, edge: Optional[int] = None) -> str:
+        """Scene7 rendition URL for an image at a longest edge (default: the master)."""
+        if 'scene7.com' in url and '?' not in url:
+            edge = edge or self.MASTER_EDGE
+            return f"{url}?wid={edge}&hei={edge}&fmt=jpg"
+        return url
+
+    def path_for(self, url: str, edge: Optional[int] = None) -> Path:
+        """Cache file for an image's master (edge None) or a variant."""
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        name = f"{digest}.jpg" if edge is None else f"{digest}_{edge}.jpg"
+        return self.cache_dir / digest[:2] / name
+
+    def cached(self, url: str, allow_stale: bool = False) -> Optional[bytes]:
+        """Master bytes if cached (and fresh unless allow_stale), without fetching."""
+        path = self.path_for(url)
+        if self._is_fresh(path) or (allow_stale and path.exists()):
+            try:
+                return path.read_bytes()
+            except OSError:
+                return None
+        return None
+
+    def store(self, url: str, data: bytes) -> Path:
+        """Cache master bytes downloaded elsewhere (e.g. by an async client)."""
+        path = self.path_for(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, data)
+        return path
+
+    def get(self, url: str, size: Union[str, int, None] = None, allow_stale: bool = False) -> Optional[bytes]:
+        """
+        Image bytes at a size, fetching and resizing on first use.
+
+        Args:
+            url: Scene7 ghost image URL (as in the product CSV)
+            size: Size name, longest edge in pixels, or None for the master
+            allow_stale: Return an expired copy immediately and refresh it in
+                the background (review UI) instead of waiting for Scene7
+
+        Returns:
+            Image bytes, or None if the image could not be fetched and
+            nothing is cached
+        """
+        path = self.ensure(url, size, allow_stale=allow_stale)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except OSError as e:
+            print(f"Warning: could not read cached ghost image {path}: {e}")
+            return None
+
+    def ensure(self, url: str, size: Union[str, int, None] = None, allow_stale: bool = False) -> Optional[Path]:
+        """Same as get(), but returns the cache file path (for serving)."""
+        edge = self.size_edge(size)
+        master = self._ensure_master(url, allow_stale)
+        if edge is None:
+            return master
+
+        variant = self.path_for(url, edge)
+        if master is not None and self._newer_than(variant, master):
+            self.hits += 1
+            return variant
+
+        with self._lock_for(variant):
+            if master is not None and self._newer_than(variant, master):
+                return variant
+            data = None
+            if edge < self.MASTER_EDGE and master is not None:
+                data = self._resize(master, edge)
+            if data is None and 'scene7.com' in url:
+                # Larger than the master (or no Pillow): Scene7 renders it once
+                data = self._download(url, edge)
+            if data is None:
+                # Fall back to an old variant, then to the master itself
+                return variant if variant.exists() else master
+            variant.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(variant, data)
+            return variant
+
+    def _ensure_master(self, url: str, allow_stale: bool) -> Optional[Path]:
+        """Path of a usable master, downloading it if missing or expired."""
+        path = self.path_for(url)
+        if self._is_fresh(path):
+            self.hits += 1
+            return path
+        if allow_stale and path.exists():
+            self.stale_served += 1
+            self._refresh_in_background(url)
+            return path
+
+        with self._lock_for(path):
+            # Another thread may have fetched it while we waited
+            if self._is_fresh(path):
+                return path
+            data = self._download(url)
+            if data is not None:
+                self.store(url, data)
+                return path
+            if path.exists():
+                self.stale_served += 1
+                print(f"Warning: using cached ghost image for {url} (Scene7 fetch failed)")
+                return path
+            return None
+
+    def _refresh_in_background(self, url: str) -> None:
+        """Refetch an expired master on a daemon thread (once at a time per URL)."""
+        with self._locks_guard:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def refresh() -> None:
+            try:
+                self._ensure_master(url, allow_stale=False)
+            finally:
+                with self._locks_guard:
+                    self._refreshing.discard(url)
+
+        threading.Thread(target=refresh, name="ghost-refresh", daemon=True).start()
+
+    def _download(self, url: str, edge: Optional[int] = None) -> Optional[bytes]:
+        """Fetch a rendition from Scene7 (None on failure)."""
+        try:
+            response = self._session().get(self.request_url(url, edge), timeout=self.timeout_seconds)
+            response.raise_for_status()
+            self.fetches += 1
+            return response.content
+        except Exception as e:
+            print(f"Error fetching image from {url}: {e}")
+            return None
+
+    def _resize(self, master: Path, edge: int) -> Optional[bytes]:
+        """Downscale the master to fit within edge x edge (None without Pillow)."""
+        if not PIL_AVAILABLE:
+            return None
+        try:
+            with Image.open(master) as image:
+                image = ImageOps.contain(image.convert('RGB'), (edge, edge), method=Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True, progressive=True)
+                return buffer.getvalue()
+        except Exception as e:
+            print(f"Warning: could not resize ghost image {master}: {e}")
+            return None
+
+    def _session(self) -> requests.Session:
+        """HTTP session for the calling thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _lock_for(self, path: Path) -> threading.Lock:
+        """Lock for a file so concurrent misses share one download or resize (bounded set)."""
+        return self._locks[hash(str(path)) % len(self._locks)]
+
+    def _is_fresh(self, path: Path) -> bool:
+        """Whether a cache file exists and is younger than the TTL."""
+        try:
+            return time.time() - path.stat().st_mtime < self.ttl_seconds
+        except OSError:
+            return False
+
+    @staticmethod
+    def _newer_than(path: Path, master: Path) -> bool:
+        """Whether a variant exists and was made from the current master."""
+        try:
+            return os.stat(path).st_mtime >= os.stat(master).st_mtime
+        except OSError:
+            return False
+
+    def stats(self) -> dict:
+        """Cache hit/fetch counters."""
+        return {'hits': self.hits, 'fetches': self.fetches, 'stale_served': self.stale_served}
+
+
+def create_ghost_cache(config: Optional[dict] = None) -> GhostImageCache:
+    """Factory function to create GhostImageCache from the ghost_cache config section."""
+    config = config or {}
+    return GhostImageCache(
+        cache_dir=config.get('dir', './output/cache/ghost'),
+        ttl_seconds=int(config.get('ttl_hours', 168)) * 3600,
+        timeout_seconds=float(config.get('timeout_seconds', 30)),
+        jpeg_quality=int(config.get('jpeg_quality', 85)),
+        sizes=config.get('sizes')
+    )
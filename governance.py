@@ -4,11 +4,43 @@ Governance Rules Engine for AI Product Imagery Workflow
 Loads and applies governance rules based on product class.
 """
 
+import hashlib
+import threading
 import yaml
 from pathlib import Path
 from typing import Optional
 
 
+class ConstraintSnapshot(dict):
+    """
+    Read-only compiled constraints.
+    
+    Lists are stored as tuples and nested dicts as snapshots, so a cached
+    compile can be shared by every product of a class. Still a dict, so it
+    serializes to JSON (audit logs, batch journal) like before.
+    """
+    
+    def __init__(self, data: dict):
+        super().__init__({key: self._freeze(value) for key, value in data.items()})
+    
+    @classmethod
+    def _freeze(cls, value):
+        if isinstance(value, dict):
+            return cls(value)
+        if isinstance(value, list):
+            return tuple(cls._freeze(v) for v in value)
+        return value
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("ConstraintSnapshot is read-only; layer changes onto a copy")
+    
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
 class GovernanceEngine:
     """Manages governance rules for product imagery."""
     
@@ -16,6 +48,12 @@ class GovernanceEngine:
         """Initialize with governance rules file."""
         self.rules_path = Path(rules_path)
         self._rules: dict = {}
+        self.rules_version: str = ''
+        self._mtime: Optional[float] = None
+        
+        # (class, rules version, feedback version) -> ConstraintSnapshot
+        self._compiled: dict[tuple, ConstraintSnapshot] = {}
+        self._compiled_lock = threading.Lock()
         self._load_rules()
     
     def _load_rules(self) -> None:
@@ -23,8 +61,31 @@ class GovernanceEngine:
         if not self.rules_path.exists():
             raise FileNotFoundError(f"Governance rules not found: {self.rules_path}")
         
-        with open(self.rules_path, 'r') as f:
-            self._rules = yaml.safe_load(f)
+        mtime = self.rules_path.stat().st_mtime
+        with open(self.rules_path, 'rb') as f:
+            raw = f.read()
+        self._rules = yaml.safe_load(raw)
+        self.rules_version = hashlib.sha256(raw).hexdigest()[:16]
+        self._mtime = mtime
+        
+        with self._compiled_lock:
+            self._compiled.clear()
+    
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the rules file if it changed on disk since it was loaded.
+        
+        Returns:
+            True if the rules were reloaded
+        """
+        try:
+            mtime = self.rules_path.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._load_rules()
+        return True
     
     def get_universal_rules(self) -> dict:
         """Get universal rules that apply to all products."""
@@ -136,6 +197,45 @@ class GovernanceEngine:
         
         return constraints
     
+    def get_constraints(
+        self,
+        class_description: str,
+        feedback: Optional[dict] = None,
+        feedback_version=None
+    ) -> ConstraintSnapshot:
+        """
+        Compiled constraints for a class, memoized.
+        
+        The compile is cached per (class, rules file version, feedback
+        version), so a tranche of one class compiles once. The snapshot is
+        shared and read-only; per-product additions go on a shallow copy.
+        
+        Args:
+            class_description: Product class
+            feedback: Optional feedback dict for refinements
+            feedback_version: Changes whenever feedback changes (e.g.
+                FeedbackManager.version); with feedback but no version the
+                compile is not cached
+            
+        Returns:
+            ConstraintSnapshot of compile_constraints()
+        """
+        if feedback and feedback_version is None:
+            return ConstraintSnapshot(self.compile_constraints(class_description, feedback))
+        
+        key = (class_description, self.rules_version, feedback_version if feedback else None)
+        with self._compiled_lock:
+            snapshot = self._compiled.get(key)
+        if snapshot is not None:
+            return snapshot
+        
+        snapshot = ConstraintSnapshot(self.compile_constraints(class_description, feedback))
+        with self._compiled_lock:
+            # Entries for older feedback versions can never be hit again
+            for stale in [k for k in self._compiled if k[0] == class_description and k[1:] != key[1:]]:
+                del self._compiled[stale]
+            return self._compiled.setdefault(key, snapshot)
+    
     def _apply_feedback_refinements(
         self, 
         constraints: dict, 
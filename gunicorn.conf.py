@@ -0,0 +1,60 @@
+"""
+Gunicorn Configuration for the Review UI (production serving)
+
+    python cli.py serve --production
+    gunicorn -c gunicorn.conf.py                 (equivalent)
+
+Runs review_ui:app in review_ui.production.workers processes with
+review_ui.production.threads threads each. The app is preloaded: the
+parent loads config, the product catalog and the generated image index
+once, and workers inherit them when they fork. Each worker then starts its
+own job, prefetch, event and index watch threads (post_fork).
+"""
+
+import os
+
+import yaml
+
+# Shared SQLite state and cross-process quotas (see review_ui.py)
+os.environ.setdefault('REVIEW_UI_MODE', 'production')
+
+
+def _production_config(config_path: str = "config.yaml") -> dict:
+    """review_ui.production section of config.yaml."""
+    try:
+        with open(config_path) as f:
+            config = yaml.safe_load(f) or {}
+    except OSError:
+        return {}
+    return (config.get('review_ui') or {}).get('production') or {}
+
+
+_config = _production_config()
+
+wsgi_app = 'review_ui:app'
+bind = _config.get('bind', '0.0.0.0:8080')
+workers = int(_config.get('workers', 4))
+# Threads, not async workers: generation and the Gemini SDK are blocking.
+# Every open /api/events stream holds one thread while the tab is open
+worker_class = 'gthread'
+threads = int(_config.get('threads', 16))
+preload_app = True
+timeout = int(_config.get('timeout_seconds', 120))
+graceful_timeout = int(_config.get('graceful_timeout_seconds', 30))
+keepalive = 5
+accesslog = _config.get('access_log')
+
+
+def when_ready(server):
+    """Load everything workers share once, in the parent, before they fork."""
+    import review_ui
+    review_ui.warm_up()
+    server.log.info(
+        "Review UI warmed up; forking %s worker(s) x %s thread(s)", server.cfg.workers, server.cfg.threads
+    )
+
+
+def post_fork(server, worker):
+    """Start the worker's background threads (threads do not survive fork)."""
+    import review_ui
+    review_ui.start_background()
@@ -0,0 +1,226 @@
+"""
+HTTP Caching and Compression Helpers for the Review UI
+
+Review API responses that only change when the catalog or the generated
+image index changes carry an ETag derived from those versions. Browsers
+revalidate (Cache-Control: no-cache) and get 304 Not Modified with an empty
+body while nothing changed. Bodies above a small threshold are compressed
+with brotli (if installed and accepted) or gzip.
+
+Files (generated images, derivatives, the frontend build) are served with
+strong ETags from their content hash, conditional GET and Range requests.
+URLs that name an immutable version (?v= on generated images, hashed
+frontend/dist/assets names) are cached for a year without revalidation.
+precompress_directory() writes .br / .gz siblings of the frontend build,
+which send_static_file() serves to clients that accept them.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+# Smaller bodies are not worth the CPU or the Content-Encoding header
+MIN_COMPRESS_BYTES = 1024
+
+# Cache lifetime of immutable URLs
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Text assets worth precompressing
+COMPRESSIBLE_SUFFIXES = ('.html', '.js', '.mjs', '.css', '.svg', '.json', '.map', '.txt')
+
+# Content hashes by path, valid while (mtime, size) is unchanged
+_file_etags: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+_file_etags_lock = threading.Lock()
+_FILE_ETAGS_MAX = 20000
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag from version parts (stable across processes)."""
+    return f'W/"{zlib.crc32(repr(parts).encode()):08x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in if_none_match.split(','))
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set[str]:
+    """Content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported coding for a client: 'br', 'gzip' or None."""
+    accepted = accepted_encodings(accept_encoding)
+    if BROTLI_AVAILABLE and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with a negotiated coding."""
+    if encoding == 'br':
+        # Quality 5 is close to gzip -9 in size and much faster than 11
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def json_response(payload, etag: Optional[str] = None, status: int = 200) -> Response:
+    """
+    JSON response for the current request with conditional GET and compression.
+
+    Args:
+        payload: JSON-serializable body
+        etag: Validator for the representation; if the request's
+            If-None-Match matches, 304 is returned without a body
+        status: Status code for the full response
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+    if etag:
+        headers['ETag'] = etag
+        # Cache, but revalidate on every use
+        headers['Cache-Control'] = 'no-cache'
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers=headers)
+
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        body = compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
+
+def file_etag(path) -> str:
+    """Strong ETag from a file's content hash (hashed once per file version)."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _file_etags_lock:
+        cached = _file_etags.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _file_etags.move_to_end(path)
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()[:32]
+
+    with _file_etags_lock:
+        _file_etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        while len(_file_etags) > _FILE_ETAGS_MAX:
+            _file_etags.popitem(last=False)
+    return etag
+
+
+def send_static_file(directory, filename: str, immutable: bool = False) -> Response:
+    """
+    Serve a file under directory with a content-hash ETag, conditional GET
+    and Range support.
+
+    Args:
+        directory: Root the filename must stay inside
+        filename: Path relative to directory (from the URL)
+        immutable: Cache for IMMUTABLE_MAX_AGE without revalidation; otherwise
+            clients revalidate every use (304 while unchanged)
+
+    Returns:
+        Response (404 if the file does not exist). A precompressed .br / .gz
+        sibling is sent instead when the client accepts it.
+    """
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None or not os.path.isfile(path):
+        return Response(status=404)
+
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = None
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+    for coding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if coding in accepted and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, coding
+            break
+
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        etag=file_etag(path),
+        conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else 0
+    )
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def precompress_directory(root, min_bytes: int = MIN_COMPRESS_BYTES) -> dict:
+    """
+    Write .gz (and .br if brotli is installed) next to every compressible file.
+
+    Files whose siblings are newer than themselves are skipped.
+
+    Returns:
+        {'files': compressed, 'bytes': original total, 'gzip_bytes': ..., 'br_bytes': ...}
+    """
+    summary = {'files': 0, 'bytes': 0, 'gzip_bytes': 0, 'br_bytes': 0}
+    for path in sorted(Path(root).rglob('*')):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        body = path.read_bytes()
+        if len(body) < min_bytes:
+            continue
+
+        variants = [('.gz', lambda b: gzip.compress(b, compresslevel=9), 'gzip_bytes')]
+        if BROTLI_AVAILABLE:
+            variants.append(('.br', lambda b: brotli.compress(b, quality=11), 'br_bytes'))
+
+        summary['files'] += 1
+        summary['bytes'] += len(body)
+        for suffix, encode, key in variants:
+            target = path.with_name(path.name + suffix)
+            if not target.exists() or target.stat().st_mtime < path.stat().st_mtime:
+                target.write_bytes(encode(body))
+            summary[key] += target.stat().st_size
+    return summary
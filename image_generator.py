@@ -5,12 +5,21 @@ Handles image generation using Gemini Flash Image or Pro Image models,
 with proper output file naming and non-overwrite logic.
 """
 
+import asyncio
 import os
-import re
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime
 
+from counter_allocator import CounterAllocator
+from derivatives import create_derivative_stage
+from file_store import create_file_store
+from generated_index import notify_image_saved
+from timing import make_span
+from usage import token_counts, usage_record
+from write_behind import create_write_behind_queue
+
 try:
     from google import genai
     from google.genai import types
@@ -43,7 +52,10 @@ class ImageGenerator:
         output_base: str = "./output",
         aspect_ratio: str = "1:1",
         counter_start: int = 101,
-        counter_max: int = 110
+        counter_max: int = 110,
+        file_store_config: Optional[dict] = None,
+        write_behind_config: Optional[dict] = None,
+        derivatives_config: Optional[dict] = None
     ):
         """
         Initialize image generator.
@@ -54,6 +66,12 @@ class ImageGenerator:
             aspect_ratio: Image aspect ratio (default 1:1)
             counter_start: Starting counter for image naming (default 101)
             counter_max: Maximum counter value (default 110)
+            file_store_config: generation.file_store settings for
+                upload-once reference images
+            write_behind_config: output.write_behind settings
+                (enabled, max_pending)
+            derivatives_config: output.derivatives settings
+                (enabled, jpeg_quality, workers, sizes)
         """
         self.model_name = model_name
         self.output_base = Path(output_base)
@@ -61,8 +79,14 @@ class ImageGenerator:
         self.counter_start = counter_start
         self.counter_max = counter_max
         
+        self._counters = CounterAllocator(counter_start, counter_max)
+        # Optional per-model quota (set by multi-process batch runs)
+        self.rate_limiter = None
+        self._writer = create_write_behind_queue(write_behind_config)
+        self._derivatives = create_derivative_stage(output_base, derivatives_config)
         self._client = None
         self._init_client()
+        self._file_store = create_file_store(self._client, file_store_config)
     
     def _init_client(self) -> None:
         """Initialize the Gemini client."""
@@ -78,31 +102,24 @@ class ImageGenerator:
     
     def _get_next_counter(self, tranche_dir: Path, cupid_name: str) -> int:
         """
-        Find next available counter for a cupidName to avoid overwriting.
+        Reserve the next available counter for a cupidName to avoid overwriting.
         
         Args:
             tranche_dir: Path to tranche output directory
             cupid_name: Product cupidName
             
         Returns:
-            Next available counter (101-110)
+            Reserved counter (101-110); the image path now exists as an empty
+            placeholder
+            
+        Raises:
+            CounterRangeExhausted: If the whole counter range is used
         """
-        pattern = re.compile(rf"{re.escape(cupid_name)}_l(\d+)\.jpg")
-        existing_counters = set()
-        
-        if tranche_dir.exists():
-            for file_path in tranche_dir.glob(f"{cupid_name}_l*.jpg"):
-                match = pattern.match(file_path.name)
-                if match:
-                    existing_counters.add(int(match.group(1)))
-        
-        # Find next available counter
-        for counter in range(self.counter_start, self.counter_max + 1):
-            if counter not in existing_counters:
-                return counter
-        
-        # All counters used - return max+1 (will overflow naming but won't overwrite)
-        return max(existing_counters) + 1 if existing_counters else self.counter_start
+        return self._counters.reserve(tranche_dir, cupid_name)
+    
+    def reclaim_stale_counters(self, tranche: str, cupid_name: str) -> list[int]:
+        """Release empty counter reservations left by a crashed run (see CounterAllocator.reclaim_stale)."""
+        return self._counters.reclaim_stale(self.output_base / tranche, cupid_name)
     
     def generate_image(
         self,
@@ -121,50 +138,126 @@ class ImageGenerator:
         Returns:
             Generated image bytes or None if failed
         """
+        image_bytes, _ = self._generate(prompt, negative_prompt, reference_images)
+        return image_bytes
+    
+    def _generate(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        reference_images: Optional[list[bytes]] = None
+    ) -> tuple[Optional[bytes], dict]:
+        """
+        generate_image() that also reports where the time went.
+        
+        Returns:
+            Tuple of (image bytes or None, timing dict with 'model',
+            'queue_seconds' (quota wait), 'call_seconds' and, when the
+            API answered, 'usage' token counts)
+        """
+        timing = {'model': self.model_name, 'queue_seconds': 0.0, 'call_seconds': 0.0}
         if not self._client:
             print("Error: Gemini client not initialized")
-            return None
+            return None, timing
         
+        start = time.monotonic()
         try:
-            model_config = self.MODEL_CONFIGS.get(self.model_name, {})
-            # model_name IS the actual API model ID - use it directly
-            model_id = self.model_name
+            request = self._build_request(prompt, reference_images)
             
-            # Build the content for generation
-            contents = [prompt]
-            
-            # Add reference images if provided
-            if reference_images:
-                for img_bytes in reference_images[:2]:  # Limit to 2 reference images
-                    image_part = types.Part.from_bytes(
-                        data=img_bytes,
-                        mime_type="image/jpeg"
-                    )
-                    contents.append(image_part)
-            
-            # Configure generation
-            config = types.GenerateContentConfig(
-                response_modalities=['IMAGE', 'TEXT'],
-            )
+            if self.rate_limiter:
+                timing['queue_seconds'] = self.rate_limiter.acquire()
             
             # Generate
-            response = self._client.models.generate_content(
-                model=model_id,
-                contents=contents,
-                config=config
-            )
+            response = self._client.models.generate_content(**request)
+            timing['usage'] = token_counts(response)
+            return self._extract_image(response), timing
+            
+        except Exception as e:
+            print(f"Error generating image: {e}")
+            return None, timing
+        finally:
+            timing['call_seconds'] = time.monotonic() - start - timing['queue_seconds']
+    
+    async def agenerate_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        reference_images: Optional[list[bytes]] = None
+    ) -> Optional[bytes]:
+        """Async generate_image() on the Gemini async client."""
+        image_bytes, _ = await self._agenerate(prompt, negative_prompt, reference_images)
+        return image_bytes
+    
+    async def _agenerate(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        reference_images: Optional[list[bytes]] = None
+    ) -> tuple[Optional[bytes], dict]:
+        """Async _generate()."""
+        timing = {'model': self.model_name, 'queue_seconds': 0.0, 'call_seconds': 0.0}
+        if not self._client:
+            print("Error: Gemini client not initialized")
+            return None, timing
+        
+        start = time.monotonic()
+        try:
+            # File store uploads and quota waits block, so keep them off the loop
+            request = await asyncio.to_thread(self._build_request, prompt, reference_images)
             
-            # Extract image from response
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, 'inline_data') and part.inline_data:
-                    return part.inline_data.data
+            if self.rate_limiter:
+                timing['queue_seconds'] = await asyncio.to_thread(self.rate_limiter.acquire)
             
-            print("No image generated in response")
-            return None
+            response = await self._client.aio.models.generate_content(**request)
+            timing['usage'] = token_counts(response)
+            return self._extract_image(response), timing
             
         except Exception as e:
             print(f"Error generating image: {e}")
-            return None
+            return None, timing
+        finally:
+            timing['call_seconds'] = time.monotonic() - start - timing['queue_seconds']
+    
+    def _build_request(
+        self,
+        prompt: str,
+        reference_images: Optional[list[bytes]] = None
+    ) -> dict:
+        """Build generate_content() arguments (shared by sync and async calls)."""
+        # model_name IS the actual API model ID - use it directly
+        model_id = self.model_name
+        
+        # Build the content for generation
+        contents = [prompt]
+        
+        # Add reference images if provided
+        if reference_images:
+            for img_bytes in reference_images[:2]:  # Limit to 2 reference images
+                if self._file_store:
+                    image_part = self._file_store.part_for(img_bytes)
+                else:
+                    image_part = types.Part.from_bytes(
+                        data=img_bytes,
+                        mime_type="image/jpeg"
+                    )
+                contents.append(image_part)
+        
+        # Configure generation
+        config = types.GenerateContentConfig(
+            response_modalities=['IMAGE', 'TEXT'],
+        )
+        
+        return {'model': model_id, 'contents': contents, 'config': config}
+    
+    @staticmethod
+    def _extract_image(response) -> Optional[bytes]:
+        """Extract image bytes from a generate_content response."""
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'inline_data') and part.inline_data:
+                return part.inline_data.data
+        
+        print("No image generated in response")
+        return None
     
     def save_image(
         self,
@@ -173,7 +266,8 @@ class ImageGenerator:
         cupid_name: str,
         prompt: str = "",
         negative_prompt: str = "",
-        metadata: Optional[dict] = None
+        metadata: Optional[dict] = None,
+        on_persisted: Optional[Callable[[Optional[Exception]], None]] = None
     ) -> tuple[str, str]:
         """
         Save generated image with proper naming convention and audit log.
@@ -185,18 +279,18 @@ class ImageGenerator:
             prompt: The positive prompt used (for audit)
             negative_prompt: The negative prompt used (for audit)
             metadata: Additional metadata to save
+            on_persisted: Called from the write-behind worker with None once
+                both files are on disk, or with the exception if writing failed
             
         Returns:
-            Tuple of (image_path, metadata_path)
+            Tuple of (image_path, metadata_path); the files are written
+            asynchronously, call flush() before reading them
         """
-        import json
         from datetime import datetime
         
-        # Create tranche directory
         tranche_dir = self.output_base / tranche
-        tranche_dir.mkdir(parents=True, exist_ok=True)
         
-        # Get next counter
+        # Reserve next counter (atomic across threads and processes)
         counter = self._get_next_counter(tranche_dir, cupid_name)
         
         # Build filenames
@@ -212,15 +306,10 @@ class ImageGenerator:
         # If tranche_dir is "output/Tranche 1", logs_dir is "output/logs/Tranche 1"
         logs_base = self.output_base / "logs"
         logs_tranche_dir = logs_base / tranche
-        logs_tranche_dir.mkdir(parents=True, exist_ok=True)
         
         metadata_path = logs_tranche_dir / f"{base_filename}.json"
         
-        # Save image
-        with open(image_path, 'wb') as f:
-            f.write(image_bytes)
-        
-        # Save audit metadata
+        # Build audit metadata
         audit_data = {
             "cupid_name": cupid_name,
             "tranche": tranche,
@@ -240,11 +329,51 @@ class ImageGenerator:
         if metadata:
             audit_data.update(metadata)
         
-        with open(metadata_path, 'w') as f:
-            json.dump(audit_data, f, indent=2)
+        # Persist image then audit log on the write-behind worker,
+        # transcoding and rendering derivatives there first
+        prepare = None
+        if self._derivatives:
+            def prepare(writes):
+                return self._derivatives.expand_writes(
+                    image_path, image_bytes, tranche, audit_data
+                ) + writes[1:]
+        
+        self._writer.submit(
+            [(image_path, image_bytes), (metadata_path, audit_data)],
+            on_done=self._persist_callback(tranche_dir, cupid_name, counter, on_persisted, metadata_path, audit_data),
+            prepare=prepare
+        )
         
         return str(image_path), str(metadata_path)
     
+    def _persist_callback(
+        self,
+        tranche_dir: Path,
+        cupid_name: str,
+        counter: int,
+        on_persisted: Optional[Callable[[Optional[Exception]], None]],
+        metadata_path: Optional[Path] = None,
+        audit_data: Optional[dict] = None
+    ) -> Callable[[Optional[Exception]], None]:
+        """Wrap on_persisted to give back the counter if the write failed (or index the saved image)."""
+        def _done(error: Optional[Exception]) -> None:
+            if error:
+                self._counters.release(tranche_dir, cupid_name, counter)
+            elif metadata_path is not None:
+                notify_image_saved(metadata_path, audit_data)
+            if on_persisted:
+                on_persisted(error)
+        return _done
+    
+    def flush(self) -> list[dict]:
+        """
+        Wait for all pending image/audit writes (batch-end barrier).
+        
+        Returns:
+            List of failed writes since the last flush
+        """
+        return self._writer.flush()
+    
     def generate_and_save(
         self,
         prompt: str,
@@ -258,44 +387,119 @@ class ImageGenerator:
         Generate and save an image in one step with full audit trail.
         
         Returns:
-            Dict with 'success', 'path', 'metadata_path', and 'error' keys
+            Dict with 'success', 'path', 'metadata_path', 'persisted' and
+            'error' keys; 'persisted' stays None until the write-behind
+            worker has written the files (see flush())
         """
-        result = {
-            'success': False,
-            'path': None,
-            'metadata_path': None,
-            'error': None,
-            'prompt_used': prompt[:200] + '...' if len(prompt) > 200 else prompt
-        }
+        result = self._new_result(prompt)
         
         # Generate
-        image_bytes = self.generate_image(
+        image_bytes, timing = self._generate(
             prompt=prompt,
             negative_prompt=negative_prompt,
             reference_images=reference_images
         )
         
+        return self._save_result(result, image_bytes, timing, tranche, cupid_name, prompt, negative_prompt, metadata)
+    
+    async def agenerate_and_save(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        tranche: str,
+        cupid_name: str,
+        reference_images: Optional[list[bytes]] = None,
+        metadata: Optional[dict] = None
+    ) -> dict:
+        """Async generate_and_save(); saving runs on a worker thread."""
+        result = self._new_result(prompt)
+        
+        image_bytes, timing = await self._agenerate(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            reference_images=reference_images
+        )
+        
+        # Counter reservation and write-behind back-pressure can block
+        return await asyncio.to_thread(
+            self._save_result, result, image_bytes, timing, tranche, cupid_name, prompt, negative_prompt, metadata
+        )
+    
+    @staticmethod
+    def _new_result(prompt: str) -> dict:
+        """Empty generate_and_save result."""
+        return {
+            'success': False,
+            'path': None,
+            'metadata_path': None,
+            'persisted': None,
+            'error': None,
+            'prompt_used': prompt[:200] + '...' if len(prompt) > 200 else prompt
+        }
+    
+    def _save_result(
+        self,
+        result: dict,
+        image_bytes: Optional[bytes],
+        timing: dict,
+        tranche: str,
+        cupid_name: str,
+        prompt: str,
+        negative_prompt: str,
+        metadata: Optional[dict]
+    ) -> dict:
+        """Queue a generated image for saving and fill in the result."""
+        tokens = timing.get('usage')
+        result['usage'] = usage_record('generation', timing['model'], tokens) if tokens else None
+        result['timing'] = {
+            'model': timing['model'],
+            'queue_seconds': timing['queue_seconds'],
+            'call_seconds': timing['call_seconds'],
+            'save_seconds': 0.0,
+        }
         if not image_bytes:
             result['error'] = 'Image generation failed'
             return result
         
+        # Upstream stage spans plus this image's generation call
+        metadata = dict(metadata or {})
+        metadata['timings'] = list(metadata.get('timings', [])) + [
+            make_span('op', 'generation', timing['call_seconds'], timing['queue_seconds'], timing['model'])
+        ]
+        if result['usage']:
+            metadata['usage'] = list(metadata.get('usage', [])) + [result['usage']]
+        
         # Save with audit log
+        save_start = time.monotonic()
         try:
+            # Mark success before queuing so a fast write-behind failure
+            # callback cannot be overwritten below
+            result['success'] = True
             image_path, metadata_path = self.save_image(
                 image_bytes=image_bytes,
                 tranche=tranche,
                 cupid_name=cupid_name,
                 prompt=prompt,
                 negative_prompt=negative_prompt,
-                metadata=metadata
+                metadata=metadata,
+                on_persisted=lambda error: self._record_persisted(result, error)
             )
-            result['success'] = True
             result['path'] = image_path
             result['metadata_path'] = metadata_path
         except Exception as e:
+            result['success'] = False
             result['error'] = f'Failed to save: {e}'
+        result['timing']['save_seconds'] = time.monotonic() - save_start
         
         return result
+    
+    @staticmethod
+    def _record_persisted(result: dict, error: Optional[Exception]) -> None:
+        """Report the write-behind outcome back into a generate_and_save result."""
+        result['persisted'] = error is None
+        if error:
+            result['success'] = False
+            result['error'] = f'Failed to save: {error}'
 
 
 def create_image_generator(
@@ -309,7 +513,10 @@ def create_image_generator(
             output_base=config.get('output', {}).get('base_path', './output'),
             aspect_ratio=config.get('image_settings', {}).get('aspect_ratio', '1:1'),
             counter_start=config.get('output', {}).get('counter_start', 101),
-            counter_max=config.get('output', {}).get('counter_max', 110)
+            counter_max=config.get('output', {}).get('counter_max', 110),
+            file_store_config=config.get('generation', {}).get('file_store'),
+            write_behind_config=config.get('output', {}).get('write_behind'),
+            derivatives_config=config.get('output', {}).get('derivatives')
         )
     return ImageGenerator(model_name=model_name)
 
@@ -325,5 +532,5 @@ if __name__ == "__main__":
     # Test counter logic
     test_dir = Path("./output/Tranche 1")
     test_cupid = "test_product_123"
-    next_counter = generator._get_next_counter(test_dir, test_cupid)
+    next_counter = generator._counters.peek(test_dir, test_cupid)
     print(f"Next counter for {test_cupid}: {next_counter}")
@@ -6,15 +6,31 @@ Enhanced generator with:
 - ImageConfig for aspect ratio and resolution
 - Thinking process (always enabled for Gemini 3 Pro Image)
 - Up to 14 reference images support
+- Explicit context caching of the system instruction and reference images
+- Upload-once reference images via the Files API
+- Fallback routing when the primary model is rate-limited or slow
 """
 
+import asyncio
 import os
-import re
+import threading
+import time
 import yaml
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime
 
+from context_cache import context_cache_key, create_context_cache
+from counter_allocator import CounterAllocator
+from derivatives import create_derivative_stage
+from file_store import create_file_store
+from generated_index import notify_image_saved
+from model_router import create_model_router, is_rate_limit_error
+from render_queue import RenderQueue
+from timing import make_span
+from usage import token_counts, usage_record
+from write_behind import create_write_behind_queue
+
 try:
     from google import genai
     from google.genai import types
@@ -43,7 +59,12 @@ class ImageGeneratorV2:
         image_size: str = "1K",  # Options: 1K, 2K, 4K
         counter_start: int = 101,
         counter_max: int = 110,
-        safety_constitution_path: str = "safety_constitution.yaml"
+        safety_constitution_path: str = "safety_constitution.yaml",
+        context_cache_config: Optional[dict] = None,
+        file_store_config: Optional[dict] = None,
+        write_behind_config: Optional[dict] = None,
+        derivatives_config: Optional[dict] = None,
+        routing_config: Optional[dict] = None
     ):
         """
         Initialize V2 image generator.
@@ -56,6 +77,16 @@ class ImageGeneratorV2:
             counter_start: Starting counter for image naming
             counter_max: Maximum counter value
             safety_constitution_path: Path to safety rules YAML
+            context_cache_config: generation.v2.context_cache settings
+                (enabled, backend, ttl_seconds)
+            file_store_config: generation.file_store settings
+                (enabled, inline_threshold_bytes, ttl_hours)
+            write_behind_config: output.write_behind settings
+                (enabled, max_pending)
+            derivatives_config: output.derivatives settings
+                (enabled, jpeg_quality, workers, sizes)
+            routing_config: generation.routing settings (quotas, health
+                thresholds, fallback model/engine)
         """
         self.model_name = model_name
         self.output_base = Path(output_base)
@@ -64,11 +95,27 @@ class ImageGeneratorV2:
         self.counter_start = counter_start
         self.counter_max = counter_max
         
+        self._counters = CounterAllocator(counter_start, counter_max)
+        self._writer = create_write_behind_queue(write_behind_config)
+        self._derivatives = create_derivative_stage(output_base, derivatives_config)
         self._client = None
         self._system_instruction = None
         
         self._init_client()
+        self._safety_constitution_path = safety_constitution_path
+        self._safety_constitution_mtime = None
         self._load_safety_constitution(safety_constitution_path)
+        self._context_cache = create_context_cache(
+            self._client, self.model_name, context_cache_config
+        )
+        self._file_store = create_file_store(self._client, file_store_config)
+        
+        routing_config = routing_config or {}
+        self._router = create_model_router(self.model_name, routing_config)
+        self._fallback_config = routing_config.get('fallback', {})
+        self._fallback_generator = None
+        self._fallback_lock = threading.Lock()
+        self._render_queue = RenderQueue(str(self.output_base / "jobs" / "render_queue.jsonl"))
     
     def _init_client(self) -> None:
         """Initialize the Gemini client."""
@@ -88,8 +135,10 @@ class ImageGeneratorV2:
         if not constitution_path.exists():
             print(f"Warning: Safety constitution not found at {path}")
             self._system_instruction = ""
+            self._safety_constitution_mtime = None
             return
         
+        self._safety_constitution_mtime = constitution_path.stat().st_mtime
         with open(constitution_path) as f:
             constitution = yaml.safe_load(f)
         
@@ -101,30 +150,55 @@ class ImageGeneratorV2:
                 for directive in directives:
                     parts.append(directive)
         
+        # Swapped in whole so concurrent calls see the old or the new text
         self._system_instruction = "\n\n".join(parts)
     
-    def _get_next_counter(self, tranche_dir: Path, cupid_name: str) -> int:
-        """Find next available counter for a cupidName to avoid overwriting."""
-        pattern = re.compile(rf"{re.escape(cupid_name)}_l(\d+)\.jpg")
-        existing_counters = set()
-        
-        if tranche_dir.exists():
-            for file_path in tranche_dir.glob(f"{cupid_name}_l*.jpg"):
-                match = pattern.match(file_path.name)
-                if match:
-                    existing_counters.add(int(match.group(1)))
+    def reload_safety_constitution_if_changed(self) -> bool:
+        """
+        Reload the safety constitution if its file changed since it was
+        loaded. Context cache entries are keyed by the system instruction,
+        so calls after a reload get fresh cached prefixes.
         
-        for counter in range(self.counter_start, self.counter_max + 1):
-            if counter not in existing_counters:
-                return counter
+        Returns:
+            True if the constitution was reloaded
+        """
+        try:
+            mtime = Path(self._safety_constitution_path).stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._safety_constitution_mtime:
+            return False
+        self._load_safety_constitution(self._safety_constitution_path)
+        return True
+    
+    def _get_next_counter(self, tranche_dir: Path, cupid_name: str) -> int:
+        """
+        Reserve the next available counter for a cupidName to avoid overwriting.
         
-        return max(existing_counters) + 1 if existing_counters else self.counter_start
+        Args:
+            tranche_dir: Path to tranche output directory
+            cupid_name: Product cupidName
+            
+        Returns:
+            Reserved counter (101-110); the image path now exists as an empty
+            placeholder
+            
+        Raises:
+            CounterRangeExhausted: If the whole counter range is used
+        """
+        return self._counters.reserve(tranche_dir, cupid_name)
+    
+    def reclaim_stale_counters(self, tranche: str, cupid_name: str) -> list[int]:
+        """Release empty counter reservations left by a crashed run (see CounterAllocator.reclaim_stale)."""
+        return self._counters.reclaim_stale(self.output_base / tranche, cupid_name)
     
     def generate_image(
         self,
         prompt: str,
         negative_prompt: str = "",
-        reference_images: Optional[list[bytes]] = None
+        reference_images: Optional[list[bytes]] = None,
+        cache_label: str = "",
+        image_size: Optional[str] = None
     ) -> Optional[bytes]:
         """
         Generate an image using Gemini 3 Pro Image with V2 enhancements.
@@ -133,64 +207,357 @@ class ImageGeneratorV2:
             prompt: Positive prompt for generation
             negative_prompt: Negative prompt (embedded in main prompt for V2)
             reference_images: Up to 14 reference images for Identity Locking
+            cache_label: Display name for the context cache entry (e.g. cupidName)
+            image_size: Override output resolution (defaults to self.image_size)
             
         Returns:
             Generated image bytes or None if failed
         """
+        image_bytes, _ = self._generate(prompt, negative_prompt, reference_images, cache_label, image_size)
+        return image_bytes
+    
+    def _get_context_entry(
+        self,
+        reference_images: list[bytes],
+        cache_label: str
+    ) -> Optional[dict]:
+        """Get (or create) the cached prefix entry for these references."""
+        if not self._context_cache:
+            return None
+        
+        # Read once: a constitution reload may swap it mid-call
+        system_instruction = self._system_instruction
+        key = context_cache_key(self.model_name, system_instruction, reference_images)
+        reference_parts = self._reference_parts(reference_images)
+        return self._context_cache.get_or_create(
+            key,
+            system_instruction=system_instruction,
+            reference_parts=reference_parts,
+            display_name=cache_label
+        )
+    
+    def _reference_parts(self, reference_images: list[bytes]) -> list:
+        """Build reference image parts, via the file store when enabled."""
+        if self._file_store:
+            return self._file_store.parts_for(reference_images)
+        
+        return [
+            types.Part.from_bytes(data=img_bytes, mime_type="image/jpeg")
+            for img_bytes in reference_images
+        ]
+    
+    def _generate(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        reference_images: Optional[list[bytes]] = None,
+        cache_label: str = "",
+        image_size: Optional[str] = None,
+        allow_fallback: bool = True
+    ) -> tuple[Optional[bytes], dict]:
+        """
+        Generate an image, routing to the fallback model when the primary
+        is unhealthy or out of quota, and report how the call was served.
+        
+        Args:
+            allow_fallback: Whether this call may be diverted (finalize
+                renders must stay on the primary model)
+        
+        Returns:
+            Tuple of (image bytes or None, info dict with 'context_cache',
+            'cached_content_token_count', 'routing', 'queue_seconds'
+            (time waiting for model quota) and 'usage' (token counts, None
+            if the API never answered) keys)
+        """
+        info, references, eligible = self._begin_call(reference_images, image_size, allow_fallback)
         if not self._client:
             print("Error: Gemini client not initialized")
-            return None
+            return None, info
+        
+        model, reason = self._select_model(eligible, info)
+        if model != self.model_name:
+            return self._generate_fallback(prompt, negative_prompt, references, cache_label, image_size, reason, info)
         
+        start = time.monotonic()
         try:
-            # Build contents with reference images FIRST (Identity Locking)
-            contents = []
-            
-            # Add reference images (up to 14 supported)
-            if reference_images:
-                for img_bytes in reference_images[:14]:
-                    image_part = types.Part.from_bytes(
-                        data=img_bytes,
-                        mime_type="image/jpeg"
+            image_bytes = self._call_primary(prompt, negative_prompt, references, cache_label, image_size, info)
+        except Exception as e:
+            reason = self._primary_failed(model, e, eligible)
+            if reason is None:
+                return None, info
+            return self._generate_fallback(prompt, negative_prompt, references, cache_label, image_size, reason, info)
+        return self._primary_served(model, start, image_bytes, info)
+    
+    async def _agenerate(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        reference_images: Optional[list[bytes]] = None,
+        cache_label: str = "",
+        image_size: Optional[str] = None,
+        allow_fallback: bool = True
+    ) -> tuple[Optional[bytes], dict]:
+        """Async _generate(): same routing, primary call on the async client."""
+        info, references, eligible = self._begin_call(reference_images, image_size, allow_fallback)
+        if not self._client:
+            print("Error: Gemini client not initialized")
+            return None, info
+        
+        # select() may wait for quota; the fallback generator is sync
+        model, reason = await asyncio.to_thread(self._select_model, eligible, info)
+        if model != self.model_name:
+            return await asyncio.to_thread(
+                self._generate_fallback, prompt, negative_prompt, references, cache_label, image_size, reason, info
+            )
+        
+        start = time.monotonic()
+        try:
+            image_bytes = await self._acall_primary(prompt, negative_prompt, references, cache_label, image_size, info)
+        except Exception as e:
+            reason = self._primary_failed(model, e, eligible)
+            if reason is None:
+                return None, info
+            return await asyncio.to_thread(
+                self._generate_fallback, prompt, negative_prompt, references, cache_label, image_size, reason, info
+            )
+        return self._primary_served(model, start, image_bytes, info)
+    
+    def _begin_call(
+        self,
+        reference_images: Optional[list[bytes]],
+        image_size: Optional[str],
+        allow_fallback: bool
+    ) -> tuple[dict, list[bytes], bool]:
+        """
+        Set up one generation call (shared by _generate and _agenerate).
+        
+        Returns:
+            Tuple of (empty info dict, references sent (up to 14), whether
+            the call may be diverted to the fallback model)
+        """
+        info = {
+            'context_cache': None, 'cached_content_token_count': 0, 'routing': None,
+            'queue_seconds': 0.0, 'usage': None
+        }
+        references = (reference_images or [])[:14]
+        eligible = allow_fallback and self._fallback_eligible(image_size or self.image_size)
+        return info, references, eligible
+    
+    def _select_model(self, eligible: bool, info: dict) -> tuple[str, Optional[str]]:
+        """Route the call (may wait for quota); records the wait in info['queue_seconds']."""
+        wait_start = time.monotonic()
+        model, reason = self._router.select(allow_fallback=eligible)
+        info['queue_seconds'] = time.monotonic() - wait_start
+        return model, reason
+    
+    def _primary_served(
+        self,
+        model: str,
+        start: float,
+        image_bytes: Optional[bytes],
+        info: dict
+    ) -> tuple[Optional[bytes], dict]:
+        """Record a completed primary call's latency and routing."""
+        self._router.record_success(model, time.monotonic() - start)
+        info['routing'] = {
+            'requested_model': self.model_name,
+            'served_model': model,
+            'fallback': False,
+        }
+        return image_bytes, info
+    
+    def _primary_failed(self, model: str, error: Exception, eligible: bool) -> Optional[str]:
+        """
+        Record a failed primary call.
+        
+        Returns:
+            Diversion reason if the call should be retried on the fallback
+            model, else None
+        """
+        self._router.record_failure(model, error)
+        print(f"Error generating image: {error}")
+        if eligible and self._router.fallback_model and is_rate_limit_error(error):
+            return 'rate_limited'
+        return None
+    
+    def _call_primary(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        references: list[bytes],
+        cache_label: str,
+        image_size: Optional[str],
+        info: dict
+    ) -> Optional[bytes]:
+        """Send one generation request to the primary model (raises on API errors)."""
+        request = self._build_primary_request(prompt, negative_prompt, references, cache_label, image_size, info)
+        
+        # Generate
+        response = self._client.models.generate_content(**request)
+        return self._read_primary_response(response, info)
+    
+    async def _acall_primary(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        references: list[bytes],
+        cache_label: str,
+        image_size: Optional[str],
+        info: dict
+    ) -> Optional[bytes]:
+        """Async _call_primary() on the Gemini async client."""
+        # Cache creation and file uploads are blocking SDK calls
+        request = await asyncio.to_thread(
+            self._build_primary_request, prompt, negative_prompt, references, cache_label, image_size, info
+        )
+        response = await self._client.aio.models.generate_content(**request)
+        return self._read_primary_response(response, info)
+    
+    def _build_primary_request(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        references: list[bytes],
+        cache_label: str,
+        image_size: Optional[str],
+        info: dict
+    ) -> dict:
+        """Build generate_content() arguments for the primary model."""
+        entry = self._get_context_entry(references, cache_label)
+        use_provider_cache = bool(entry and entry['provider'] == 'gemini')
+        
+        # Build contents with reference images FIRST (Identity Locking).
+        # With a provider cache entry the references already live in the
+        # cached prefix, so only the per-variation prompt is sent.
+        contents = []
+        
+        if not use_provider_cache:
+            if entry:
+                contents.extend(entry['parts'])
+            else:
+                # Add reference images (up to 14 supported)
+                contents.extend(self._reference_parts(references))
+        
+        # Build enhanced prompt with negative constraints embedded
+        full_prompt = prompt
+        if negative_prompt:
+            full_prompt += f"\n\nNEGATIVE CONSTRAINTS (STRICT ADHERENCE REQUIRED): {negative_prompt}"
+        
+        contents.append(full_prompt)
+        
+        # Configure generation with V2 enhancements
+        # Note: Gemini 3 Pro Image has "Thinking" always on, but we can influence
+        # the budget/effort via thinking_config (per Nano Banana research §2.2)
+        if use_provider_cache:
+            # System instruction is part of the cached content
+            prefix_config = {'cached_content': entry['name']}
+        else:
+            prefix_config = {'system_instruction': self._system_instruction}
+        
+        config = types.GenerateContentConfig(
+            response_modalities=['IMAGE', 'TEXT'],
+            # Explicitly set thinking budget for enhanced reasoning (safety, context selection)
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=1024  # Medium reasoning effort
+            ),
+            image_config=types.ImageConfig(
+                aspect_ratio=self.aspect_ratio,
+                image_size=image_size or self.image_size
+            ),
+            **prefix_config
+        )
+        
+        if entry:
+            info['context_cache'] = {
+                'provider': entry['provider'],
+                'name': entry['name'],
+                'hits': entry['hits'],
+            }
+        
+        return {'model': self.model_name, 'contents': contents, 'config': config}
+    
+    @staticmethod
+    def _read_primary_response(response, info: dict) -> Optional[bytes]:
+        """Record usage and extract image bytes from a primary-model response."""
+        info['usage'] = token_counts(response)
+        info['cached_content_token_count'] = info['usage']['cached_tokens']
+        
+        # Extract image from response
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'inline_data') and part.inline_data:
+                return part.inline_data.data
+        
+        print("No image generated in response")
+        return None
+    
+    def _fallback_eligible(self, image_size: str) -> bool:
+        """Only sizes the fallback engine can render may be diverted."""
+        return image_size in self._fallback_config.get('eligible_image_sizes', ['1K'])
+    
+    def _get_fallback_generator(self):
+        """Lazily build the generator that serves diverted calls."""
+        with self._fallback_lock:
+            if self._fallback_generator is None:
+                fallback_model = self._router.fallback_model
+                if self._fallback_config.get('engine', 'v1') == 'v1':
+                    from image_generator import ImageGenerator
+                    self._fallback_generator = ImageGenerator(
+                        model_name=fallback_model,
+                        output_base=str(self.output_base),
+                        aspect_ratio=self.aspect_ratio
                     )
-                    contents.append(image_part)
-            
-            # Build enhanced prompt with negative constraints embedded
-            full_prompt = prompt
+                else:
+                    self._fallback_generator = ImageGeneratorV2(
+                        model_name=fallback_model,
+                        output_base=str(self.output_base),
+                        aspect_ratio=self.aspect_ratio,
+                        image_size=self.image_size,
+                        safety_constitution_path=self._safety_constitution_path
+                    )
+            return self._fallback_generator
+    
+    def _generate_fallback(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        references: list[bytes],
+        cache_label: str,
+        image_size: Optional[str],
+        reason: Optional[str],
+        info: dict
+    ) -> tuple[Optional[bytes], dict]:
+        """Serve a diverted call on the fallback model/engine, at the requested size."""
+        model = self._router.fallback_model
+        engine = self._fallback_config.get('engine', 'v1')
+        generator = self._get_fallback_generator()
+        info['routing'] = {
+            'requested_model': self.model_name,
+            'served_model': model,
+            'fallback': True,
+            'engine': engine,
+            'reason': reason,
+        }
+        
+        start = time.monotonic()
+        if engine == 'v1':
+            # V1 has no system instruction: keep the safety rules and
+            # negative constraints in the prompt text
+            full_prompt = f"{self._system_instruction}\n\n{prompt}" if self._system_instruction else prompt
             if negative_prompt:
                 full_prompt += f"\n\nNEGATIVE CONSTRAINTS (STRICT ADHERENCE REQUIRED): {negative_prompt}"
-            
-            contents.append(full_prompt)
-            
-            # Configure generation with V2 enhancements
-            # Note: Gemini 3 Pro Image has "Thinking" always on, but we can influence
-            # the budget/effort via thinking_config (per Nano Banana research §2.2)
-            config = types.GenerateContentConfig(
-                response_modalities=['IMAGE', 'TEXT'],
-                system_instruction=self._system_instruction,
-                # Explicitly set thinking budget for enhanced reasoning (safety, context selection)
-                thinking_config=types.ThinkingConfig(
-                    thinking_budget=1024  # Medium reasoning effort
-                ),
-            )
-            
-            # Generate
-            response = self._client.models.generate_content(
-                model=self.model_name,
-                contents=contents,
-                config=config
+            image_bytes, fallback_info = generator._generate(prompt=full_prompt, reference_images=references)
+        else:
+            image_bytes, fallback_info = generator._generate(
+                prompt, negative_prompt, references, cache_label,
+                image_size=image_size or self.image_size, allow_fallback=False
             )
-            
-            # Extract image from response
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, 'inline_data') and part.inline_data:
-                    return part.inline_data.data
-            
-            print("No image generated in response")
-            return None
-            
-        except Exception as e:
-            print(f"Error generating image: {e}")
-            return None
+        info['usage'] = fallback_info.get('usage')
+        
+        if image_bytes:
+            self._router.record_success(model, time.monotonic() - start)
+        else:
+            self._router.record_failure(model, 'no image returned')
+        return image_bytes, info
     
     def save_image(
         self,
@@ -199,24 +566,23 @@ class ImageGeneratorV2:
         cupid_name: str,
         prompt: str = "",
         negative_prompt: str = "",
-        metadata: Optional[dict] = None
+        metadata: Optional[dict] = None,
+        on_persisted: Optional[Callable[[Optional[Exception]], None]] = None,
+        image_size: Optional[str] = None
     ) -> tuple[str, str]:
         """
         Save generated image with proper naming and audit log.
         
+        Files are written on the write-behind worker; on_persisted is called
+        there with None on success or the exception on failure.
+        
         Returns:
             Tuple of (image_path, metadata_path)
         """
-        import json
-        
-        # Create directories
         tranche_dir = self.output_base / tranche
-        tranche_dir.mkdir(parents=True, exist_ok=True)
-        
         logs_tranche_dir = self.output_base / "logs" / tranche
-        logs_tranche_dir.mkdir(parents=True, exist_ok=True)
         
-        # Get next counter
+        # Reserve next counter (atomic across threads and processes)
         counter = self._get_next_counter(tranche_dir, cupid_name)
         
         # Build filenames
@@ -224,10 +590,6 @@ class ImageGeneratorV2:
         image_path = tranche_dir / f"{base_filename}.jpg"
         metadata_path = logs_tranche_dir / f"{base_filename}.json"
         
-        # Save image
-        with open(image_path, 'wb') as f:
-            f.write(image_bytes)
-        
         # Build comprehensive audit data
         audit_data = {
             "cupid_name": cupid_name,
@@ -239,7 +601,7 @@ class ImageGeneratorV2:
             "model_id": self.model_name,
             "engine_version": "v2_nanobananapro",
             "aspect_ratio": self.aspect_ratio,
-            "image_size": self.image_size,
+            "image_size": image_size or self.image_size,
             "system_instruction_enabled": bool(self._system_instruction),
             "prompts": {
                 "positive": prompt,
@@ -251,11 +613,51 @@ class ImageGeneratorV2:
         if metadata:
             audit_data.update(metadata)
         
-        with open(metadata_path, 'w') as f:
-            json.dump(audit_data, f, indent=2)
+        # Persist image then audit log on the write-behind worker,
+        # transcoding and rendering derivatives there first
+        prepare = None
+        if self._derivatives:
+            def prepare(writes):
+                return self._derivatives.expand_writes(
+                    image_path, image_bytes, tranche, audit_data
+                ) + writes[1:]
+        
+        self._writer.submit(
+            [(image_path, image_bytes), (metadata_path, audit_data)],
+            on_done=self._persist_callback(tranche_dir, cupid_name, counter, on_persisted, metadata_path, audit_data),
+            prepare=prepare
+        )
         
         return str(image_path), str(metadata_path)
     
+    def _persist_callback(
+        self,
+        tranche_dir: Path,
+        cupid_name: str,
+        counter: int,
+        on_persisted: Optional[Callable[[Optional[Exception]], None]],
+        metadata_path: Optional[Path] = None,
+        audit_data: Optional[dict] = None
+    ) -> Callable[[Optional[Exception]], None]:
+        """Wrap on_persisted to give back the counter if the write failed (or index the saved image)."""
+        def _done(error: Optional[Exception]) -> None:
+            if error:
+                self._counters.release(tranche_dir, cupid_name, counter)
+            elif metadata_path is not None:
+                notify_image_saved(metadata_path, audit_data)
+            if on_persisted:
+                on_persisted(error)
+        return _done
+    
+    def flush(self) -> list[dict]:
+        """Wait for all pending image/audit writes (batch-end barrier)."""
+        return self._writer.flush()
+    
+    @property
+    def router(self):
+        """Model router (health, quotas, fallback decisions)."""
+        return self._router
+    
     def generate_and_save(
         self,
         prompt: str,
@@ -263,51 +665,177 @@ class ImageGeneratorV2:
         tranche: str,
         cupid_name: str,
         reference_images: Optional[list[bytes]] = None,
-        metadata: Optional[dict] = None
+        metadata: Optional[dict] = None,
+        image_size: Optional[str] = None,
+        allow_fallback: bool = True
     ) -> dict:
         """
         Generate and save an image with full V2 audit trail.
         
+        Args:
+            image_size: Override output resolution (e.g. draft vs final render)
+            allow_fallback: Whether the call may be diverted to the fallback model
+        
         Returns:
-            Dict with 'success', 'path', 'metadata_path', and 'error' keys
+            Dict with 'success', 'path', 'metadata_path', 'persisted' and
+            'error' keys; 'persisted' stays None until the write-behind
+            worker has written the files (see flush())
         """
-        result = {
+        result = self._new_result(prompt)
+        
+        # Generate
+        start = time.monotonic()
+        image_bytes, gen_info = self._generate(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            reference_images=reference_images,
+            cache_label=cupid_name,
+            image_size=image_size,
+            allow_fallback=allow_fallback
+        )
+        gen_info['elapsed_seconds'] = time.monotonic() - start
+        
+        return self._save_result(
+            result, image_bytes, gen_info, tranche, cupid_name, prompt, negative_prompt, metadata, image_size
+        )
+    
+    async def agenerate_and_save(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        tranche: str,
+        cupid_name: str,
+        reference_images: Optional[list[bytes]] = None,
+        metadata: Optional[dict] = None,
+        image_size: Optional[str] = None,
+        allow_fallback: bool = True
+    ) -> dict:
+        """Async generate_and_save(); saving runs on a worker thread."""
+        result = self._new_result(prompt)
+        
+        start = time.monotonic()
+        image_bytes, gen_info = await self._agenerate(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            reference_images=reference_images,
+            cache_label=cupid_name,
+            image_size=image_size,
+            allow_fallback=allow_fallback
+        )
+        gen_info['elapsed_seconds'] = time.monotonic() - start
+        
+        # Counter reservation and write-behind back-pressure can block
+        return await asyncio.to_thread(
+            self._save_result,
+            result, image_bytes, gen_info, tranche, cupid_name, prompt, negative_prompt, metadata, image_size
+        )
+    
+    @staticmethod
+    def _new_result(prompt: str) -> dict:
+        """Empty generate_and_save result."""
+        return {
             'success': False,
             'path': None,
             'metadata_path': None,
+            'persisted': None,
             'error': None,
             'engine_version': 'v2_nanobananapro',
+            'cached_tokens': 0,
             'prompt_used': prompt[:200] + '...' if len(prompt) > 200 else prompt
         }
+    
+    def _save_result(
+        self,
+        result: dict,
+        image_bytes: Optional[bytes],
+        gen_info: dict,
+        tranche: str,
+        cupid_name: str,
+        prompt: str,
+        negative_prompt: str,
+        metadata: Optional[dict],
+        image_size: Optional[str]
+    ) -> dict:
+        """Queue a generated image for saving and fill in the result."""
+        result['cached_tokens'] = gen_info['cached_content_token_count']
+        result['routing'] = gen_info['routing']
         
-        # Generate
-        image_bytes = self.generate_image(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            reference_images=reference_images
-        )
+        # Where the generation time went: quota wait vs the call itself
+        routing = gen_info['routing'] or {}
+        queue_seconds = gen_info['queue_seconds']
+        result['timing'] = {
+            'model': routing.get('served_model', self.model_name),
+            'queue_seconds': queue_seconds,
+            'call_seconds': gen_info.get('elapsed_seconds', queue_seconds) - queue_seconds,
+            'save_seconds': 0.0,
+        }
+        tokens = gen_info.get('usage')
+        result['usage'] = usage_record('generation', result['timing']['model'], tokens) if tokens else None
         
         if not image_bytes:
             result['error'] = 'Image generation failed'
             return result
         
+        # Record how the request prefix was served
+        metadata = dict(metadata or {})
+        metadata['context_cache'] = {
+            'enabled': self._context_cache is not None,
+            'entry': gen_info['context_cache'],
+            'cached_content_token_count': gen_info['cached_content_token_count'],
+        }
+        
+        # Tag which model actually served the image
+        metadata['routing'] = routing
+        if routing.get('fallback'):
+            metadata['model'] = routing['served_model']
+            metadata['model_id'] = routing['served_model']
+        
+        # Upstream stage spans plus this image's generation call
+        timing = result['timing']
+        metadata['timings'] = list(metadata.get('timings', [])) + [
+            make_span('op', 'generation', timing['call_seconds'], timing['queue_seconds'], timing['model'])
+        ]
+        if result['usage']:
+            metadata['usage'] = list(metadata.get('usage', [])) + [result['usage']]
+        
         # Save with audit log
+        save_start = time.monotonic()
         try:
+            # Mark success before queuing so a fast write-behind failure
+            # callback cannot be overwritten below
+            result['success'] = True
             image_path, metadata_path = self.save_image(
                 image_bytes=image_bytes,
                 tranche=tranche,
                 cupid_name=cupid_name,
                 prompt=prompt,
                 negative_prompt=negative_prompt,
-                metadata=metadata
+                metadata=metadata,
+                on_persisted=lambda error: self._record_persisted(result, error),
+                image_size=image_size
             )
-            result['success'] = True
             result['path'] = image_path
             result['metadata_path'] = metadata_path
         except Exception as e:
+            result['success'] = False
             result['error'] = f'Failed to save: {e}'
+            return result
+        finally:
+            timing['save_seconds'] = time.monotonic() - save_start
+        
+        # Fallback images can be re-rendered on the primary once it recovers
+        if routing.get('fallback') and self._fallback_config.get('queue_rerender', True):
+            self._render_queue.enqueue('rerender_primary', cupid_name, {'log': metadata_path})
         
         return result
+    
+    @staticmethod
+    def _record_persisted(result: dict, error: Optional[Exception]) -> None:
+        """Report the write-behind outcome back into a generate_and_save result."""
+        result['persisted'] = error is None
+        if error:
+            result['success'] = False
+            result['error'] = f'Failed to save: {error}'
 
 
 def create_image_generator_v2(config: Optional[dict] = None) -> ImageGeneratorV2:
@@ -321,7 +849,12 @@ def create_image_generator_v2(config: Optional[dict] = None) -> ImageGeneratorV2
             image_size=v2_config.get('image_size', '1K'),
             counter_start=config.get('output', {}).get('counter_start', 101),
             counter_max=config.get('output', {}).get('counter_max', 110),
-            safety_constitution_path=v2_config.get('system_instruction_file', 'safety_constitution.yaml')
+            safety_constitution_path=v2_config.get('system_instruction_file', 'safety_constitution.yaml'),
+            context_cache_config=v2_config.get('context_cache'),
+            file_store_config=config.get('generation', {}).get('file_store'),
+            write_behind_config=config.get('output', {}).get('write_behind'),
+            derivatives_config=config.get('output', {}).get('derivatives'),
+            routing_config=config.get('generation', {}).get('routing')
         )
     return ImageGeneratorV2()
 
@@ -335,3 +868,4 @@ if __name__ == "__main__":
     print(f"System Instruction loaded: {bool(generator._system_instruction)}")
     print(f"Aspect Ratio: {generator.aspect_ratio}")
     print(f"Image Size: {generator.image_size}")
+    print(f"Context cache: {generator._context_cache.provider if generator._context_cache else 'disabled'}")
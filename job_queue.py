@@ -0,0 +1,515 @@
+"""
+Background Generation Jobs for AI Product Imagery Workflow
+
+The review UI submits generation as jobs instead of running the workflow
+inside the HTTP request. A fixed pool of worker threads runs them on the
+shared workflow (see shared_workflows.py) with run_iter(), so a job
+reports which stage it is in and each image as soon as it is on disk:
+
+    queued -> running (stage: lookup, fetch, vision, ...) -> done | failed
+
+Every job has a priority class (scheduler.py): 'interactive' for UI
+clicks, 'regenerate' for feedback re-runs, 'bulk' for tranche submissions.
+All classes share one queue and worker pool, but the next job to start is
+picked by weighted fair share between the classes with queued work, and
+reserved workers only ever take interactive jobs, so a click starts within
+seconds even behind a tranche of hundreds. While a job runs, its class also
+applies to the model quota it draws (RateLimiter fair share).
+
+Jobs live in memory; finished jobs are kept for status polling until
+max_finished newer jobs have finished. Progress is also pushed as it
+happens through on_event (the review UI forwards it to browsers as
+server-sent events, see events.py).
+
+With a StateDB (production serving, several worker processes) every job
+change is also written to its jobs table. A job still runs in the process
+it was submitted to, but status queries, listings and the "already queued
+or running" check see the jobs of all processes. Jobs left queued or
+running by a process that exited are marked failed when a queue starts.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional
+
+from scheduler import PRIORITY_CLASSES, WeightedFairShare, priority_class
+
+
+class JobQueue:
+    """In-process, priority-scheduled queue of generation jobs with a worker thread pool."""
+
+    def __init__(
+        self,
+        workflows,
+        workers: int = 2,
+        reserved_interactive_workers: int = 1,
+        max_finished: int = 500,
+        priority_weights: Optional[dict] = None,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+        store=None
+    ):
+        """
+        Initialize job queue (workers start with start() or the first submit()).
+
+        Args:
+            workflows: SharedWorkflows providing the workflow for each job
+            workers: Worker threads that take jobs of any class
+            reserved_interactive_workers: Extra worker threads that only
+                take interactive jobs
+            max_finished: Finished jobs kept for status queries
+            priority_weights: Priority class -> share of job starts while
+                classes compete
+            on_event: Called outside the queue lock with ('job', progress)
+                on every status or stage change and ('image', {'job_id',
+                'cupid_name', 'record'}) for every image saved
+            store: StateDB shared with other processes (None: this process only)
+        """
+        self.workflows = workflows
+        self.workers = max(1, workers)
+        self.reserved_interactive_workers = max(0, reserved_interactive_workers)
+        self.max_finished = max_finished
+        self.on_event = on_event
+        self.store = store
+
+        self._jobs: dict[str, dict] = {}
+        self._queued: dict[str, deque[str]] = {name: deque() for name in PRIORITY_CLASSES}
+        self._finished: deque[str] = deque()
+        self._fair = WeightedFairShare(priority_weights)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._seq = itertools.count()
+        self._workers_pid = None
+
+    def start(self) -> None:
+        """Start the worker threads in this process (again in a forked worker)."""
+        with self._lock:
+            if self._workers_pid == os.getpid():
+                return
+            self._workers_pid = os.getpid()
+        if self.store:
+            self._fail_orphaned_jobs()
+
+        workers = [
+            threading.Thread(target=self._worker, args=(False,), name=f"job-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ] + [
+            threading.Thread(target=self._worker, args=(True,), name=f"job-worker-interactive-{i}", daemon=True)
+            for i in range(self.reserved_interactive_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+    def submit(
+        self,
+        cupid_name: str,
+        selected_ghost_urls: Optional[list[str]] = None,
+        group: Optional[str] = None,
+        priority: str = 'interactive',
+        on_finish: Optional[Callable[[dict], None]] = None
+    ) -> dict:
+        """
+        Queue generation for one product.
+
+        A product that is already queued or running is not queued twice;
+        its existing job is returned instead, moved up to this priority if
+        it was still queued at a lower one.
+
+        Args:
+            cupid_name: Product cupidName or SKU
+            selected_ghost_urls: Reference images chosen in the UI
+            group: Bulk submission id the job belongs to
+            priority: 'interactive', 'regenerate' or 'bulk'
+            on_finish: Called with the finished job's snapshot
+
+        Returns:
+            Job snapshot (see get())
+
+        Raises:
+            ValueError: If priority is not a known class
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        self.start()
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job['cupid_name'] == cupid_name and job['status'] in ('queued', 'running'):
+                    if job['status'] == 'queued' and self._outranks(priority, job['priority']):
+                        self._queued[job['priority']].remove(job['job_id'])
+                        self._queued[priority].append(job['job_id'])
+                        job['priority'] = priority
+                        self._ready.notify_all()
+                        self._save(job)
+                    return self._snapshot(job)
+
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'cupid_name': cupid_name,
+                'group': group,
+                'priority': priority,
+                'status': 'queued',
+                'stage': None,
+                'stages_done': [],
+                'images': [],
+                'result': None,
+                'error': None,
+                'engine': None,
+                'submitted_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                '_selected_ghost_urls': selected_ghost_urls or [],
+                '_on_finish': on_finish,
+                '_seq': next(self._seq),
+                '_version': 0,
+            }
+            # Queued or running in another worker process
+            if self.store:
+                active = self._insert_if_idle(job)
+                if active:
+                    return active
+            self._jobs[job['job_id']] = job
+            self._queued[priority].append(job['job_id'])
+            self._ready.notify_all()
+            snapshot = self._snapshot(job)
+            progress = self._progress(job)
+        self._emit('job', progress)
+        return snapshot
+
+    def submit_many(
+        self,
+        product_ids: list[str],
+        priority: str = 'bulk',
+        on_finish: Optional[Callable[[dict], None]] = None
+    ) -> dict:
+        """
+        Queue generation for many products (e.g. a tranche) as one group.
+
+        Returns:
+            {'group': id, 'jobs': [job snapshots]}
+        """
+        group = uuid.uuid4().hex[:12]
+        return {
+            'group': group,
+            'jobs': [self.submit(pid, group=group, priority=priority, on_finish=on_finish) for pid in product_ids]
+        }
+
+    @staticmethod
+    def _outranks(priority: str, other: str) -> bool:
+        return PRIORITY_CLASSES.index(priority) < PRIORITY_CLASSES.index(other)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Current state of a job (None if unknown or expired).
+
+        Returns:
+            Dict with 'job_id', 'cupid_name', 'group', 'priority',
+            'status', 'stage' (running stage), 'stages_done', 'images'
+            (image records so far), 'result' (product record when done),
+            'error', 'engine', 'position' (jobs of the same class ahead
+            while queued) and timestamps
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                snapshot = self._snapshot(job)
+                if job['status'] == 'queued':
+                    snapshot['position'] = self._queued[job['priority']].index(job_id)
+                return snapshot
+        if self.store:
+            rows = self.store.query("SELECT job FROM jobs WHERE job_id = ?", (job_id,))
+            return json.loads(rows[0]['job']) if rows else None
+        return None
+
+    def list(self, group: Optional[str] = None) -> list[dict]:
+        """Snapshots of known jobs, optionally only one bulk group."""
+        if self.store:
+            rows = self.store.query(
+                "SELECT job FROM jobs WHERE ? IS NULL OR grp = ? ORDER BY seq", (group, group)
+            )
+            return [json.loads(row['job']) for row in rows]
+        with self._lock:
+            return [self._snapshot(job) for job in self._jobs.values() if not group or job['group'] == group]
+
+    def summary(self, group: Optional[str] = None) -> dict:
+        """Job counts by status, plus queued jobs per priority class."""
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        queued = {name: 0 for name in PRIORITY_CLASSES}
+        if self.store:
+            rows = self.store.query(
+                "SELECT status, priority, COUNT(*) AS n FROM jobs WHERE ? IS NULL OR grp = ? "
+                "GROUP BY status, priority", (group, group)
+            )
+            for row in rows:
+                counts[row['status']] += row['n']
+                if row['status'] == 'queued':
+                    queued[row['priority']] += row['n']
+            return {**counts, 'queued_by_priority': queued}
+        with self._lock:
+            for job in self._jobs.values():
+                if not group or job['group'] == group:
+                    counts[job['status']] += 1
+                    if job['status'] == 'queued':
+                        queued[job['priority']] += 1
+        return {**counts, 'queued_by_priority': queued}
+
+    def _snapshot(self, job: dict) -> dict:
+        """Copy of a job for callers (caller holds the lock)."""
+        snapshot = {k: v for k, v in job.items() if not k.startswith('_')}
+        snapshot['stages_done'] = list(job['stages_done'])
+        snapshot['images'] = list(job['images'])
+        return snapshot
+
+    def _save(self, job: dict) -> None:
+        """
+        Write a job's current state to the store (caller holds the lock).
+
+        Rows carry the job's change counter, so an older state never
+        overwrites a newer one.
+        """
+        if not self.store:
+            return
+        job['_version'] += 1
+        try:
+            with self.store.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, cupid, grp, priority, status, owner, version, seq, job, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (job_id) DO UPDATE SET priority = excluded.priority, status = excluded.status, "
+                    "version = excluded.version, job = excluded.job, updated = excluded.updated "
+                    "WHERE excluded.version > jobs.version",
+                    self._row(job)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: could not save job {job['job_id']}: {e}")
+
+    def _row(self, job: dict) -> tuple:
+        """jobs table row for a job (caller holds the lock)."""
+        return (
+            job['job_id'], job['cupid_name'], job['group'], job['priority'], job['status'],
+            os.getpid(), job['_version'], job['_submitted_ns'], json.dumps(self._snapshot(job)), time.time()
+        )
+
+    def _insert_if_idle(self, job: dict) -> Optional[dict]:
+        """
+        Record a new job unless its product is queued or running in any
+        process (caller holds the lock).
+
+        Returns:
+            The active job's snapshot, or None if job was recorded
+        """
+        job['_submitted_ns'] = time.time_ns()
+        job['_version'] = 1
+        with self.store.transaction() as conn:
+            active = conn.execute(
+                "SELECT job FROM jobs WHERE cupid = ? AND status IN ('queued', 'running') LIMIT 1",
+                (job['cupid_name'],)
+            ).fetchone()
+            if active:
+                return json.loads(active['job'])
+            conn.execute(
+                "INSERT INTO jobs (job_id, cupid, grp, priority, status, owner, version, seq, job, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._row(job)
+            )
+        return None
+
+    def _fail_orphaned_jobs(self) -> None:
+        """Mark jobs whose process has exited (worker restart, crash) as failed."""
+        try:
+            rows = self.store.query("SELECT job_id, owner, job FROM jobs WHERE status IN ('queued', 'running')")
+            for row in rows:
+                if _process_alive(row['owner']):
+                    continue
+                job = json.loads(row['job'])
+                job.update({
+                    'status': 'failed',
+                    'stage': None,
+                    'error': 'Server worker exited before the job finished; submit it again',
+                    'finished_at': datetime.now().isoformat(),
+                })
+                with self.store.transaction() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', version = version + 1, job = ?, updated = ? "
+                        "WHERE job_id = ? AND status IN ('queued', 'running')",
+                        (json.dumps(job), time.time(), row['job_id'])
+                    )
+                print(f"[Job {row['job_id']}] {job['cupid_name']}: failed (worker exited)")
+        except sqlite3.Error as e:
+            print(f"Warning: could not check for orphaned jobs: {e}")
+
+    def _expire_finished_in_store(self) -> None:
+        """Keep only the max_finished most recently finished jobs in the store."""
+        try:
+            with self.store.transaction() as conn:
+                conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('done', 'failed') AND job_id NOT IN ("
+                    "SELECT job_id FROM jobs WHERE status IN ('done', 'failed') ORDER BY updated DESC LIMIT ?)",
+                    (self.max_finished,)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: could not expire finished jobs: {e}")
+
+    @staticmethod
+    def _progress(job: dict) -> dict:
+        """Compact job state for progress events (caller holds the lock)."""
+        return {
+            'job_id': job['job_id'],
+            'cupid_name': job['cupid_name'],
+            'group': job['group'],
+            'priority': job['priority'],
+            'status': job['status'],
+            'stage': job['stage'],
+            'stages_done': list(job['stages_done']),
+            'image_count': len(job['images']),
+            'error': job['error'],
+        }
+
+    def _emit(self, kind: str, data: dict) -> None:
+        """Deliver a progress event; a failing listener never fails the job."""
+        if not self.on_event:
+            return
+        try:
+            self.on_event(kind, data)
+        except Exception as e:
+            print(f"Warning: job event listener failed: {e}")
+
+    def _next_job(self, interactive_only: bool) -> str:
+        """Block until there is a job this worker may run; dequeue it by fair share."""
+        with self._ready:
+            while True:
+                classes = ('interactive',) if interactive_only else PRIORITY_CLASSES
+                waiting = [name for name in classes if self._queued[name]]
+                if waiting:
+                    name = self._fair.choose(waiting)
+                    self._fair.charge(name)
+                    job_id = self._queued[name].popleft()
+                    job = self._jobs[job_id]
+                    job['status'] = 'running'
+                    job['started_at'] = datetime.now().isoformat()
+                    self._save(job)
+                    return job_id
+                self._ready.wait()
+
+    def _worker(self, interactive_only: bool) -> None:
+        """Run queued jobs until the process exits."""
+        while True:
+            job_id = self._next_job(interactive_only)
+            try:
+                self._run(job_id)
+            except Exception as e:
+                self._finish(job_id, 'failed', error=f"Job failed: {e}")
+
+    def _run(self, job_id: str) -> None:
+        """Run one job on the shared workflow, recording progress."""
+        with self._lock:
+            job = self._jobs[job_id]
+            cupid_name = job['cupid_name']
+            selected_ghost_urls = job['_selected_ghost_urls']
+            priority = job['priority']
+
+        engine = self.workflows.engine
+        workflow = self.workflows.get(engine)
+        with self._lock:
+            job['engine'] = engine
+            self._save(job)
+        print(f"[Job {job_id}] {cupid_name}: started ({engine}, {priority})")
+
+        def on_stage(stage: str) -> None:
+            with self._lock:
+                if job['stage']:
+                    job['stages_done'].append(job['stage'])
+                job['stage'] = stage
+                self._save(job)
+                progress = self._progress(job)
+            self._emit('job', progress)
+
+        result = None
+        # Model quota is drawn at this job's priority
+        with priority_class(priority):
+            records = workflow.run_iter(cupid_name, selected_ghost_urls=selected_ghost_urls, on_stage=on_stage)
+            for record in records:
+                if record['type'] != 'image':
+                    result = record
+                    continue
+                with self._lock:
+                    job['images'].append(record)
+                    self._save(job)
+                self._emit('image', {'job_id': job_id, 'cupid_name': cupid_name, 'record': record})
+
+        if result and result['success']:
+            self._finish(job_id, 'done', result=result)
+        else:
+            errors = (result or {}).get('errors') or ['No images generated']
+            self._finish(job_id, 'failed', result=result, error='; '.join(map(str, errors)))
+
+    def _finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        """Mark a job finished and expire the oldest finished jobs."""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job['stage']:
+                job['stages_done'].append(job['stage'])
+            job.update({
+                'status': status,
+                'stage': None,
+                'result': result,
+                'error': error,
+                'finished_at': datetime.now().isoformat(),
+            })
+            job.pop('_selected_ghost_urls', None)
+            on_finish = job.pop('_on_finish', None)
+            self._save(job)
+            snapshot = self._snapshot(job)
+            progress = self._progress(job)
+
+            self._finished.append(job_id)
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.popleft(), None)
+        if self.store:
+            self._expire_finished_in_store()
+        print(f"[Job {job_id}] {job['cupid_name']}: {status}" + (f" ({error})" if error else ""))
+        self._emit('job', progress)
+
+        if on_finish:
+            try:
+                on_finish(snapshot)
+            except Exception as e:
+                print(f"Warning: job {job_id} finish callback failed: {e}")
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this id exists on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def create_job_queue(
+    workflows,
+    config: Optional[dict] = None,
+    on_event: Optional[Callable[[str, dict], None]] = None,
+    store=None
+) -> JobQueue:
+    """Factory function to create JobQueue from review_ui and generation.routing config."""
+    config = config or {}
+    review_config = config.get('review_ui', {}) or {}
+    routing_config = config.get('generation', {}).get('routing', {}) or {}
+    return JobQueue(
+        workflows,
+        workers=review_config.get('job_workers', 2),
+        reserved_interactive_workers=review_config.get('reserved_interactive_workers', 1),
+        max_finished=review_config.get('max_finished_jobs', 500),
+        priority_weights=routing_config.get('priority_weights'),
+        on_event=on_event,
+        store=store
+    )
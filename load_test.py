@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Local Load Test for the Review UI
+
+Measures what a reviewer's browser costs the server when it (re)opens
+products: the product list, then every generated image's thumbnail,
+preview and full-size file. Each URL set is fetched in three modes:
+
+    cold         no cached copy (first visit, or before HTTP caching)
+    revalidate   cached copy with its ETag (If-None-Match -> 304)
+    range        first 64 KB of full-size images (Range request)
+
+Immutable URLs (Cache-Control: immutable) cost nothing on a warm reload;
+they are counted as 'skipped' in the revalidate pass.
+
+Usage:
+    python review_ui.py &
+    python load_test.py --products 20 --rounds 5 --concurrency 8
+"""
+
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+
+def fetch(url: str, headers: dict) -> dict:
+    """One GET; returns status, body bytes on the wire, latency and cache headers."""
+    req = urllib.request.Request(url, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            body = resp.read()
+            status, resp_headers = resp.status, resp.headers
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status, resp_headers = e.code, e.headers
+    return {
+        'url': url,
+        'status': status,
+        'bytes': len(body),
+        'seconds': time.perf_counter() - start,
+        'etag': resp_headers.get('ETag'),
+        'immutable': 'immutable' in (resp_headers.get('Cache-Control') or ''),
+    }
+
+
+def run_pass(requests: list[tuple[str, dict]], concurrency: int) -> dict:
+    """Fetch (url, headers) pairs concurrently and summarize."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda r: fetch(*r), requests))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r['seconds'] * 1000 for r in results) or [0.0]
+    statuses: dict[int, int] = {}
+    for r in results:
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    return {
+        'requests': len(results),
+        'statuses': statuses,
+        'bytes': sum(r['bytes'] for r in results),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'req_per_s': round(len(results) / elapsed, 1) if elapsed else None,
+        'results': results,
+    }
+
+
+def discover_urls(base: str, products: int) -> tuple[list[str], list[str], list[str]]:
+    """Product list URL, image URLs (thumb, preview, full) and full-size URLs of products with images."""
+    list_url = f"{base}/api/products?has_images=true&limit={products}"
+    with urllib.request.urlopen(list_url, timeout=30) as resp:
+        listing = json.load(resp)
+
+    image_urls, full_urls = [], []
+    for product in listing['products']:
+        with urllib.request.urlopen(f"{base}/api/product/{quote(product['cupid_name'])}", timeout=30) as resp:
+            detail = json.load(resp)
+        for img in detail.get('generated_images', []):
+            version = f"?v={img['version']}" if img.get('version') else ""
+            for key in ('thumb_path', 'preview_path', 'path'):
+                url = f"{base}/output/{quote(img[key])}{version}"
+                if url not in image_urls:
+                    image_urls.append(url)
+            full_urls.append(f"{base}/output/{quote(img['path'])}{version}")
+    return [list_url], image_urls, full_urls
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Load test review UI caching')
+    parser.add_argument('--base', default='http://localhost:8080', help='Review UI base URL')
+    parser.add_argument('--products', type=int, default=20, help='Products with images to open')
+    parser.add_argument('--rounds', type=int, default=3, help='Times each URL is requested per pass')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    api_urls, image_urls, full_urls = discover_urls(args.base, args.products)
+    if not image_urls:
+        print("No generated images found; generate some first")
+        return 1
+
+    encoding = {'Accept-Encoding': 'br, gzip'}
+    report = {}
+    for name, urls in (('api', api_urls), ('images', image_urls)):
+        cold = run_pass([(url, encoding) for url in urls * args.rounds], args.concurrency)
+
+        # Warm reload: immutable URLs are served from the browser cache,
+        # the rest revalidate with the ETag from the cold pass
+        etags = {r['url']: r for r in cold['results']}
+        revalidate = [
+            (url, {**encoding, 'If-None-Match': etags[url]['etag']})
+            for url in urls * args.rounds
+            if etags[url]['etag'] and not etags[url]['immutable']
+        ]
+        warm = run_pass(revalidate, args.concurrency)
+        warm['skipped'] = len(urls) * args.rounds - len(revalidate)
+
+        report[name] = {'cold': cold, 'revalidate': warm}
+
+    report['images']['range'] = run_pass(
+        [(url, {'Range': 'bytes=0-65535'}) for url in full_urls * args.rounds], args.concurrency
+    )
+
+    for section in report.values():
+        for summary in section.values():
+            summary.pop('results')
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{'pass':<22}{'requests':>9}{'skipped':>9}{'bytes':>14}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>9}  statuses")
+    for name, section in report.items():
+        for mode, s in section.items():
+            print(f"{name + ' ' + mode:<22}{s['requests']:>9}{s.get('skipped', 0):>9}{s['bytes']:>14}"
+                  f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['req_per_s'] or '-':>9}  {s['statuses']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
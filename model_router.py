@@ -0,0 +1,382 @@
+"""
+Model Routing for AI Product Imagery Workflow
+
+Tracks per-model health (consecutive failures, rate-limit cooldowns,
+latency) and request quotas, and decides whether a generation call goes to
+the primary image model or a configured fallback.
+"""
+
+import multiprocessing
+import threading
+import time
+from typing import Optional
+
+from scheduler import WeightedFairShare, current_priority_class
+
+
+RATE_LIMIT_MARKERS = ('429', 'RESOURCE_EXHAUSTED', 'rate limit', 'quota')
+
+
+def is_rate_limit_error(error) -> bool:
+    """Heuristic check for provider rate-limit / quota errors."""
+    message = str(error)
+    return any(marker.lower() in message.lower() for marker in RATE_LIMIT_MARKERS)
+
+
+class RateLimiter:
+    """
+    Token bucket limiting requests per minute.
+
+    When callers of several priority classes are waiting for tokens, each
+    token goes to the class whose weighted fair share is furthest behind
+    (see scheduler.py), so interactive calls are not stuck behind a bulk
+    backlog.
+    """
+
+    def __init__(self, requests_per_minute: float, weights: Optional[dict] = None):
+        """
+        Initialize rate limiter.
+
+        Args:
+            requests_per_minute: Sustained request budget (also the burst size)
+            weights: Priority class -> share of the budget under contention
+        """
+        self.capacity = max(1.0, float(requests_per_minute))
+        self.refill_per_second = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._init_fair_share(weights)
+
+    def _init_fair_share(self, weights: Optional[dict] = None) -> None:
+        """Per-process waiter bookkeeping for weighted fair share."""
+        self._weights = weights
+        self._fair = WeightedFairShare(weights)
+        self._fair_cond = threading.Condition()
+        self._waiting: dict[str, int] = {}
+
+    def _refill(self) -> None:
+        """Add tokens for elapsed time (caller holds the lock)."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def _take(self) -> tuple[bool, float]:
+        """Take a token if available; else report seconds until one is."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True, 0.0
+            return False, (1 - self._tokens) / self.refill_per_second
+
+    def _is_turn(self, priority: str) -> bool:
+        """Whether priority is next in line (caller holds _fair_cond)."""
+        waiting = {name for name, count in self._waiting.items() if count > 0}
+        waiting.add(priority)
+        return self._fair.choose(waiting) == priority
+
+    def try_acquire(self, priority: Optional[str] = None) -> bool:
+        """
+        Take a token if one is available right now and no class that is
+        ahead in the fair share is waiting for it.
+
+        Args:
+            priority: Priority class (default: the calling context's)
+        """
+        priority = priority or current_priority_class()
+        with self._fair_cond:
+            if not self._is_turn(priority):
+                return False
+            taken, _ = self._take()
+            if taken:
+                self._fair.charge(priority)
+            return taken
+
+    def acquire(self, timeout: Optional[float] = None, priority: Optional[str] = None) -> float:
+        """
+        Block until a token is available and it is this class's turn.
+
+        Args:
+            timeout: Maximum seconds to wait
+            priority: Priority class (default: the calling context's)
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            TimeoutError: If no token became available within timeout
+        """
+        priority = priority or current_priority_class()
+        start = time.monotonic()
+        with self._fair_cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    wait = 1.0
+                    if self._is_turn(priority):
+                        taken, wait = self._take()
+                        if taken:
+                            self._fair.charge(priority)
+                            return time.monotonic() - start
+                    
+                    if timeout is not None and time.monotonic() - start + wait > timeout:
+                        raise TimeoutError("Rate limit budget exhausted")
+                    # Woken early when another waiter is granted a token
+                    self._fair_cond.wait(min(wait, 1.0))
+            finally:
+                self._waiting[priority] -= 1
+                self._fair_cond.notify_all()
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Token bucket shared by several processes.
+
+    Bucket state lives in shared memory guarded by a multiprocessing lock,
+    so every worker process draws from the same per-minute budget. Pass
+    instances to child processes at creation (e.g. pool initargs).
+    """
+
+    def __init__(self, requests_per_minute: float, context=None, weights: Optional[dict] = None):
+        """
+        Initialize shared rate limiter.
+
+        Args:
+            requests_per_minute: Sustained request budget across all processes
+            context: multiprocessing context used by the pool (default context
+                if None)
+            weights: Priority class -> share of the budget under contention
+        """
+        context = context or multiprocessing.get_context()
+        self.capacity = max(1.0, float(requests_per_minute))
+        self.refill_per_second = self.capacity / 60.0
+        # [tokens, last refill]; CLOCK_MONOTONIC is system-wide
+        self._state = context.RawArray('d', [self.capacity, time.monotonic()])
+        self._lock = context.Lock()
+        # Fair share between priority classes is per process
+        self._init_fair_share(weights)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for key in ('_fair', '_fair_cond', '_waiting'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_fair_share(state.get('_weights'))
+
+    @property
+    def _tokens(self) -> float:
+        return self._state[0]
+
+    @_tokens.setter
+    def _tokens(self, value: float) -> None:
+        self._state[0] = value
+
+    @property
+    def _updated(self) -> float:
+        return self._state[1]
+
+    @_updated.setter
+    def _updated(self, value: float) -> None:
+        self._state[1] = value
+
+
+class ModelRouter:
+    """Chooses the serving model per call from health and quota state."""
+
+    def __init__(
+        self,
+        primary_model: str,
+        fallback_model: Optional[str] = None,
+        quotas: Optional[dict] = None,
+        max_consecutive_failures: int = 3,
+        cooldown_seconds: float = 60,
+        slow_call_seconds: float = 120,
+        priority_weights: Optional[dict] = None
+    ):
+        """
+        Initialize router.
+
+        Args:
+            primary_model: Preferred model ID
+            fallback_model: Model ID to divert to (None disables diversion)
+            quotas: Model ID -> requests per minute
+            max_consecutive_failures: Failures before a model is benched
+            cooldown_seconds: How long a benched / rate-limited model rests
+            slow_call_seconds: Latency (EWMA) above which a model counts as
+                slow; a slow model rests for cooldown_seconds, then one probe
+                call goes through and its latency decides whether it recovers
+            priority_weights: Priority class -> share of each model's quota
+                when classes compete for it (see scheduler.py)
+        """
+        self.primary_model = primary_model
+        self.fallback_model = fallback_model
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.slow_call_seconds = slow_call_seconds
+
+        self.limiters = {
+            model: RateLimiter(rpm, priority_weights) for model, rpm in (quotas or {}).items() if rpm
+        }
+        self._health: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def share_limiters(self, limiters: dict[str, RateLimiter]) -> None:
+        """Use externally owned quota buckets (e.g. SharedRateLimiter across worker processes)."""
+        self.limiters.update(limiters)
+
+    def _state(self, model: str) -> dict:
+        """Health record for a model (caller holds the lock)."""
+        if model not in self._health:
+            self._health[model] = {
+                'calls': 0,
+                'failures': 0,
+                'rate_limited': 0,
+                'consecutive_failures': 0,
+                'latency_ewma': None,
+                'cooldown_until': 0.0,
+                'slow_until': 0.0,
+                'probing': False,
+                'last_error': None,
+            }
+        return self._health[model]
+
+    def unhealthy_reason(self, model: str) -> Optional[str]:
+        """Why a model should not take traffic right now (None if healthy)."""
+        with self._lock:
+            state = self._state(model)
+            now = time.monotonic()
+            if state['cooldown_until'] > now:
+                return 'cooling_down'
+            if state['slow_until'] > now:
+                return 'slow'
+        return None
+
+    def _claim_probe(self, model: str) -> bool:
+        """
+        Whether this call is a slow model's recovery probe.
+
+        After a slow model's rest, the first call to it probes; calls that
+        follow keep being diverted until the probe reports its latency.
+        """
+        with self._lock:
+            state = self._state(model)
+            latency = state['latency_ewma']
+            if latency is None or latency <= self.slow_call_seconds:
+                return False
+            state['slow_until'] = time.monotonic() + self.cooldown_seconds
+            state['probing'] = True
+            return True
+
+    def is_healthy(self, model: str) -> bool:
+        """True if the model is not cooling down or slow."""
+        return self.unhealthy_reason(model) is None
+
+    def select(self, allow_fallback: bool = True) -> tuple[str, Optional[str]]:
+        """
+        Pick the model for the next call and consume its quota.
+
+        Args:
+            allow_fallback: Whether this call may be diverted
+
+        Returns:
+            Tuple of (model ID, diversion reason or None)
+        """
+        primary = self.primary_model
+        can_divert = allow_fallback and self.fallback_model and self.fallback_model != primary
+
+        reason = self.unhealthy_reason(primary)
+        if reason is None:
+            limiter = self.limiters.get(primary)
+            if limiter is None or limiter.try_acquire():
+                self._claim_probe(primary)
+                return primary, None
+            reason = 'quota'
+
+        if can_divert and self.is_healthy(self.fallback_model):
+            limiter = self.limiters.get(self.fallback_model)
+            if limiter is None or limiter.try_acquire():
+                return self.fallback_model, reason
+
+        # No diversion possible: wait for primary quota
+        limiter = self.limiters.get(primary)
+        if limiter:
+            limiter.acquire()
+        if reason == 'quota':
+            self._claim_probe(primary)
+        return primary, None
+
+    def record_success(self, model: str, latency_seconds: float) -> None:
+        """Record a successful call."""
+        with self._lock:
+            state = self._state(model)
+            state['calls'] += 1
+            state['consecutive_failures'] = 0
+            previous = state['latency_ewma']
+            if previous is None or state['probing']:
+                # A recovery probe restarts the average from its own latency
+                state['latency_ewma'] = latency_seconds
+            else:
+                state['latency_ewma'] = 0.8 * previous + 0.2 * latency_seconds
+            state['probing'] = False
+            if state['latency_ewma'] > self.slow_call_seconds:
+                state['slow_until'] = time.monotonic() + self.cooldown_seconds
+            else:
+                state['slow_until'] = 0.0
+
+    def record_failure(self, model: str, error) -> None:
+        """Record a failed call; rate limits and repeated failures bench the model."""
+        with self._lock:
+            state = self._state(model)
+            state['calls'] += 1
+            state['failures'] += 1
+            state['consecutive_failures'] += 1
+            state['last_error'] = str(error)[:200]
+            state['probing'] = False
+
+            if is_rate_limit_error(error):
+                state['rate_limited'] += 1
+                state['cooldown_until'] = time.monotonic() + self.cooldown_seconds
+            elif state['consecutive_failures'] >= self.max_consecutive_failures:
+                state['cooldown_until'] = time.monotonic() + self.cooldown_seconds
+
+    def snapshot(self) -> dict:
+        """Current health per model (for logs / status endpoints)."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {
+                    **{k: v for k, v in state.items() if k not in ('cooldown_until', 'slow_until')},
+                    'cooling_down_for': max(0.0, round(state['cooldown_until'] - now, 1)),
+                    'slow_for': max(0.0, round(state['slow_until'] - now, 1)),
+                }
+                for model, state in self._health.items()
+            }
+
+
+def create_shared_limiters(config: Optional[dict] = None, context=None) -> dict[str, SharedRateLimiter]:
+    """Create cross-process limiters for every model in generation.routing.quotas."""
+    config = config or {}
+    quotas = config.get('quotas') or {}
+    return {
+        model: SharedRateLimiter(rpm, context, config.get('priority_weights'))
+        for model, rpm in quotas.items() if rpm
+    }
+
+
+def create_model_router(primary_model: str, config: Optional[dict] = None) -> ModelRouter:
+    """Factory function to create ModelRouter from generation.routing config."""
+    config = config or {}
+    fallback = config.get('fallback', {})
+    return ModelRouter(
+        primary_model=primary_model,
+        fallback_model=fallback.get('model') if fallback.get('enabled', False) else None,
+        quotas=config.get('quotas'),
+        max_consecutive_failures=int(config.get('max_consecutive_failures', 3)),
+        cooldown_seconds=float(config.get('cooldown_seconds', 60)),
+        slow_call_seconds=float(config.get('slow_call_seconds', 120)),
+        priority_weights=config.get('priority_weights')
+    )
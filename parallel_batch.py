@@ -0,0 +1,350 @@
+"""
+Multi-Process Batch Execution for AI Product Imagery Workflow
+
+Shards a large batch across a pool of worker processes, each running its
+own workflow instance, for tranches where a single process is CPU-bound on
+image preprocessing, hashing, JSON and prompt building.
+
+    parent:   lookup + fetch (I/O threads) -> shared memory block per product
+    workers:  vision -> compose -> generate -> audit, flush, return result
+
+Fetched ghost images reach the workers through multiprocessing.shared_memory
+(only a small descriptor is pickled), and the image-model quota is a single
+SharedRateLimiter bucket drawn from by every worker. The parent journals
+each finished product (batch_journal.py), so `generate --resume` can finish
+a parallel batch (products it had not finished run again from the start).
+"""
+
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Optional
+
+from data_layer import load_config
+from model_router import create_shared_limiters
+from timing import run_stage, summarize_timings
+from usage import load_pricing, summarize_usage
+from write_behind import reconcile_writes
+
+
+def create_engine_workflow(engine: str, config_path: str = "config.yaml"):
+    """Create the V1 or V2 workflow for a generation.engine value."""
+    if engine == 'v2_nanobananapro':
+        from workflow_v2 import create_workflow_v2
+        return create_workflow_v2(config_path)
+
+    from workflow import create_workflow
+    return create_workflow(config_path)
+
+
+def pack_images(images: dict[str, Optional[bytes]]) -> tuple[Optional[shared_memory.SharedMemory], dict]:
+    """
+    Copy a product's fetched images into one shared memory block.
+
+    Args:
+        images: URL -> image bytes (None for failed downloads)
+
+    Returns:
+        Tuple of (segment owned by the caller, picklable descriptor). The
+        caller must close() and unlink() the segment once the worker is done.
+    """
+    total = sum(len(data) for data in images.values() if data)
+    if not total:
+        return None, {'name': None, 'entries': [(url, 0, -1) for url in images]}
+
+    segment = shared_memory.SharedMemory(create=True, size=total)
+    entries = []
+    offset = 0
+    for url, data in images.items():
+        if not data:
+            entries.append((url, 0, -1))
+            continue
+        segment.buf[offset:offset + len(data)] = data
+        entries.append((url, offset, len(data)))
+        offset += len(data)
+
+    return segment, {'name': segment.name, 'entries': entries}
+
+
+def unpack_images(descriptor: dict) -> dict[str, Optional[bytes]]:
+    """Read images described by pack_images() from shared memory."""
+    if not descriptor['name']:
+        return {url: None for url, _, _ in descriptor['entries']}
+
+    segment = shared_memory.SharedMemory(name=descriptor['name'])
+    try:
+        return {
+            url: bytes(segment.buf[offset:offset + length]) if length >= 0 else None
+            for url, offset, length in descriptor['entries']
+        }
+    finally:
+        segment.close()
+
+
+# Per-process workflow, built once by the pool initializer
+_worker_workflow = None
+
+
+def attach_shared_limiters(workflow, limiters: dict) -> None:
+    """Make a workflow's generator draw model quota from cross-process limiters."""
+    if not limiters:
+        return
+    generator = workflow.generator
+    router = getattr(generator, 'router', None)
+    if router:
+        router.share_limiters(limiters)
+    elif generator.model_name in limiters:
+        generator.rate_limiter = limiters[generator.model_name]
+
+
+def _init_worker(config_path: str, engine: str, limiters: dict) -> None:
+    """Pool initializer: build this process's workflow and attach shared quotas."""
+    global _worker_workflow
+    _worker_workflow = create_engine_workflow(engine, config_path)
+    attach_shared_limiters(_worker_workflow, limiters)
+
+
+def _run_product(ctx: dict, descriptor: dict) -> dict:
+    """Worker task: run the post-fetch stages for one product."""
+    workflow = _worker_workflow
+    ctx['images'] = unpack_images(descriptor)
+
+    # Time spent waiting for a free worker process
+    queue_seconds = time.monotonic() - ctx.pop('_queued_at', time.monotonic())
+
+    stages = workflow.PIPELINE_STAGES
+    for stage in stages[stages.index('fetch') + 1:]:
+        if ctx.get('done'):
+            break
+        try:
+            ctx = run_stage(ctx, stage, getattr(workflow, f"_stage_{stage}"), queue_seconds)
+            queue_seconds = 0.0
+        except Exception as e:
+            ctx['result']['errors'].append(f"{stage} stage failed: {e}")
+            ctx['done'] = True
+
+    # Results leave the process, so their files must be on disk first
+    workflow.generator.flush()
+    reconcile_writes(ctx['result'])
+    return workflow._finish_context(ctx)
+
+
+class ParallelBatchRunner:
+    """Runs batch generation across a pool of worker processes."""
+
+    def __init__(
+        self,
+        config_path: str = "config.yaml",
+        workers: int = 2,
+        engine: Optional[str] = None
+    ):
+        """
+        Initialize runner.
+
+        Args:
+            config_path: Path to config.yaml (each worker loads it)
+            workers: Number of worker processes
+            engine: Workflow engine (defaults to generation.engine)
+        """
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        self.engine = engine or self.config.get('generation', {}).get('engine', 'v1')
+        self.workers = max(1, workers)
+
+        # Parent workflow does lookup + fetch and product selection
+        self.workflow = create_engine_workflow(self.engine, config_path)
+
+        pipeline_workers = self.config.get('workflow', {}).get('pipeline', {}).get('workers', {})
+        self.fetch_workers = int(pipeline_workers.get('fetch', 4))
+
+    def batch_run(
+        self,
+        product_ids: list[str],
+        verbose: bool = False,
+        stop_on_error: bool = False,
+        skip_vision: bool = False
+    ) -> dict:
+        """
+        Run products across the worker pool.
+
+        Args:
+            product_ids: List of SKUs or cupidNames
+            verbose: Print one line per finished product
+            stop_on_error: Stop submitting new products after a failure
+            skip_vision: Skip ghost image analysis
+
+        Returns:
+            Merged batch result (same shape as workflow.batch_run, with
+            'batch_id' when journaling is enabled)
+        """
+        batch_result = {
+            'total': len(product_ids),
+            'success': 0,
+            'failed': 0,
+            'results': [],
+            'engine_version': self.engine,
+            'workers': self.workers,
+            'timestamp': datetime.now().isoformat()
+        }
+        started = time.monotonic()
+
+        journal, product_ids, _ = self.workflow._open_batch(product_ids)
+        if journal:
+            batch_result['batch_id'] = journal.batch_id
+
+        context = multiprocessing.get_context('spawn')
+        limiters = create_shared_limiters(self.config.get('generation', {}).get('routing'), context)
+
+        if verbose:
+            print(f"Processing {len(product_ids)} products on {self.workers} worker processes ({self.engine})")
+
+        results: dict[int, dict] = {}
+        segments: dict = {}
+        fetching: deque = deque()
+        running: dict = {}
+        queued = iter(enumerate(product_ids))
+        window = self.workers * 2
+        stopped = False
+
+        def finish(index: int, result: dict) -> None:
+            nonlocal stopped
+            results[index] = result
+            if journal:
+                journal.record_product(result)
+            if verbose:
+                status = f"✓ {len(result['images'])} image(s)" if result['success'] else f"✗ {result['errors']}"
+                print(f"[{len(results)}/{len(product_ids)}] {result['product_id']}: {status}")
+            if stop_on_error and not result['success']:
+                stopped = True
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.config_path, self.engine, limiters)
+            ) as pool, ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="batch-fetch") as fetchers:
+                while True:
+                    # Keep a bounded number of products fetched or in flight
+                    while not stopped and len(fetching) + len(running) < window:
+                        item = next(queued, None)
+                        if item is None:
+                            break
+                        index, product_id = item
+                        fetching.append((index, fetchers.submit(self._prepare, product_id, skip_vision)))
+
+                    # Hand fetched products to the pool in input order
+                    while fetching and fetching[0][1].done():
+                        index, future = fetching.popleft()
+                        try:
+                            ctx = future.result()
+                        except Exception as e:
+                            ctx = self.workflow._new_context(product_ids[index])
+                            ctx['result']['errors'].append(f"fetch stage failed: {e}")
+                            ctx['done'] = True
+
+                        if ctx.get('done') or stopped:
+                            finish(index, self.workflow._finish_context(ctx))
+                            continue
+
+                        segment, descriptor = pack_images(ctx.pop('images', {}))
+                        segments[index] = segment
+                        ctx['_queued_at'] = time.monotonic()
+                        running[pool.submit(_run_product, ctx, descriptor)] = index
+
+                    if not fetching and not running:
+                        break
+
+                    waiting = list(running) + ([fetching[0][1]] if fetching else [])
+                    done, _ = wait(waiting, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = running.pop(future, None)
+                        if index is None:
+                            continue
+                        segment = segments.pop(index)
+                        if segment:
+                            segment.close()
+                            segment.unlink()
+                        try:
+                            finish(index, future.result())
+                        except Exception as e:
+                            finish(index, {
+                                'product_id': product_ids[index],
+                                'success': False,
+                                'images': [],
+                                'errors': [f"Worker failed: {e}"],
+                            })
+        finally:
+            # Also on errors and interrupts: nothing may stay in /dev/shm
+            for segment in segments.values():
+                if segment:
+                    segment.close()
+                    segment.unlink()
+
+        batch_result['results'] = [results[i] for i in sorted(results)]
+        for result in batch_result['results']:
+            if result['success']:
+                batch_result['success'] += 1
+            else:
+                batch_result['failed'] += 1
+        if self.engine == 'v2_nanobananapro':
+            batch_result['cached_tokens'] = sum(r.get('cached_tokens', 0) for r in batch_result['results'])
+        batch_result['timing'] = summarize_timings(batch_result['results'])
+        batch_result['usage'] = summarize_usage(batch_result['results'], load_pricing(self.config))
+        batch_result['elapsed_seconds'] = round(time.monotonic() - started, 2)
+
+        if journal:
+            journal.record_end(batch_result)
+        return batch_result
+
+    def run_by_tranche(
+        self,
+        tranche: str,
+        limit: Optional[int] = None,
+        verbose: bool = False,
+        skip_vision: bool = False
+    ) -> dict:
+        """Run all products in a tranche across the worker pool."""
+        products = self.workflow.data.get_products_by_tranche(tranche, limit=limit)
+        product_ids = [p['cupidName'] for p in products if p.get('cupidName')]
+
+        if verbose:
+            print(f"Found {len(product_ids)} products in {tranche}")
+
+        return self.batch_run(product_ids, verbose=verbose, skip_vision=skip_vision)
+
+    def run_by_class(
+        self,
+        class_description: str,
+        limit: Optional[int] = None,
+        verbose: bool = False,
+        skip_vision: bool = False
+    ) -> dict:
+        """Run all products in a class across the worker pool."""
+        products = self.workflow.data.get_products_by_class(class_description, limit=limit)
+        product_ids = [p['cupidName'] for p in products if p.get('cupidName')]
+
+        if verbose:
+            print(f"Found {len(product_ids)} products in {class_description}")
+
+        return self.batch_run(product_ids, verbose=verbose, skip_vision=skip_vision)
+
+    def _prepare(self, product_id: str, skip_vision: bool) -> dict:
+        """Parent-side lookup and fetch stages for one product."""
+        ctx = self.workflow._new_context(product_id, skip_vision=skip_vision, defer_flush=True)
+        ctx = run_stage(ctx, 'lookup', self.workflow._stage_lookup)
+        if not ctx.get('done'):
+            ctx = run_stage(ctx, 'fetch', self.workflow._stage_fetch)
+        return ctx
+
+
+def create_parallel_batch_runner(
+    config_path: str = "config.yaml",
+    workers: int = 2,
+    engine: Optional[str] = None
+) -> ParallelBatchRunner:
+    """Factory function to create ParallelBatchRunner."""
+    return ParallelBatchRunner(config_path, workers=workers, engine=engine)
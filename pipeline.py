@@ -0,0 +1,434 @@
+"""
+Staged Batch Pipeline for AI Product Imagery Workflow
+
+Runs a batch of products through the workflow's stages (lookup, fetch,
+vision, compose, generate, audit) as a pipeline instead of one product at a
+time. Each stage has its own worker threads and a bounded input queue, so
+while product N is generating, product N+1's ghost images are already being
+fetched and analyzed.
+
+The stages themselves are the workflow's `_stage_<name>(ctx)` methods, the
+same ones `run()` calls in sequence for a single product.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+from timing import run_stage
+
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class StageMetrics:
+    """Counters for one pipeline stage."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, skipped: bool = False, error: bool = False) -> None:
+        """Record one item passing through the stage."""
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.processed += 1
+                self.busy_seconds += seconds
+            if error:
+                self.errors += 1
+
+    def observe_depth(self, depth: int) -> None:
+        """Track the high-water mark of the stage's input queue."""
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+
+class StagedPipeline:
+    """
+    Bounded-queue pipeline of (name, function, workers) stages.
+
+    Each item is a context dict. A stage function mutates and returns the
+    context; each stage run is recorded as a timing span together with the
+    time the item waited in the stage's queue. Once a stage sets ctx['done']
+    (product not found, class mapping missing, stage error), later stages
+    pass the item through untouched. Results are returned in input order.
+    """
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable[[dict], dict], int]],
+        queue_size: int = 2
+    ):
+        """
+        Initialize pipeline.
+
+        Args:
+            stages: Ordered (name, function, worker count) tuples
+            queue_size: Capacity of each inter-stage queue (back-pressure)
+        """
+        self.stages = [(name, fn, max(1, int(workers))) for name, fn, workers in stages]
+        self.queue_size = max(1, queue_size)
+        self.metrics = {name: StageMetrics(name, workers) for name, _, workers in self.stages}
+
+        self._queues: list[queue.Queue] = []
+        self._stop = threading.Event()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    def run(
+        self,
+        items: Iterable[dict],
+        on_result: Optional[Callable[[dict], None]] = None
+    ) -> list[dict]:
+        """
+        Push items through every stage.
+
+        Args:
+            items: Context dicts, one per product
+            on_result: Called on the caller's thread as each item leaves the
+                last stage (in completion order)
+
+        Returns:
+            Processed contexts in input order (only those fed before stop())
+        """
+        completed = {}
+        for ctx in self.iter_run(items):
+            completed[ctx['_index']] = ctx
+            if on_result:
+                on_result(ctx)
+        return [completed[i] for i in sorted(completed)]
+
+    def iter_run(self, items: Iterable[dict]) -> Iterator[dict]:
+        """
+        Push items through every stage, yielding each as it leaves the last
+        stage (completion order). Nothing is retained once yielded, and items
+        are pulled from the iterable only as the first queue has room.
+
+        Closing the generator early stops the feed and waits for the items
+        already in flight.
+        """
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._finished_at = None
+
+        # One input queue per stage, plus the output queue
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._queues.append(queue.Queue())
+
+        threads = []
+        for position, (name, fn, workers) in enumerate(self.stages):
+            remaining = [workers]
+            remaining_lock = threading.Lock()
+            for i in range(workers):
+                thread = threading.Thread(
+                    target=self._stage_worker,
+                    args=(position, fn, remaining, remaining_lock),
+                    name=f"pipeline-{name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        feeder = threading.Thread(target=self._feed, args=(items,), name="pipeline-feed", daemon=True)
+        feeder.start()
+
+        output = self._queues[-1]
+        closed = False
+        try:
+            while True:
+                ctx = output.get()
+                if ctx is _DONE:
+                    closed = True
+                    break
+                yield ctx
+        finally:
+            if not closed:
+                # Abandoned by the consumer: drain what is already in flight
+                self.stop()
+                while output.get() is not _DONE:
+                    pass
+            feeder.join()
+            for thread in threads:
+                thread.join()
+            self._finished_at = time.monotonic()
+
+    def stop(self) -> None:
+        """Stop feeding new items; items already in flight still complete."""
+        self._stop.set()
+
+    def queue_depths(self) -> dict[str, int]:
+        """Current number of items waiting in front of each stage."""
+        return {
+            name: q.qsize()
+            for (name, _, _), q in zip(self.stages, self._queues)
+        }
+
+    def snapshot(self) -> dict:
+        """Per-stage metrics: throughput, current/max queue depth, utilization."""
+        end = self._finished_at or time.monotonic()
+        elapsed = max(1e-6, end - (self._started_at or end))
+        depths = self.queue_depths() if self._queues else {}
+
+        stages = {}
+        for name, _, workers in self.stages:
+            m = self.metrics[name]
+            stages[name] = {
+                'workers': workers,
+                'processed': m.processed,
+                'skipped': m.skipped,
+                'errors': m.errors,
+                'queue_depth': depths.get(name, 0),
+                'max_queue_depth': m.max_queue_depth,
+                'busy_seconds': round(m.busy_seconds, 2),
+                'avg_seconds': round(m.busy_seconds / m.processed, 2) if m.processed else 0.0,
+                # Share of the stage's worker-time spent working
+                'utilization': round(min(1.0, m.busy_seconds / (elapsed * workers)), 3),
+            }
+
+        return {
+            'elapsed_seconds': round(elapsed, 2),
+            'queue_size': self.queue_size,
+            'stages': stages,
+        }
+
+    def _feed(self, items: Iterable[dict]) -> None:
+        """Put items on the first stage's queue, then close it."""
+        first = self._queues[0]
+        for index, ctx in enumerate(items):
+            ctx['_index'] = index
+            if not self._put(first, ctx, self.stages[0][0]):
+                break
+
+        for _ in range(self.stages[0][2]):
+            first.put(_DONE)
+
+    def _put(self, q: queue.Queue, ctx: dict, stage_name: str) -> bool:
+        """Blocking put that gives up when the feed is stopped."""
+        while not self._stop.is_set():
+            ctx['_queued_at'] = time.monotonic()
+            try:
+                q.put(ctx, timeout=0.5)
+            except queue.Full:
+                continue
+            self.metrics[stage_name].observe_depth(q.qsize())
+            return True
+        return False
+
+    def _stage_worker(
+        self,
+        position: int,
+        fn: Callable[[dict], dict],
+        remaining: list[int],
+        remaining_lock: threading.Lock
+    ) -> None:
+        """Process one stage's queue until it is closed."""
+        name = self.stages[position][0]
+        inbox = self._queues[position]
+        outbox = self._queues[position + 1]
+        is_last = position == len(self.stages) - 1
+
+        while True:
+            ctx = inbox.get()
+            if ctx is _DONE:
+                break
+
+            if ctx.get('done'):
+                self.metrics[name].record(0.0, skipped=True)
+            else:
+                start = time.monotonic()
+                failed = False
+                try:
+                    ctx = run_stage(ctx, name, fn, queue_seconds=start - ctx.get('_queued_at', start))
+                except Exception as e:
+                    failed = True
+                    ctx['result']['errors'].append(f"{name} stage failed: {e}")
+                    ctx['done'] = True
+                self.metrics[name].record(time.monotonic() - start, error=failed)
+
+            ctx['_queued_at'] = time.monotonic()
+            outbox.put(ctx)
+            if not is_last:
+                self.metrics[self.stages[position + 1][0]].observe_depth(outbox.qsize())
+
+        # Last worker out closes the next queue
+        with remaining_lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker:
+            next_workers = 1 if is_last else self.stages[position + 1][2]
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+
+def format_pipeline_metrics(snapshot: dict) -> str:
+    """Render a pipeline snapshot as a small text table."""
+    lines = [f"Pipeline: {snapshot['elapsed_seconds']}s elapsed (queue size {snapshot['queue_size']})"]
+    lines.append(f"  {'stage':<10}{'workers':>8}{'done':>6}{'skip':>6}{'err':>5}{'avg s':>8}{'max q':>7}{'util':>7}")
+    for name, s in snapshot['stages'].items():
+        lines.append(
+            f"  {name:<10}{s['workers']:>8}{s['processed']:>6}{s['skipped']:>6}{s['errors']:>5}"
+            f"{s['avg_seconds']:>8}{s['max_queue_depth']:>7}{s['utilization']:>7.0%}"
+        )
+    return "\n".join(lines)
+
+
+def _batch_pipeline(
+    workflow,
+    product_ids: list[str],
+    config: Optional[dict],
+    journal,
+    run_kwargs: dict
+) -> tuple[StagedPipeline, Iterator[dict]]:
+    """Build the workflow's stage pipeline and its (lazily created) contexts."""
+    config = config or {}
+    workers = config.get('workers', {})
+    stages = []
+    for name in workflow.PIPELINE_STAGES:
+        fn = getattr(workflow, f"_stage_{name}")
+        if journal:
+            fn = journal.wrap_stage(name, fn)
+        stages.append((name, fn, workers.get(name, 1)))
+    pipeline = StagedPipeline(stages, queue_size=int(config.get('queue_size', 2)))
+
+    def contexts() -> Iterator[dict]:
+        for product_id in product_ids:
+            # Stage output would interleave across products, so stages run quiet
+            ctx = workflow._new_context(product_id, verbose=False, defer_flush=True, **run_kwargs)
+            if journal:
+                ctx['journal'] = journal
+                ctx['batch_id'] = journal.batch_id
+            yield ctx
+
+    return pipeline, contexts()
+
+
+def iter_batch_pipeline(
+    workflow,
+    product_ids: list[str],
+    verbose: bool = False,
+    stop_on_error: bool = False,
+    config: Optional[dict] = None,
+    journal=None,
+    **run_kwargs
+) -> Iterator[dict]:
+    """
+    Streaming run_batch_pipeline(): yield each product result as it leaves
+    the pipeline (completion order) instead of collecting them.
+
+    Writes are not flushed; the caller flushes and reconciles as it
+    consumes. The generator's return value is the metrics snapshot.
+    """
+    pipeline, contexts = _batch_pipeline(workflow, product_ids, config, journal, run_kwargs)
+    finished = 0
+
+    for ctx in pipeline.iter_run(contexts):
+        finished += 1
+        result = workflow._finish_context(ctx)
+        if journal:
+            journal.record_product(result)
+        if verbose:
+            status = f"✓ {len(result['images'])} image(s)" if result['success'] else f"✗ {result['errors']}"
+            depths = " ".join(f"{k}={v}" for k, v in pipeline.queue_depths().items())
+            print(f"[{finished}/{len(product_ids)}] {result['product_id']}: {status}  (queues: {depths})")
+        if stop_on_error and not result['success']:
+            if verbose:
+                print(f"Stopping due to error: {result['errors']}")
+            pipeline.stop()
+        yield result
+
+    metrics = pipeline.snapshot()
+    if verbose:
+        print(format_pipeline_metrics(metrics))
+    return metrics
+
+
+def run_batch_pipeline(
+    workflow,
+    product_ids: list[str],
+    verbose: bool = False,
+    stop_on_error: bool = False,
+    config: Optional[dict] = None,
+    journal=None,
+    **run_kwargs
+) -> tuple[list[dict], dict]:
+    """
+    Run a workflow's stages for many products as a pipeline.
+
+    Args:
+        workflow: ProductImageryWorkflow or ProductImageryWorkflowV2
+        product_ids: SKUs or cupidNames
+        verbose: Print one line per finished product plus stage metrics
+        stop_on_error: Stop feeding new products after the first failure
+        config: workflow.pipeline config (queue_size, workers per stage)
+        journal: BatchJournal recording stage completion (and restoring
+            completed stages when resuming)
+        **run_kwargs: Passed to the workflow's context (e.g. skip_vision)
+
+    Returns:
+        Tuple of (per-product results in input order, metrics snapshot)
+    """
+    stream = iter_batch_pipeline(
+        workflow, product_ids, verbose=verbose, stop_on_error=stop_on_error,
+        config=config, journal=journal, **run_kwargs
+    )
+    results = []
+    while True:
+        try:
+            results.append(next(stream))
+        except StopIteration as stop:
+            metrics = stop.value
+            break
+
+    position = {product_id: i for i, product_id in reversed(list(enumerate(product_ids)))}
+    results.sort(key=lambda result: position.get(result['product_id'], len(position)))
+    return results, metrics
+
+
+def image_record(result: dict, gen_result: dict, variation: int) -> dict:
+    """Flat, JSON-serializable record of one generated (or failed) image."""
+    record = {
+        'type': 'image',
+        'product_id': result['product_id'],
+        'cupid_name': result.get('cupid_name'),
+        'tranche': result.get('tranche'),
+        'variation': variation,
+        'success': bool(gen_result.get('success')) and gen_result.get('persisted') is not False,
+        'path': gen_result.get('path'),
+        'metadata_path': gen_result.get('metadata_path'),
+        'error': gen_result.get('error'),
+    }
+    for key in ('cached_tokens', 'replayed', 'usage'):
+        if gen_result.get(key):
+            record[key] = gen_result[key]
+    routing = gen_result.get('routing')
+    if routing:
+        record['model'] = routing.get('served_model')
+        record['fallback'] = bool(routing.get('fallback'))
+    return record
+
+
+def product_record(result: dict) -> dict:
+    """Summary record of one finished product (no prompts or generations)."""
+    record = {
+        'type': 'product',
+        'product_id': result['product_id'],
+        'cupid_name': result.get('cupid_name'),
+        'tranche': result.get('tranche'),
+        'success': result['success'],
+        'images': list(result.get('images', [])),
+        'errors': list(result.get('errors', [])),
+    }
+    for key in ('resumed', 'audit_warnings'):
+        if result.get(key):
+            record[key] = result[key]
+    return record
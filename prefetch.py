@@ -0,0 +1,178 @@
+"""
+Speculative Prefetch for the Review UI
+
+When a reviewer opens a product, the work generation would do before the
+first image call is started in the background:
+
+    fetch       every ghost image into the shared ghost cache (any
+                reference selection is then a disk read)
+    vision      ghost image analysis (remembered by the vision analyzer)
+    governance  the class's compiled constraints (memoized per class)
+
+so a Generate click that follows goes almost straight to image generation.
+The next few products in the reviewer's sidebar order can be prefetched
+too. Prefetch runs on its own small worker pool as bulk-priority work, most
+recent request first; requests that pile up beyond max_pending drop the
+oldest, and a product prefetched recently is not prefetched again.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from scheduler import priority_class
+from timing import run_stage
+
+
+def prefetch_product(workflow, product_id: str) -> dict:
+    """
+    Warm the caches a workflow reads before generating a product.
+
+    Runs the workflow's own lookup, fetch and vision stages (so the same
+    images and analyses are cached) and compiles the class's constraints.
+
+    Returns:
+        The prefetch context's result (timings, usage, errors)
+    """
+    ctx = workflow._new_context(product_id)
+    ctx = run_stage(ctx, 'lookup', workflow._stage_lookup)
+    if ctx.get('done'):
+        return ctx['result']
+
+    # Reviewers may pick any ghost image as a reference
+    for url in ctx['ghost_urls']:
+        workflow.vision.fetch_image(url)
+
+    for stage in ('fetch', 'vision'):
+        ctx = run_stage(ctx, stage, getattr(workflow, f"_stage_{stage}"))
+
+    workflow.governance.get_constraints(
+        ctx['class_desc'], workflow.feedback.get_refinements(), feedback_version=workflow.feedback.version
+    )
+    return ctx['result']
+
+
+class Prefetcher:
+    """Background, most-recent-first prefetch of products a reviewer is likely to generate."""
+
+    def __init__(
+        self,
+        workflows,
+        workers: int = 1,
+        max_pending: int = 16,
+        recent_seconds: float = 600.0
+    ):
+        """
+        Initialize prefetcher.
+
+        Args:
+            workflows: SharedWorkflows (prefetch warms the configured engine)
+            workers: Products prefetched at once
+            max_pending: Queued products kept; older requests are dropped
+            recent_seconds: A product prefetched this recently is skipped
+        """
+        self.workflows = workflows
+        self.workers = max(1, workers)
+        self.recent_seconds = recent_seconds
+
+        self._pending: deque[str] = deque(maxlen=max_pending)
+        self._in_flight: set[str] = set()
+        self._done_at: dict[str, float] = {}
+        self._ready = threading.Condition()
+        self._workers_pid = None
+
+        self.prefetched = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Start the worker threads in this process (again in a forked worker)."""
+        with self._ready:
+            if self._workers_pid == os.getpid():
+                return
+            self._workers_pid = os.getpid()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True).start()
+
+    def request(self, cupid_names: list[str]) -> int:
+        """
+        Queue products for prefetch; the first is prefetched first.
+
+        Returns:
+            Number of products queued (already queued, running or recently
+            prefetched ones are skipped)
+        """
+        self.start()
+        queued = 0
+        now = time.monotonic()
+        with self._ready:
+            # Pushed in reverse so cupid_names[0] ends up on top
+            for cupid in reversed(list(dict.fromkeys(cupid_names))):
+                if cupid in self._in_flight or now - self._done_at.get(cupid, -self.recent_seconds) < self.recent_seconds:
+                    continue
+                if cupid in self._pending:
+                    self._pending.remove(cupid)
+                self._pending.append(cupid)
+                queued += 1
+            self._ready.notify_all()
+        return queued
+
+    def _work(self) -> None:
+        while True:
+            with self._ready:
+                while not self._pending:
+                    self._ready.wait()
+                cupid = self._pending.pop()
+                self._in_flight.add(cupid)
+
+            ok = False
+            try:
+                with priority_class('bulk'):
+                    result = prefetch_product(self.workflows.get(), cupid)
+                ok = not result['errors']
+            except Exception as e:
+                print(f"Warning: prefetch failed for {cupid}: {e}")
+            finally:
+                with self._ready:
+                    self._in_flight.discard(cupid)
+                    self._done_at[cupid] = time.monotonic()
+                    self._forget_old()
+                if ok:
+                    self.prefetched += 1
+                else:
+                    self.failed += 1
+
+    def _forget_old(self) -> None:
+        """Drop expired recent-prefetch marks (caller holds _ready)."""
+        cutoff = time.monotonic() - self.recent_seconds
+        for cupid in [c for c, at in self._done_at.items() if at < cutoff]:
+            del self._done_at[cupid]
+
+    def summary(self) -> dict:
+        """Queue and outcome counters."""
+        with self._ready:
+            return {
+                'pending': len(self._pending),
+                'in_flight': len(self._in_flight),
+                'prefetched': self.prefetched,
+                'failed': self.failed
+            }
+
+
+def create_prefetcher(workflows, config: Optional[dict] = None) -> Optional[Prefetcher]:
+    """
+    Factory function to create Prefetcher from the review_ui.prefetch config.
+
+    Returns:
+        Prefetcher, or None when prefetch is disabled
+    """
+    config = config or {}
+    if not config.get('enabled', True):
+        return None
+    return Prefetcher(
+        workflows,
+        workers=int(config.get('workers', 1)),
+        max_pending=int(config.get('max_pending', 16)),
+        recent_seconds=float(config.get('recent_seconds', 600))
+    )
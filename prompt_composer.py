@@ -179,7 +179,7 @@ class PromptComposer:
         ]
         
         # Combine governance negatives with standard
-        all_negatives = list(set(negative_prompts + standard_negatives))
+        all_negatives = list(set(list(negative_prompts) + standard_negatives))
         
         return ", ".join(all_negatives)
     
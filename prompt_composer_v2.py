@@ -235,7 +235,7 @@ Render the scene using the context that best matches this product's aesthetic an
         ]
         
         # Combine governance negatives with standard
-        all_negatives = list(set(negative_prompts + standard_negatives))
+        all_negatives = list(set(list(negative_prompts) + standard_negatives))
         
         return ", ".join(all_negatives)
     
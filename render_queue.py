@@ -0,0 +1,157 @@
+"""
+Render Job Queue for AI Product Imagery Workflow
+
+Append-only JSONL queue of deferred re-render jobs, e.g. finalizing an
+approved draft at full resolution. Each line is an event ('enqueue',
+'done' or 'failed'); the current state is rebuilt by replaying the file,
+so the queue survives restarts and is safe to append from several
+processes.
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+class RenderQueue:
+    """Persistent queue of re-render jobs keyed by job id."""
+
+    def __init__(self, queue_path: str = "./output/jobs/render_queue.jsonl"):
+        """
+        Initialize render queue.
+
+        Args:
+            queue_path: Path to the JSONL event file
+        """
+        self.queue_path = Path(queue_path)
+        self._lock = threading.Lock()
+
+    def _append(self, event: dict) -> None:
+        """Append one event line (single O_APPEND write)."""
+        self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(event) + "\n").encode('utf-8')
+        with self._lock:
+            fd = os.open(self.queue_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def enqueue(self, kind: str, cupid_name: str, payload: Optional[dict] = None) -> str:
+        """
+        Queue a job.
+
+        Args:
+            kind: Job type (e.g. 'finalize')
+            cupid_name: Product the job applies to
+            payload: Job-specific data
+
+        Returns:
+            New job id
+        """
+        job_id = uuid.uuid4().hex[:12]
+        self._append({
+            'op': 'enqueue',
+            'job_id': job_id,
+            'kind': kind,
+            'cupid_name': cupid_name,
+            'payload': payload or {},
+            'at': datetime.now().isoformat(),
+        })
+        return job_id
+
+    def mark_done(self, job_id: str, result: Optional[dict] = None) -> None:
+        """Record a job as completed."""
+        self._append({
+            'op': 'done',
+            'job_id': job_id,
+            'result': result or {},
+            'at': datetime.now().isoformat(),
+        })
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        """Record a job attempt as failed (it stays pending for retry)."""
+        self._append({
+            'op': 'failed',
+            'job_id': job_id,
+            'error': error,
+            'at': datetime.now().isoformat(),
+        })
+
+    def jobs(self) -> dict[str, dict]:
+        """Replay the event file into job_id -> job state."""
+        jobs: dict[str, dict] = {}
+        if not self.queue_path.exists():
+            return jobs
+
+        with open(self.queue_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from a crashed writer
+                    continue
+
+                op = event.get('op')
+                if op == 'enqueue':
+                    jobs[event['job_id']] = {
+                        'job_id': event['job_id'],
+                        'kind': event.get('kind'),
+                        'cupid_name': event.get('cupid_name'),
+                        'payload': event.get('payload', {}),
+                        'queued_at': event.get('at'),
+                        'status': 'pending',
+                        'attempts': 0,
+                    }
+                elif event.get('job_id') in jobs:
+                    job = jobs[event['job_id']]
+                    if op == 'done':
+                        job['status'] = 'done'
+                        job['result'] = event.get('result', {})
+                    elif op == 'failed':
+                        job['attempts'] += 1
+                        job['last_error'] = event.get('error')
+        return jobs
+
+    def pending(self, kind: Optional[str] = None, cupid_name: Optional[str] = None) -> list[dict]:
+        """Get pending jobs in queue order, optionally filtered."""
+        return [
+            job for job in self.jobs().values()
+            if job['status'] == 'pending'
+            and (kind is None or job['kind'] == kind)
+            and (cupid_name is None or job['cupid_name'] == cupid_name)
+        ]
+
+
+def product_render_logs(output_base: str, cupid_name: str) -> list[tuple[Path, dict]]:
+    """A product's image audit logs as (path, audit) pairs, oldest first."""
+    logs = []
+    for log_path in Path(output_base, "logs").glob(f"*/{cupid_name}_l*.json"):
+        try:
+            with open(log_path) as f:
+                logs.append((log_path, json.load(f)))
+        except (OSError, json.JSONDecodeError):
+            continue
+    logs.sort(key=lambda item: (item[1].get('generated_at') or '', item[0].name))
+    return logs
+
+
+def has_unfinalized_drafts(output_base: str, cupid_name: str) -> bool:
+    """Whether a product's latest image is a V2 draft that has not been finalized."""
+    logs = product_render_logs(output_base, cupid_name)
+    if not logs:
+        return False
+    latest = logs[-1][1]
+    return latest.get('render_phase') == 'draft' and not latest.get('finalized_as')
+
+
+def create_render_queue(queue_path: str = "./output/jobs/render_queue.jsonl") -> RenderQueue:
+    """Factory function to create RenderQueue."""
+    return RenderQueue(queue_path)
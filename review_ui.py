@@ -2,14 +2,24 @@
 Review UI Server for AI Product Imagery Workflow (React Backend)
 
 Serves the Vue/React frontend and provides API endpoints.
+
+    python review_ui.py                      development server (one process)
+    python cli.py serve --production         gunicorn workers (gunicorn.conf.py)
+
+In production mode (REVIEW_UI_MODE=production, set by gunicorn.conf.py)
+this module is imported once in the gunicorn parent, which loads the
+catalog and builds the image index before forking workers. Job state, the
+image index and live events are shared between workers through a SQLite
+state database, and all workers draw from one model quota. Feedback stays
+in feedback.yaml, which every writer updates under a file lock (feedback.py).
+Prefetch history and the vision analysis cache are per worker.
 """
 
-import json
 import os
-import yaml
 import threading
 from pathlib import Path
-from flask import Flask, jsonify, send_from_directory, request
+from urllib.parse import quote
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 
 # Load .env
@@ -22,103 +32,212 @@ if env_path.exists():
                 key, value = line.split('=', 1)
                 os.environ[key.strip()] = value.strip()
 
-from data_layer import create_data_layer
-from workflow import create_workflow
-from workflow_v2 import create_workflow_v2
+from shared_workflows import create_shared_workflows
+from model_router import create_shared_limiters
+from state_db import create_state_db
+from job_queue import create_job_queue
+from prefetch import create_prefetcher
+from events import create_event_bus
+from generated_index import create_generated_image_index
+from http_cache import json_response, make_etag, send_static_file
+
+# Engine workflows (and the product data they load) are built once and
+# shared by all requests; edits to config, rules or feedback are picked up
+workflows = create_shared_workflows()
+
+PRODUCTION = os.environ.get('REVIEW_UI_MODE') == 'production'
+
+# Worker processes share jobs, the image index and events through SQLite,
+# and one model quota (created here, before gunicorn forks)
+state = None
+if PRODUCTION:
+    state = create_state_db((workflows.config.get('review_ui') or {}).get('production'))
+    workflows.share_limiters(create_shared_limiters(workflows.config.get('generation', {}).get('routing')))
+
+# Progress and new images are pushed to browsers over /api/events
+events = create_event_bus(workflows.config.get('review_ui'), store=state)
 
-# Load config to determine engine
-def load_config():
-    config_path = Path("config.yaml")
-    if config_path.exists():
-        with open(config_path) as f:
-            return yaml.safe_load(f)
-    return {}
+# cupid -> generated images, kept current as images are saved
+image_index = create_generated_image_index(workflows.config, store=state)
 
-config = load_config()
-ENGINE_VERSION = config.get('generation', {}).get('engine', 'v1')
+def _publish_new_image(cupid_name, entry):
+    """Push a newly indexed image (any job, or a watched CLI batch) to browsers."""
+    events.publish('image', {'cupid_name': cupid_name, 'image': entry})
+    events.publish('product', {'cupid_name': cupid_name, 'has_images': True})
+
+image_index.on_change(_publish_new_image)
+
+def _publish_job_event(kind, data):
+    """Forward job progress to browsers (images arrive via the image index)."""
+    if kind == 'job':
+        events.publish('job', data)
+
+# Generation runs on background workers; requests only submit and poll.
+# UI clicks are scheduled ahead of feedback re-runs and tranche batches
+jobs = create_job_queue(workflows, workflows.config, on_event=_publish_job_event, store=state)
+
+# Opening a product warms its ghost images, vision analysis and constraints
+# (and its sidebar neighbours') so Generate starts at image generation
+_prefetch_config = (workflows.config.get('review_ui') or {}).get('prefetch') or {}
+prefetcher = create_prefetcher(workflows, _prefetch_config)
+prefetch_neighbors = int(_prefetch_config.get('neighbors', 0))
 
 # Configure Flask to serve the React build
 # 'frontend/dist' contains index.html and assets/
 app = Flask(__name__, static_folder='frontend/dist')
 CORS(app) # Enable CORS for dev server flexibility
 
-data_layer = None
+_background_pid = None
+
+def warm_up():
+    """Build the workflow, image index and product catalog before the first request."""
+    workflows.warm()
+    image_index.build()
+    _product_catalog()
+
+def start_background():
+    """Start this process's job, prefetch, event and index watch threads (once per process)."""
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    _background_pid = os.getpid()
+    jobs.start()
+    events.start()
+    image_index.start()
+    if prefetcher:
+        prefetcher.start()
+
+@app.before_request
+def _ensure_background():
+    # Threads do not survive a fork; started lazily if no server hook did
+    start_background()
 
 @app.route('/')
 def index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_static_file(app.static_folder, 'index.html')
 
 @app.route('/assets/<path:path>')
 def serve_assets(path):
-    return send_from_directory(os.path.join(app.static_folder, 'assets'), path)
+    # Vite puts a content hash in every asset name
+    return send_static_file(os.path.join(app.static_folder, 'assets'), path, immutable=True)
 
 # --- API Endpoints ---
 
+# Sorted product list with facets, rebuilt only when the catalog or the
+# image index changes
+_catalog = {'version': None}
+_catalog_lock = threading.Lock()
+
+def _product_catalog():
+    """Current (version, sorted products, tranches, classes)."""
+    version = (workflows.catalog_version, image_index.version)
+    with _catalog_lock:
+        if _catalog['version'] == version:
+            return _catalog['snapshot']
+
+        generated_cupids = image_index.cupids()
+        products = []
+        for cupid, row in workflows.data._by_cupid.items():
+            products.append({
+                'cupid_name': str(cupid),
+                'name': str(row.get('SKU Main Description', 'Unknown')),
+                'tranche': str(row.get('Tranche', 'Unknown')),
+                'class_description': str(row.get('Class Description', '')),
+                'has_images': str(cupid) in generated_cupids
+            })
+        
+        # cupid_name breaks ties so pages never shuffle between requests
+        products.sort(key=lambda x: (not x['has_images'], x['name'], x['cupid_name']))
+        tranches = sorted({p['tranche'] for p in products if p['tranche']})
+        classes = sorted({p['class_description'] for p in products if p['class_description']})
+        
+        _catalog['version'] = version
+        _catalog['snapshot'] = (version, products, tranches, classes)
+        return _catalog['snapshot']
+
+def _filter_products(products, args):
+    """Catalog products matching the sidebar filters (tranche, class, has_images, q)."""
+    tranche = args.get('tranche')
+    class_description = args.get('class')
+    has_images = args.get('has_images')
+    search = (args.get('q') or '').strip().lower()
+    if not (tranche or class_description or has_images or search):
+        return products
+
+    wanted_images = None if has_images is None else has_images.lower() in ('1', 'true', 'yes')
+    return [
+        p for p in products
+        if (not tranche or p['tranche'] == tranche)
+        and (not class_description or p['class_description'] == class_description)
+        and (wanted_images is None or p['has_images'] == wanted_images)
+        and (not search or search in p['name'].lower() or search in p['cupid_name'].lower())
+    ]
+
 @app.route('/api/products')
 def get_products():
-    """Get list of ALL products, marking those that have images."""
-    global data_layer
-    if not data_layer:
-        data_layer = create_data_layer()
-
-    generated_cupids = set()
-    logs_dir = Path('./output/logs')
-    if logs_dir.exists():
-        for json_file in logs_dir.rglob('*.json'):
-            name_part = json_file.stem
-            if '_l1' in name_part:
-                 cupid = name_part.rsplit('_', 1)[0]
-                 generated_cupids.add(cupid)
-
-    products = []
-    products = []
-    for cupid, row in data_layer._by_cupid.items():
-        products.append({
-            'cupid_name': str(cupid),
-            'name': str(row.get('SKU Main Description', 'Unknown')),
-            'tranche': str(row.get('Tranche', 'Unknown')),
-            'class_description': str(row.get('Class Description', '')),
-            'has_images': str(cupid) in generated_cupids
-        })
+    """
+    One page of products, generated ones first, then by name.
     
-    products.sort(key=lambda x: (not x['has_images'], x['name']))
-    return jsonify({'products': products})
+    Query: tranche, class, has_images (true/false), q (name or cupid
+    substring), offset, limit (default 100, max 500). Unchanged results
+    answer 304 to If-None-Match.
+    """
+    version, products, tranches, classes = _product_catalog()
+    args = request.args
+    etag = make_etag(version, sorted(args.items(multi=True)))
+
+    try:
+        offset = max(0, int(args.get('offset', 0)))
+        limit = min(500, max(1, int(args.get('limit', 100))))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    products = _filter_products(products, args)
+
+    return json_response({
+        'products': products[offset:offset + limit],
+        'total': len(products),
+        'offset': offset,
+        'limit': limit,
+        'tranches': tranches,
+        'classes': classes
+    }, etag=etag)
+
+def _prefetch_around(cupid_name, args):
+    """Prefetch a product and the next few after it in the sidebar's filtered order."""
+    wanted = [cupid_name]
+    if prefetch_neighbors:
+        _, products, _, _ = _product_catalog()
+        ordered = [p['cupid_name'] for p in _filter_products(products, args)]
+        if cupid_name in ordered:
+            position = ordered.index(cupid_name)
+            wanted += ordered[position + 1:position + 1 + prefetch_neighbors]
+    prefetcher.request(wanted)
 
 @app.route('/api/product/<cupid_name>')
 def get_product(cupid_name):
-    global data_layer
-    if not data_layer:
-        data_layer = create_data_layer()
-        
+    """
+    Product detail. Starts a background prefetch of what generating it
+    needs; the sidebar filters (same query as /api/products) pick the
+    neighbours prefetched with it.
+    """
+    data_layer = workflows.data
     product = data_layer.get_product(cupid_name)
     if not product:
         return jsonify({'error': 'Not found'}), 404
+    if prefetcher:
+        _prefetch_around(cupid_name, request.args)
         
     features = data_layer.get_product_features(product)
     ghost_urls = data_layer.get_ghost_image_urls(product)
     
-    generated_images = []
-    logs_dir = Path('./output/logs')
+    generated_images = image_index.images(cupid_name)
     
-    if logs_dir.exists():
-        for log_file in logs_dir.rglob(f"{cupid_name}_*.json"):
-            try:
-                with open(log_file) as f:
-                    meta = json.load(f)
-                tranche = meta.get('tranche', 'Unknown')
-                img_name = meta.get('image_file', '')
-                img_path = Path(f"./output/{tranche}/{img_name}")
-                if img_path.exists():
-                     generated_images.append({
-                        'filename': img_name,
-                        'path': f"{tranche}/{img_name}",
-                        'model_id': meta.get('model_id', meta.get('model', 'unknown')),
-                        'engine_version': meta.get('engine_version', 'v1'),
-                        'generated_at': meta.get('generated_at', ''),
-                        'prompts': meta.get('prompts', {})
-                     })
-            except Exception as e:
-                print(f"Error reading log {log_file}: {e}")
+    # Served from the shared ghost cache instead of hot-linking Scene7
+    ghost_previews = [
+        {size: f"/api/ghost/{quote(cupid_name, safe='')}/{i}?size={size}" for size in ('thumb', 'large')}
+        for i in range(len(ghost_urls))
+    ]
 
     return jsonify({
         'cupid_name': cupid_name,
@@ -127,41 +246,126 @@ def get_product(cupid_name):
         'class_description': features.get('class_description', ''),
         'tranche': product.get('Tranche', ''),
         'ghost_images': ghost_urls,
-        'generated_images': sorted(generated_images, key=lambda x: x['filename']),
+        'ghost_previews': ghost_previews,
+        'generated_images': generated_images,
         'specifications': features.get('specifications', {})
     })
 
+@app.route('/api/ghost/<cupid_name>/<int:idx>')
+def get_ghost_image(cupid_name, idx):
+    """
+    A product's idx-th ghost image from the shared cache.
+    
+    Query: size (a configured name such as thumb or large, or its pixel
+    edge; default: the 1024px master). An expired copy is served while it
+    is refreshed, so a slow Scene7 does not stall the UI.
+    """
+    product = workflows.data.get_product(cupid_name)
+    if not product:
+        return jsonify({'error': 'Not found'}), 404
+    ghost_urls = workflows.data.get_ghost_image_urls(product)
+    if not 0 <= idx < len(ghost_urls):
+        return jsonify({'error': 'Not found'}), 404
+    
+    cache = workflows.get().vision.ghost_cache
+    try:
+        path = cache.ensure(ghost_urls[idx], request.args.get('size'), allow_stale=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if path is None:
+        return jsonify({'error': 'Ghost image unavailable'}), 502
+    return send_static_file(cache.cache_dir, path.relative_to(cache.cache_dir).as_posix())
+
 @app.route('/api/generate', methods=['POST'])
 def generate_api():
+    """Queue generation for a product; poll /api/jobs/<job_id> for progress."""
     data = request.json
     cupid = data.get('cupid_name')
     active_sources = data.get('active_sources')  # Get list of selected image URLs
     
     if not cupid:
         return jsonify({'success': False, 'error': 'Missing cupid_name'})
+    
+    # Pass the list of selected URLs to the workflow
+    job = jobs.submit(cupid, selected_ghost_urls=active_sources, priority='interactive')
+    return jsonify({'success': True, 'job_id': job['job_id'], 'job': job}), 202
+
+@app.route('/api/tranche/<tranche>/generate', methods=['POST'])
+def generate_tranche_api(tranche):
+    """Queue generation for every product in a tranche (optional 'limit')."""
+    data = request.get_json(silent=True) or {}
+    products = workflows.data.get_products_by_tranche(tranche, limit=data.get('limit'))
+    if not products:
+        return jsonify({'success': False, 'error': f'No products in tranche {tranche}'}), 404
+    
+    submitted = jobs.submit_many([str(p['cupidName']) for p in products], priority='bulk')
+    return jsonify({
+        'success': True,
+        'group': submitted['group'],
+        'job_ids': [job['job_id'] for job in submitted['jobs']]
+    }), 202
+
+def _clear_regenerate_flag(job):
+    """Clear a product's feedback regenerate flag once its re-run succeeded."""
+    if job['status'] == 'done':
+        workflows.get().feedback.mark_regenerated(job['cupid_name'])
+
+@app.route('/api/regenerate', methods=['POST'])
+def regenerate_api():
+    """Queue re-runs for one product ('cupid_name') or every product flagged in feedback."""
+    data = request.get_json(silent=True) or {}
+    cupid = data.get('cupid_name')
+    product_ids = [cupid] if cupid else workflows.get().feedback.get_products_to_regenerate()
+    if not product_ids:
+        return jsonify({'success': False, 'error': 'No products marked for regeneration'}), 404
+    
+    submitted = jobs.submit_many(product_ids, priority='regenerate', on_finish=_clear_regenerate_flag)
+    return jsonify({
+        'success': True,
+        'group': submitted['group'],
+        'job_ids': [job['job_id'] for job in submitted['jobs']]
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Status, current stage, images so far and result of a generation job."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Job counts and jobs, optionally for one bulk submission (?group=)."""
+    group = request.args.get('group')
+    return jsonify({'summary': jobs.summary(group), 'jobs': jobs.list(group)})
+
+@app.route('/api/events')
+def stream_events():
+    """Server-sent events: job progress, saved images and catalog changes."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
     try:
-        # Select workflow based on engine config
-        if ENGINE_VERSION == 'v2_nanobananapro':
-            wf = create_workflow_v2()
-            print(f"[Engine: V2 Nano Banana Pro]")
-        else:
-            wf = create_workflow()
-            print(f"[Engine: V1]")
-        
-        # Pass the list of selected URLs to the workflow
-        result = wf.run(cupid, verbose=True, selected_ghost_urls=active_sources)
-        result['engine_used'] = ENGINE_VERSION
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e), 'engine_used': ENGINE_VERSION})
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    return Response(
+        events.stream(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/output/<path:filename>')
 def serve_image(filename):
-    return send_from_directory('./output', filename)
+    """Generated images and derivatives; ?v= URLs (see image index entries) never change."""
+    return send_static_file(workflows.config.get('output', {}).get('base_path', './output'), filename,
+                            immutable=bool(request.args.get('v')))
 
 def main():
+    # Build the workflow and image index before the first request instead of during it
+    warm_up()
+    start_background()
     print("🎯 AI Imagery Workbench (React) running on port 8080")
-    app.run(host='0.0.0.0', port=8080)
+    app.run(host='0.0.0.0', port=8080, threaded=True)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,170 @@
+"""
+Shared Workflow Instances for AI Product Imagery Workflow
+
+A long-running server (review_ui) builds each engine's workflow once, on
+first use, and reuses it across requests instead of re-reading config.yaml,
+re-parsing the product CSV and constructing new Gemini clients per call.
+
+Source files are checked at most every check_interval seconds:
+
+    config.yaml, product CSV      rebuild the workflows on next use
+    governance_rules.yaml         GovernanceEngine.reload_if_changed()
+    feedback.yaml                 FeedbackManager.reload_if_changed()
+    safety_constitution.yaml      ImageGeneratorV2.reload_safety_constitution_if_changed()
+
+A rebuilt workflow replaces the old one for new requests only; requests
+already running keep the instance they started with, and its write-behind
+queue drains on its own.
+
+Under the production server the workflows are built once in the parent
+process and inherited by every worker; share_limiters() makes all of them
+draw from one model quota.
+"""
+
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from data_layer import load_config
+from parallel_batch import attach_shared_limiters, create_engine_workflow
+
+
+def _mtime(path) -> Optional[float]:
+    """File modification time, or None if it does not exist."""
+    try:
+        return Path(path).stat().st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+class SharedWorkflows:
+    """Lazily built, reloadable workflow instances shared by concurrent requests."""
+
+    def __init__(self, config_path: str = "config.yaml", check_interval: float = 2.0):
+        """
+        Initialize shared workflows.
+
+        Args:
+            config_path: Path to config.yaml
+            check_interval: Minimum seconds between source file checks
+        """
+        self.config_path = config_path
+        self.check_interval = check_interval
+
+        self._workflows: dict[str, object] = {}
+        self._limiters: dict = {}
+        self._config: dict = load_config(config_path)
+        self._signature = self._source_signature()
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> str:
+        """Configured generation.engine."""
+        return self._config.get('generation', {}).get('engine', 'v1')
+
+    @property
+    def config(self) -> dict:
+        """Current config.yaml contents."""
+        return self._config
+
+    @property
+    def catalog_version(self) -> str:
+        """Changes whenever config.yaml or the product CSV changes on disk."""
+        self._refresh()
+        return f"{zlib.crc32(repr(self._signature).encode()):08x}"
+
+    @property
+    def data(self):
+        """Product data layer of the configured engine's workflow."""
+        return self.get().data
+
+    def _source_signature(self) -> tuple:
+        """Modification times of the files a rebuild depends on."""
+        csv_path = self._config.get('data', {}).get('csv_path')
+        return (_mtime(self.config_path), _mtime(csv_path))
+
+    def get(self, engine: Optional[str] = None):
+        """
+        Get the shared workflow for an engine (default: configured engine),
+        building it on first use.
+
+        Concurrent first requests wait for a single build instead of each
+        building their own.
+        """
+        self._refresh()
+        with self._lock:
+            engine = engine or self.engine
+            workflow = self._workflows.get(engine)
+            if workflow is None:
+                workflow = create_engine_workflow(engine, self.config_path)
+                attach_shared_limiters(workflow, self._limiters)
+                self._workflows[engine] = workflow
+            return workflow
+
+    def share_limiters(self, limiters: dict) -> None:
+        """
+        Draw model quota from cross-process limiters (SharedRateLimiter),
+        now and in every workflow built later.
+        """
+        with self._lock:
+            self._limiters = dict(limiters)
+            for workflow in self._workflows.values():
+                attach_shared_limiters(workflow, self._limiters)
+
+    def warm(self) -> None:
+        """Build the configured engine's workflow now (server startup)."""
+        self.get()
+
+    def _refresh(self) -> None:
+        """Pick up changed source files (at most once per check_interval)."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+
+            if _mtime(self.config_path) != self._signature[0]:
+                self._config = load_config(self.config_path)
+            signature = self._source_signature()
+            if signature != self._signature:
+                self._signature = signature
+                if self._workflows:
+                    print("Config or product data changed; workflows rebuild on next use")
+                self._workflows.clear()
+                return
+
+            for workflow in self._workflows.values():
+                self._reload_components(workflow)
+
+    @staticmethod
+    def _reload_components(workflow) -> None:
+        """Reload the workflow parts whose files changed on disk."""
+        # A file caught mid-edit fails to parse; the old version stays in
+        # use and the reload is retried on the next check
+        try:
+            if workflow.governance.reload_if_changed():
+                print("Governance rules reloaded")
+        except Exception as e:
+            print(f"Warning: could not reload governance rules: {e}")
+        try:
+            workflow.feedback.reload_if_changed()
+        except Exception as e:
+            print(f"Warning: could not reload feedback: {e}")
+        reload_constitution = getattr(workflow.generator, 'reload_safety_constitution_if_changed', None)
+        try:
+            if reload_constitution and reload_constitution():
+                print("Safety constitution reloaded")
+        except Exception as e:
+            print(f"Warning: could not reload safety constitution: {e}")
+
+
+def create_shared_workflows(config_path: str = "config.yaml") -> SharedWorkflows:
+    """Factory function to create SharedWorkflows from the review_ui config section."""
+    config = load_config(config_path).get('review_ui', {}) or {}
+    return SharedWorkflows(config_path, check_interval=config.get('reload_check_seconds', 2.0))
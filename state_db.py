@@ -0,0 +1,120 @@
+"""
+Shared Review Server State for AI Product Imagery Workflow
+
+In production serving mode (gunicorn.conf.py) the review UI runs as several
+worker processes. The state they must agree on lives in one SQLite database
+in WAL mode, so readers never block the writer and every worker sees the
+others' changes:
+
+    images   generated image index entries (generated_index.py)
+    jobs     generation job state (job_queue.py)
+    events   server-sent events for browsers on any worker (events.py)
+
+Each thread of each process gets its own connection; connections are never
+carried across a fork.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    key TEXT PRIMARY KEY,
+    cupid TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    entry TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_seq ON images (seq);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    cupid TEXT NOT NULL,
+    grp TEXT,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    job TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_cupid_status ON jobs (cupid, status);
+CREATE INDEX IF NOT EXISTS jobs_grp ON jobs (grp);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+class StateDB:
+    """SQLite (WAL) database shared by the review server's worker processes."""
+
+    def __init__(self, path: str = "./output/jobs/review_state.db", busy_timeout_ms: int = 10000):
+        """
+        Initialize state database (created on first connection).
+
+        Args:
+            path: Database file; every worker process must use the same one
+            busy_timeout_ms: How long a writer waits for another's write lock
+        """
+        self.path = Path(path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._inherited: list[sqlite3.Connection] = []
+
+    def connect(self) -> sqlite3.Connection:
+        """Connection for the calling thread (new after a fork)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            if self._local.pid == os.getpid():
+                return conn
+            # Inherited from the parent: never use or close it here (closing
+            # could checkpoint and remove the WAL the parent still uses)
+            self._inherited.append(conn)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are explicit (see transaction())
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: durable across process crashes, fsync only at checkpoints
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; takes the write lock up front so read-then-write is atomic."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        """Run a read query."""
+        return self.connect().execute(sql, params).fetchall()
+
+
+def create_state_db(config: Optional[dict] = None) -> StateDB:
+    """Factory function to create StateDB from the review_ui.production config section."""
+    config = config or {}
+    return StateDB(
+        config.get('state_db', './output/jobs/review_state.db'),
+        busy_timeout_ms=int(config.get('busy_timeout_ms', 10000))
+    )
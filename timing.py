@@ -0,0 +1,194 @@
+"""
+Stage Timing for AI Product Imagery Workflow
+
+Structured latency spans for a product run. Each span is a small dict:
+
+    {'kind': 'stage', 'name': 'fetch', 'queue_s': 0.8, 'call_s': 1.42}
+    {'kind': 'op', 'name': 'generation', 'model': '...', 'queue_s': 3.1, 'call_s': 21.7}
+
+'stage' spans wrap a whole workflow stage (lookup, fetch, vision, compose,
+generate, audit); queue_s is time the product waited in front of the stage
+(pipeline queue, concurrency slot or worker pool). 'op' spans time the work
+inside a stage (governance compile, prompt compose, generation, save);
+for generation queue_s is time spent waiting for model quota.
+
+Spans accumulate on result['timings'], are copied into each image's audit
+JSON, and TimingStats turns a batch of them into p50/p95/p99 per span and
+model.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+def make_span(
+    kind: str,
+    name: str,
+    call_seconds: float,
+    queue_seconds: float = 0.0,
+    model: Optional[str] = None
+) -> dict:
+    """Build one span record."""
+    span = {
+        'kind': kind,
+        'name': name,
+        'queue_s': round(max(0.0, queue_seconds), 4),
+        'call_s': round(max(0.0, call_seconds), 4),
+    }
+    if model:
+        span['model'] = model
+    return span
+
+
+def add_span(
+    ctx: dict,
+    kind: str,
+    name: str,
+    call_seconds: float,
+    queue_seconds: float = 0.0,
+    model: Optional[str] = None
+) -> None:
+    """Append a span to a workflow context's result."""
+    ctx['result'].setdefault('timings', []).append(
+        make_span(kind, name, call_seconds, queue_seconds, model)
+    )
+
+
+@contextmanager
+def timed(ctx: dict, name: str, model: Optional[str] = None) -> Iterator[None]:
+    """Record the enclosed block as an 'op' span."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        add_span(ctx, 'op', name, time.monotonic() - start, model=model)
+
+
+def run_stage(ctx: dict, name: str, fn: Callable[[dict], dict], queue_seconds: float = 0.0) -> dict:
+    """Run one workflow stage and record it as a 'stage' span."""
+    start = time.monotonic()
+    try:
+        return fn(ctx)
+    finally:
+        add_span(ctx, 'stage', name, time.monotonic() - start, queue_seconds)
+
+
+async def arun_stage(ctx: dict, name: str, afn, queue_seconds: float = 0.0) -> dict:
+    """Async run_stage() for a coroutine stage function."""
+    start = time.monotonic()
+    try:
+        return await afn(ctx)
+    finally:
+        add_span(ctx, 'stage', name, time.monotonic() - start, queue_seconds)
+
+
+def generation_spans(gen_result: dict) -> list[dict]:
+    """'generation' and 'save' op spans from a generate_and_save() result's timing."""
+    timing = gen_result.get('timing')
+    if not timing:
+        return []
+    return [
+        make_span('op', 'generation', timing['call_seconds'], timing['queue_seconds'], timing.get('model')),
+        make_span('op', 'save', timing['save_seconds']),
+    ]
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _distribution(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        'p50': round(_percentile(ordered, 50), 3),
+        'p95': round(_percentile(ordered, 95), 3),
+        'p99': round(_percentile(ordered, 99), 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'total': round(sum(ordered), 2),
+    }
+
+
+class TimingStats:
+    """Collects span durations across a batch and reports percentiles."""
+
+    def __init__(self):
+        # (kind, name, model) -> (queue samples, call samples)
+        self._samples: dict[tuple, tuple[list[float], list[float]]] = {}
+
+    def add(self, spans: list[dict]) -> None:
+        """Add spans (e.g. one product's result['timings'])."""
+        for span in spans:
+            key = (span['kind'], span['name'], span.get('model'))
+            queue_samples, call_samples = self._samples.setdefault(key, ([], []))
+            queue_samples.append(span['queue_s'])
+            call_samples.append(span['call_s'])
+
+    def add_result(self, result: dict) -> None:
+        """Add a product result's spans."""
+        self.add(result.get('timings', []))
+
+    def summary(self) -> dict:
+        """
+        Machine-readable percentile summary.
+
+        Returns:
+            {'stages': {name: entry}, 'ops': {name: entry}} where entry has
+            'count', 'queue' and 'call' distributions (p50/p95/p99/mean/total)
+            and, for spans tagged with a model, the same per model under
+            'by_model'
+        """
+        merged: dict[tuple, tuple[list[float], list[float]]] = {}
+        by_model: dict[tuple, dict] = {}
+        for (kind, name, model), (queue_samples, call_samples) in self._samples.items():
+            all_queue, all_call = merged.setdefault((kind, name), ([], []))
+            all_queue.extend(queue_samples)
+            all_call.extend(call_samples)
+            if model:
+                by_model.setdefault((kind, name), {})[model] = {
+                    'count': len(call_samples),
+                    'queue': _distribution(queue_samples),
+                    'call': _distribution(call_samples),
+                }
+
+        summary = {'stages': {}, 'ops': {}}
+        for (kind, name), (queue_samples, call_samples) in merged.items():
+            entry = {
+                'count': len(call_samples),
+                'queue': _distribution(queue_samples),
+                'call': _distribution(call_samples),
+            }
+            if (kind, name) in by_model:
+                entry['by_model'] = by_model[(kind, name)]
+            summary['stages' if kind == 'stage' else 'ops'][name] = entry
+        return summary
+
+
+def summarize_timings(results: list[dict]) -> dict:
+    """TimingStats summary for a list of product results."""
+    stats = TimingStats()
+    for result in results:
+        stats.add_result(result)
+    return stats.summary()
+
+
+def format_timing_summary(summary: dict) -> str:
+    """Render a TimingStats summary as a small text table."""
+    lines = [f"  {'span':<22}{'n':>5}{'queue p50':>11}{'p95':>8}{'call p50':>10}{'p95':>8}{'p99':>8}"]
+
+    def row(label: str, entry: dict) -> str:
+        queue, call = entry['queue'], entry['call']
+        return (
+            f"  {label:<22}{entry['count']:>5}{queue['p50']:>11}{queue['p95']:>8}"
+            f"{call['p50']:>10}{call['p95']:>8}{call['p99']:>8}"
+        )
+
+    for section in ('stages', 'ops'):
+        for name, entry in summary.get(section, {}).items():
+            lines.append(row(name, entry))
+            for model, model_entry in entry.get('by_model', {}).items():
+                lines.append(row(f"  {model}"[:22], model_entry))
+    return "Timing (seconds):\n" + "\n".join(lines)
@@ -0,0 +1,312 @@
+"""
+Token Usage and Cost Accounting for AI Product Imagery Workflow
+
+Every Gemini call (vision analysis, image generation, post-generation
+audit) reports its response usage_metadata as a usage record:
+
+    {'stage': 'generation', 'model': '...', 'input_tokens': 1840,
+     'cached_tokens': 1290, 'output_tokens': 1120, 'thinking_tokens': 0,
+     'total_tokens': 2960}
+
+Records accumulate on result['usage'], are copied into each image's audit
+JSON, and are appended with product context to an append-only ledger
+(output/jobs/usage.jsonl). Cost is computed from the usage.pricing table in
+config.yaml when reporting, so a price change applies to past runs too.
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+TOKEN_FIELDS = ('input_tokens', 'cached_tokens', 'output_tokens', 'thinking_tokens', 'total_tokens')
+
+
+def token_counts(response) -> dict:
+    """Token counts from a Gemini response's usage_metadata (zeros if absent)."""
+    usage = getattr(response, 'usage_metadata', None)
+
+    def count(name: str) -> int:
+        return int(getattr(usage, name, None) or 0)
+
+    return {
+        'input_tokens': count('prompt_token_count'),
+        'cached_tokens': count('cached_content_token_count'),
+        'output_tokens': count('candidates_token_count'),
+        'thinking_tokens': count('thoughts_token_count'),
+        'total_tokens': count('total_token_count'),
+    }
+
+
+def usage_record(stage: str, model: str, tokens: Optional[dict]) -> dict:
+    """Attribute token counts to a stage and model."""
+    record = {'stage': stage, 'model': model}
+    for field in TOKEN_FIELDS:
+        record[field] = int((tokens or {}).get(field, 0))
+    if not record['total_tokens']:
+        record['total_tokens'] = record['input_tokens'] + record['output_tokens'] + record['thinking_tokens']
+    return record
+
+
+def cost_usd(record: dict, pricing: dict) -> float:
+    """
+    Cost of one usage record.
+
+    Args:
+        record: Usage record
+        pricing: Model -> {'input', 'cached_input', 'output'} in USD per
+            1M tokens; thinking tokens bill at the output rate. Models
+            missing from the table cost 0.
+    """
+    rates = pricing.get(record.get('model'), {})
+    if not rates:
+        return 0.0
+
+    cached = record.get('cached_tokens', 0)
+    uncached = max(0, record.get('input_tokens', 0) - cached)
+    output = record.get('output_tokens', 0) + record.get('thinking_tokens', 0)
+    cost = (
+        uncached * rates.get('input', 0.0)
+        + cached * rates.get('cached_input', rates.get('input', 0.0))
+        + output * rates.get('output', 0.0)
+    )
+    return cost / 1_000_000
+
+
+def cache_savings_usd(record: dict, pricing: dict) -> float:
+    """What the cached share of the input would have cost uncached, minus what it did cost."""
+    rates = pricing.get(record.get('model'), {})
+    saved_rate = rates.get('input', 0.0) - rates.get('cached_input', rates.get('input', 0.0))
+    return record.get('cached_tokens', 0) * saved_rate / 1_000_000
+
+
+class UsageStats:
+    """Rolls usage records up into totals, per stage and per model."""
+
+    def __init__(self, pricing: Optional[dict] = None):
+        self.pricing = pricing or {}
+        self._totals = self._empty()
+        self._by_stage: dict[str, dict] = defaultdict(self._empty)
+        self._by_model: dict[str, dict] = defaultdict(self._empty)
+
+    @staticmethod
+    def _empty() -> dict:
+        return {'calls': 0, **{field: 0 for field in TOKEN_FIELDS}, 'cost_usd': 0.0, 'cache_savings_usd': 0.0}
+
+    def add(self, records: list[dict]) -> None:
+        """Add usage records."""
+        for record in records:
+            cost = cost_usd(record, self.pricing)
+            savings = cache_savings_usd(record, self.pricing)
+            for bucket in (self._totals, self._by_stage[record['stage']], self._by_model[record['model']]):
+                bucket['calls'] += 1
+                for field in TOKEN_FIELDS:
+                    bucket[field] += record.get(field, 0)
+                bucket['cost_usd'] += cost
+                bucket['cache_savings_usd'] += savings
+
+    def add_result(self, result: dict) -> None:
+        """Add a product result's usage records."""
+        self.add(result.get('usage', []))
+
+    def summary(self) -> dict:
+        """Totals plus 'by_stage' and 'by_model' breakdowns (costs in USD)."""
+        def rounded(bucket: dict) -> dict:
+            return {
+                **bucket,
+                'cost_usd': round(bucket['cost_usd'], 4),
+                'cache_savings_usd': round(bucket['cache_savings_usd'], 4),
+            }
+
+        return {
+            **rounded(self._totals),
+            'by_stage': {stage: rounded(b) for stage, b in self._by_stage.items()},
+            'by_model': {model: rounded(b) for model, b in self._by_model.items()},
+        }
+
+
+def summarize_usage(results: list[dict], pricing: Optional[dict] = None) -> dict:
+    """UsageStats summary for a list of product results."""
+    stats = UsageStats(pricing)
+    for result in results:
+        stats.add_result(result)
+    return stats.summary()
+
+
+def format_usage_summary(summary: dict) -> str:
+    """Render a UsageStats summary as a short text block."""
+    lines = [
+        f"Usage: {summary['calls']} call(s), {summary['total_tokens']} tokens "
+        f"({summary['cached_tokens']} cached), ${summary['cost_usd']:.4f} "
+        f"(cache saved ${summary['cache_savings_usd']:.4f})"
+    ]
+    for section in ('by_stage', 'by_model'):
+        for name, bucket in summary.get(section, {}).items():
+            lines.append(
+                f"  {name:<34}{bucket['calls']:>5} call(s){bucket['total_tokens']:>12} tokens  ${bucket['cost_usd']:.4f}"
+            )
+    return "\n".join(lines)
+
+
+class UsageLedger:
+    """Append-only JSONL ledger of usage records with product context."""
+
+    def __init__(self, path: str = "./output/jobs/usage.jsonl"):
+        """
+        Initialize ledger.
+
+        Args:
+            path: Ledger file (shared by threads and worker processes; each
+                record is one O_APPEND write)
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def append(self, records: list[dict], **context) -> None:
+        """Append records tagged with context (product_id, cupid_name, tranche, batch_id)."""
+        if not records:
+            return
+        at = datetime.now().isoformat()
+        lines = "".join(
+            json.dumps({**record, **{k: v for k, v in context.items() if v is not None}, 'at': at}) + "\n"
+            for record in records
+        ).encode('utf-8')
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, lines)
+            finally:
+                os.close(fd)
+
+    def read(self) -> Iterator[dict]:
+        """Yield every record in the ledger."""
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn line from an interrupted write
+                    continue
+
+
+def record_usage(
+    ledger: Optional[UsageLedger],
+    ctx: dict,
+    records: list,
+    image: Optional[str] = None
+) -> None:
+    """
+    Add Gemini usage records to a workflow context's result and the ledger.
+
+    Args:
+        ledger: Usage ledger (None when disabled)
+        ctx: Workflow run context (product_id, cupid_name, tranche, batch_id)
+        records: Usage records; None entries (no API answer) are skipped
+        image: Image path the records produced, if any
+    """
+    records = [record for record in records if record]
+    if not records:
+        return
+    ctx['result']['usage'].extend(records)
+
+    if ledger:
+        try:
+            ledger.append(
+                records,
+                product_id=ctx['product_id'],
+                cupid_name=ctx.get('cupid_name'),
+                tranche=ctx.get('tranche'),
+                batch_id=ctx.get('batch_id'),
+                image=image
+            )
+        except OSError as e:
+            print(f"Warning: could not write usage ledger: {e}")
+
+
+def cost_report(
+    ledger: UsageLedger,
+    pricing: dict,
+    approved_products: set[str],
+    tranche: Optional[str] = None,
+    batch_id: Optional[str] = None
+) -> dict:
+    """
+    Roll the ledger up per tranche, with cost per image and per approved image.
+
+    Args:
+        ledger: Usage ledger to read
+        pricing: usage.pricing table
+        approved_products: cupidNames whose images were approved
+        tranche: Only this tranche
+        batch_id: Only calls made by this batch
+
+    Returns:
+        {'tranches': {tranche: summary}, 'total': summary} where each summary
+        is a UsageStats summary plus 'images', 'approved_images',
+        'cost_per_image_usd' and 'cost_per_approved_image_usd'
+    """
+    stats: dict[str, UsageStats] = {}
+    images: dict[str, set] = defaultdict(set)
+    approved: dict[str, set] = defaultdict(set)
+    total = UsageStats(pricing)
+
+    for record in ledger.read():
+        if tranche and record.get('tranche') != tranche:
+            continue
+        if batch_id and record.get('batch_id') != batch_id:
+            continue
+
+        key = record.get('tranche') or 'Unknown'
+        stats.setdefault(key, UsageStats(pricing)).add([record])
+        total.add([record])
+        if record.get('image'):
+            images[key].add(record['image'])
+            if record.get('cupid_name') in approved_products:
+                approved[key].add(record['image'])
+
+    def with_images(summary: dict, image_count: int, approved_count: int) -> dict:
+        summary.update({
+            'images': image_count,
+            'approved_images': approved_count,
+            'cost_per_image_usd': round(summary['cost_usd'] / image_count, 4) if image_count else None,
+            'cost_per_approved_image_usd': round(summary['cost_usd'] / approved_count, 4) if approved_count else None,
+        })
+        return summary
+
+    report = {
+        'tranches': {
+            key: with_images(s.summary(), len(images[key]), len(approved[key]))
+            for key, s in sorted(stats.items())
+        }
+    }
+    report['total'] = with_images(
+        total.summary(),
+        sum(len(v) for v in images.values()),
+        sum(len(v) for v in approved.values())
+    )
+    return report
+
+
+def load_pricing(config: Optional[dict] = None) -> dict:
+    """usage.pricing table from config (model -> USD per 1M tokens)."""
+    return ((config or {}).get('usage') or {}).get('pricing') or {}
+
+
+def create_usage_ledger(config: Optional[dict] = None) -> Optional[UsageLedger]:
+    """Factory function to create UsageLedger from the usage config section (None if disabled)."""
+    config = (config or {}).get('usage') or {}
+    if not config.get('enabled', True):
+        return None
+    return UsageLedger(config.get('ledger', './output/jobs/usage.jsonl'))
+
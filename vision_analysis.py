@@ -5,12 +5,24 @@ Analyzes ghost images using Gemini Vision to extract visible features,
 preventing hallucination of features not visible in the product images.
 """
 
+import asyncio
 import base64
+import hashlib
 import os
 import requests
+import threading
+from collections import OrderedDict
 from typing import Optional
 from pathlib import Path
 
+from usage import token_counts, usage_record
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
 try:
     from google import genai
     from google.genai import types
@@ -55,15 +67,29 @@ Please provide a structured analysis:
 Be conservative - if something is partially visible or unclear, note that uncertainty.
 """
 
-    def __init__(self, model_name: str = "gemini-2.5-flash"):
+    def __init__(self, model_name: str = "gemini-2.5-flash", ghost_cache=None, analysis_cache_size: int = 256):
         """
         Initialize vision analyzer.
         
         Args:
             model_name: Gemini model to use for vision analysis
+            ghost_cache: Shared GhostImageCache; fetched images are read
+                from and stored in it (None fetches directly)
+            analysis_cache_size: Image analyses remembered by content hash
+                (a prefetched product is not analyzed again on generate)
         """
         self.model_name = model_name
+        self.ghost_cache = ghost_cache
+        self.analysis_cache_size = analysis_cache_size
         self._client = None
+        # requests.Session is not thread-safe; one per thread keeps
+        # connection reuse when an analyzer is shared across requests
+        self._local = threading.local()
+        # sha256(image) -> successful analysis; a thread asking for an image
+        # that is being analyzed waits for that call instead of repeating it
+        self._analyses: OrderedDict[str, dict] = OrderedDict()
+        self._analyzing: set[str] = set()
+        self._analyses_changed = threading.Condition()
         self._init_client()
     
     def _init_client(self) -> None:
@@ -80,7 +106,7 @@ Be conservative - if something is partially visible or unclear, note that uncert
     
     def fetch_image(self, url: str) -> Optional[bytes]:
         """
-        Fetch image from URL.
+        Fetch image from URL (through the ghost cache when set).
         
         Args:
             url: Image URL (Scene7)
@@ -88,28 +114,113 @@ Be conservative - if something is partially visible or unclear, note that uncert
         Returns:
             Image bytes or None if failed
         """
+        if self.ghost_cache is not None:
+            return self.ghost_cache.get(url)
+        
         try:
-            # Scene7 URLs may need size parameter for optimal quality
-            if 'scene7.com' in url and '?' not in url:
-                url = f"{url}?wid=1024&hei=1024&fmt=jpg"
-            
-            response = requests.get(url, timeout=30)
+            response = self._session().get(self._image_request_url(url), timeout=30)
             response.raise_for_status()
             return response.content
         except Exception as e:
             print(f"Error fetching image from {url}: {e}")
             return None
     
+    def _session(self) -> requests.Session:
+        """HTTP session for the calling thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+    
+    async def afetch_image(self, url: str, http=None) -> Optional[bytes]:
+        """
+        Fetch image from URL without blocking the event loop.
+        
+        Args:
+            url: Image URL (Scene7)
+            http: Shared httpx.AsyncClient (falls back to a worker thread
+                running fetch_image when httpx is unavailable)
+            
+        Returns:
+            Image bytes or None if failed
+        """
+        if http is None or not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.fetch_image, url)
+        
+        if self.ghost_cache is not None:
+            cached = self.ghost_cache.cached(url)
+            if cached is not None:
+                return cached
+        
+        try:
+            response = await http.get(self._image_request_url(url), timeout=30)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Error fetching image from {url}: {e}")
+            # Scene7 unavailable: an expired cached copy is better than none
+            return self.ghost_cache.cached(url, allow_stale=True) if self.ghost_cache is not None else None
+        
+        if self.ghost_cache is not None:
+            await asyncio.to_thread(self.ghost_cache.store, url, response.content)
+        return response.content
+    
+    @staticmethod
+    def _image_request_url(url: str) -> str:
+        """Scene7 URLs may need size parameter for optimal quality."""
+        if 'scene7.com' in url and '?' not in url:
+            return f"{url}?wid=1024&hei=1024&fmt=jpg"
+        return url
+    
     def analyze_image(self, image_bytes: bytes) -> dict:
         """
         Analyze a single image using Gemini Vision.
         
+        Images analyzed before (same bytes) return the remembered analysis,
+        marked 'cached' and without usage (it was billed the first time).
+        
         Args:
             image_bytes: Raw image data
             
         Returns:
             Analysis dict with visible features
         """
+        key = hashlib.sha256(image_bytes).hexdigest()
+        with self._analyses_changed:
+            while key in self._analyzing:
+                self._analyses_changed.wait()
+            cached = self._cached_analysis(key)
+            if cached is not None:
+                return cached
+            self._analyzing.add(key)
+        
+        analysis = None
+        try:
+            analysis = self._analyze_image(image_bytes)
+            return analysis
+        finally:
+            with self._analyses_changed:
+                self._analyzing.discard(key)
+                self._remember_analysis(key, analysis)
+                self._analyses_changed.notify_all()
+    
+    def _cached_analysis(self, key: str) -> Optional[dict]:
+        """Remembered analysis for an image hash (caller holds _analyses_changed)."""
+        cached = self._analyses.get(key)
+        if cached is None:
+            return None
+        self._analyses.move_to_end(key)
+        return {**cached, 'cached': True}
+    
+    def _remember_analysis(self, key: str, analysis: Optional[dict]) -> None:
+        """Keep a successful analysis (caller holds _analyses_changed)."""
+        if not analysis or not analysis.get('success'):
+            return
+        self._analyses[key] = {k: v for k, v in analysis.items() if k != 'usage'}
+        while len(self._analyses) > self.analysis_cache_size:
+            self._analyses.popitem(last=False)
+    
+    def _analyze_image(self, image_bytes: bytes) -> dict:
+        """Gemini Vision call behind analyze_image()."""
         if not self._client:
             return {'error': 'Gemini client not initialized', 'raw_analysis': ''}
         
@@ -130,7 +241,50 @@ Be conservative - if something is partially visible or unclear, note that uncert
             
             return {
                 'raw_analysis': analysis_text,
-                'success': True
+                'success': True,
+                'usage': usage_record('vision', self.model_name, token_counts(response))
+            }
+            
+        except Exception as e:
+            return {
+                'error': str(e),
+                'raw_analysis': '',
+                'success': False
+            }
+    
+    async def aanalyze_image(self, image_bytes: bytes) -> dict:
+        """Async analyze_image() on the Gemini async client (shares its cache)."""
+        key = hashlib.sha256(image_bytes).hexdigest()
+        with self._analyses_changed:
+            cached = self._cached_analysis(key)
+        if cached is not None:
+            return cached
+        
+        analysis = await self._aanalyze_image(image_bytes)
+        with self._analyses_changed:
+            self._remember_analysis(key, analysis)
+        return analysis
+    
+    async def _aanalyze_image(self, image_bytes: bytes) -> dict:
+        """Async Gemini Vision call behind aanalyze_image()."""
+        if not self._client:
+            return {'error': 'Gemini client not initialized', 'raw_analysis': ''}
+        
+        try:
+            image_part = types.Part.from_bytes(
+                data=image_bytes,
+                mime_type="image/jpeg"
+            )
+            
+            response = await self._client.aio.models.generate_content(
+                model=self.model_name,
+                contents=[self.ANALYSIS_PROMPT, image_part]
+            )
+            
+            return {
+                'raw_analysis': response.text,
+                'success': True,
+                'usage': usage_record('vision', self.model_name, token_counts(response))
             }
             
         except Exception as e:
@@ -143,7 +297,8 @@ Be conservative - if something is partially visible or unclear, note that uncert
     def analyze_ghost_images(
         self, 
         image_urls: list[str], 
-        product_specs: dict
+        product_specs: dict,
+        prefetched: Optional[dict[str, bytes]] = None
     ) -> dict:
         """
         Analyze all ghost images and compile visible features.
@@ -151,6 +306,8 @@ Be conservative - if something is partially visible or unclear, note that uncert
         Args:
             image_urls: List of Scene7 image URLs
             product_specs: Product specifications from data layer
+            prefetched: Optional URL -> image bytes already downloaded by
+                the caller; missing URLs are fetched here
             
         Returns:
             Compiled analysis with visible features
@@ -168,8 +325,9 @@ Be conservative - if something is partially visible or unclear, note that uncert
         # Analyze primary image (first one) and optionally one more
         urls_to_analyze = image_urls[:2]  # Analyze up to 2 images
         
+        prefetched = prefetched or {}
         for url in urls_to_analyze:
-            image_bytes = self.fetch_image(url)
+            image_bytes = prefetched[url] if url in prefetched else self.fetch_image(url)
             if image_bytes:
                 analysis = self.analyze_image(image_bytes)
                 analyses.append({
@@ -177,14 +335,56 @@ Be conservative - if something is partially visible or unclear, note that uncert
                     'analysis': analysis
                 })
         
-        # Compile visible features from analyses
+        return self._ghost_analysis_result(analyses, product_specs)
+    
+    async def aanalyze_ghost_images(
+        self,
+        image_urls: list[str],
+        product_specs: dict,
+        prefetched: Optional[dict[str, bytes]] = None,
+        http=None
+    ) -> dict:
+        """
+        Async analyze_ghost_images(); the analyzed images run concurrently.
+        
+        Args:
+            image_urls: List of Scene7 image URLs
+            product_specs: Product specifications from data layer
+            prefetched: Optional URL -> image bytes already downloaded
+            http: Shared httpx.AsyncClient for URLs not in prefetched
+            
+        Returns:
+            Compiled analysis with visible features
+        """
+        if not image_urls:
+            return {
+                'visible_features': [],
+                'analyses': [],
+                'error': 'No ghost images available'
+            }
+        
+        prefetched = prefetched or {}
+        urls_to_analyze = image_urls[:2]  # Analyze up to 2 images
+        
+        async def analyze(url: str) -> Optional[dict]:
+            image_bytes = prefetched[url] if url in prefetched else await self.afetch_image(url, http)
+            if not image_bytes:
+                return None
+            return {'url': url, 'analysis': await self.aanalyze_image(image_bytes)}
+        
+        analyses = [a for a in await asyncio.gather(*(analyze(url) for url in urls_to_analyze)) if a]
+        return self._ghost_analysis_result(analyses, product_specs)
+    
+    def _ghost_analysis_result(self, analyses: list[dict], product_specs: dict) -> dict:
+        """Compile per-image analyses into the ghost analysis result."""
         compiled = self._compile_visible_features(analyses, product_specs)
         
         return {
             'visible_features': compiled['visible'],
             'unverified_features': compiled['unverified'],
             'analyses': analyses,
-            'image_count_analyzed': len(analyses)
+            'image_count_analyzed': len(analyses),
+            'usage': [a['analysis']['usage'] for a in analyses if a['analysis'].get('usage')]
         }
     
     def _compile_visible_features(
@@ -253,7 +453,8 @@ Be conservative - if something is partially visible or unclear, note that uncert
         - Is the product floating/not grounded?
         
         Returns:
-            Dict with 'safe', 'physics_ok', 'issues' keys
+            Dict with 'safe', 'physics_ok', 'issues' keys, plus 'usage'
+            when the audit call was answered
         """
         if not self._client:
             return {'safe': True, 'physics_ok': True, 'issues': [], 'error': 'Vision client not initialized'}
@@ -276,6 +477,7 @@ Output ONLY valid JSON in this exact format:
 {"child_present": false, "finger_on_trigger": false, "product_floating": false, "unsafe_scenario": false}
 """
         
+        usage = None
         try:
             image_part = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
             
@@ -286,6 +488,7 @@ Output ONLY valid JSON in this exact format:
                     response_mime_type="application/json"
                 )
             )
+            usage = usage_record('audit', self.model_name, token_counts(response))
             
             import json
             audit_result = json.loads(response.text)
@@ -304,16 +507,20 @@ Output ONLY valid JSON in this exact format:
                 'safe': not (audit_result.get('child_present') or audit_result.get('finger_on_trigger') or audit_result.get('unsafe_scenario')),
                 'physics_ok': not audit_result.get('product_floating', False),
                 'issues': issues,
-                'raw': audit_result
+                'raw': audit_result,
+                'usage': usage
             }
             
         except Exception as e:
-            return {'safe': True, 'physics_ok': True, 'issues': [], 'error': f'Audit failed: {e}'}
+            failed = {'safe': True, 'physics_ok': True, 'issues': [], 'error': f'Audit failed: {e}'}
+            if usage:
+                failed['usage'] = usage
+            return failed
 
 
-def create_vision_analyzer(model_name: str = "gemini-2.5-flash") -> VisionAnalyzer:
+def create_vision_analyzer(model_name: str = "gemini-2.5-flash", ghost_cache=None) -> VisionAnalyzer:
     """Factory function to create VisionAnalyzer."""
-    return VisionAnalyzer(model_name)
+    return VisionAnalyzer(model_name, ghost_cache=ghost_cache)
 
 
 if __name__ == "__main__":
@@ -5,10 +5,12 @@ Coordinates all components to generate lifestyle product images
 with governance compliance and semantic validation.
 """
 
+import asyncio
 import os
+import time
 import yaml
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 from datetime import datetime
 
 # Load .env file if present
@@ -28,9 +30,20 @@ load_dotenv()
 from data_layer import ProductDataLayer, load_config
 from governance import GovernanceEngine, load_feedback
 from vision_analysis import VisionAnalyzer
+from ghost_cache import create_ghost_cache
 from prompt_composer import PromptComposer
 from image_generator import ImageGenerator
 from feedback import FeedbackManager
+from write_behind import reconcile_writes
+from pipeline import image_record, iter_batch_pipeline, product_record, run_batch_pipeline
+from batch_journal import BatchJournal, idempotency_key, open_batch_journal
+from async_workflow import abatch_run_workflow, arun_workflow
+from usage import (
+    UsageStats, create_usage_ledger, format_usage_summary, load_pricing, record_usage, summarize_usage
+)
+from timing import (
+    TimingStats, add_span, format_timing_summary, generation_spans, run_stage, summarize_timings, timed
+)
 
 
 class ProductImageryWorkflow:
@@ -57,9 +70,12 @@ class ProductImageryWorkflow:
         # Governance
         self.governance = GovernanceEngine()
         
-        # Vision analyzer
+        # Vision analyzer; ghost images go through the shared local cache
         vision_model = self.config.get('models', {}).get('vision_analysis', 'gemini-2.5-flash')
-        self.vision = VisionAnalyzer(model_name=vision_model)
+        self.vision = VisionAnalyzer(
+            model_name=vision_model,
+            ghost_cache=create_ghost_cache(self.config.get('ghost_cache'))
+        )
         
         # Prompt composer
         self.composer = PromptComposer()
@@ -69,11 +85,20 @@ class ProductImageryWorkflow:
             model_name=self.config.get('models', {}).get('image_generation', 'gemini-2.0-flash-exp'),
             output_base=self.config.get('output', {}).get('base_path', './output'),
             counter_start=self.config.get('output', {}).get('counter_start', 101),
-            counter_max=self.config.get('output', {}).get('counter_max', 110)
+            counter_max=self.config.get('output', {}).get('counter_max', 110),
+            file_store_config=self.config.get('generation', {}).get('file_store'),
+            write_behind_config=self.config.get('output', {}).get('write_behind'),
+            derivatives_config=self.config.get('output', {}).get('derivatives')
         )
         
         # Feedback manager
         self.feedback = FeedbackManager()
+        
+        # Token usage ledger (None when usage.enabled is false)
+        self.usage_ledger = create_usage_ledger(self.config)
+    
+    # Stage order for run() and the pipelined batch_run
+    PIPELINE_STAGES = ('lookup', 'fetch', 'vision', 'compose', 'generate')
     
     def run(
         self, 
@@ -89,92 +114,245 @@ class ProductImageryWorkflow:
             product_id: SKU or cupidName
             skip_vision: Skip ghost image analysis (use product specs only)
             verbose: Print detailed progress
+            defer_flush: (kwarg) Leave image/audit writes pending on the
+                write-behind queue; the caller must flush and reconcile
             
         Returns:
             Result dict with generated image paths and metadata
         """
-        result = {
+        ctx = self._new_context(product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+        for stage in self.PIPELINE_STAGES:
+            if ctx.get('done'):
+                break
+            ctx = run_stage(ctx, stage, getattr(self, f"_stage_{stage}"))
+        return self._finish_context(ctx)
+    
+    def run_iter(
+        self,
+        product_id: str,
+        skip_vision: bool = False,
+        verbose: bool = False,
+        on_stage: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> Iterator[dict]:
+        """
+        Streaming run(): yield a record for each image as soon as it is on
+        disk, then a product summary record.
+        
+        Records are flat dicts (see pipeline.image_record / product_record)
+        with 'type' set to 'image' or 'product'.
+        
+        Args:
+            on_stage: Called with each stage name as the stage starts
+                (progress reporting, e.g. review UI jobs)
+        """
+        ctx = self._new_context(product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+        for stage in self.PIPELINE_STAGES:
+            if ctx.get('done'):
+                break
+            if on_stage:
+                on_stage(stage)
+            if stage != 'generate':
+                ctx = run_stage(ctx, stage, getattr(self, f"_stage_{stage}"))
+                continue
+            
+            start = time.monotonic()
+            for variation, gen_result in enumerate(self._iter_generate(ctx), start=1):
+                self.generator.flush()
+                reconcile_writes(ctx['result'], verbose=verbose)
+                yield image_record(ctx['result'], gen_result, variation)
+            add_span(ctx, 'stage', stage, time.monotonic() - start)
+        
+        yield product_record(self._finish_context(ctx))
+    
+    async def arun(
+        self,
+        product_id: str,
+        skip_vision: bool = False,
+        verbose: bool = False,
+        **kwargs
+    ) -> dict:
+        """
+        Async run(): same stages, with network I/O on httpx and the async
+        Gemini client (see async_workflow.py).
+        
+        Args:
+            http: (kwarg) Shared httpx.AsyncClient for image downloads
+        """
+        return await arun_workflow(self, product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+    
+    def _new_context(
+        self,
+        product_id: str,
+        skip_vision: bool = False,
+        verbose: bool = False,
+        **kwargs
+    ) -> dict:
+        """Create the per-product state passed from stage to stage."""
+        return {
             'product_id': product_id,
-            'success': False,
-            'images': [],
-            'prompts': [],
-            'errors': [],
-            'timestamp': datetime.now().isoformat()
+            'skip_vision': skip_vision,
+            'verbose': verbose,
+            'selected_ghost_urls': kwargs.get('selected_ghost_urls', []),
+            'defer_flush': kwargs.get('defer_flush', False),
+            'done': False,
+            'result': {
+                'product_id': product_id,
+                'success': False,
+                'images': [],
+                'prompts': [],
+                'errors': [],
+                'generations': [],
+                'timings': [],
+                'usage': [],
+                'timestamp': datetime.now().isoformat()
+            }
         }
+    
+    def _finish_context(self, ctx: dict) -> dict:
+        """Finalize and return the result of a processed context."""
+        result = ctx['result']
+        result['success'] = len(result['images']) > 0
+        return result
+    
+    def _stage_lookup(self, ctx: dict) -> dict:
+        """Step 1: Look up the product row and its ghost image URLs."""
+        result = ctx['result']
+        verbose = ctx['verbose']
         
-        # Step 1: Lookup product
         if verbose:
-            print(f"[1/5] Looking up product: {product_id}")
+            print(f"[1/5] Looking up product: {ctx['product_id']}")
         
-        product = self.data.get_product(product_id)
+        product = self.data.get_product(ctx['product_id'])
         if not product:
-            result['errors'].append(f"Product not found: {product_id}")
-            return result
+            result['errors'].append(f"Product not found: {ctx['product_id']}")
+            ctx['done'] = True
+            return ctx
         
-        cupid_name = product.get('cupidName', product_id)
-        tranche = product.get('Tranche', 'Unknown')
         class_desc = product.get('Class Description', '')
-        
-        result['cupid_name'] = cupid_name
-        result['tranche'] = tranche
+        ctx['cupid_name'] = product.get('cupidName', ctx['product_id'])
+        ctx['tranche'] = product.get('Tranche', 'Unknown')
+        ctx['class_desc'] = class_desc
+        ctx['features'] = self.data.get_product_features(product)
+        ctx['ghost_urls'] = self.data.get_ghost_image_urls(product)
+        
+        result['cupid_name'] = ctx['cupid_name']
+        result['tranche'] = ctx['tranche']
         result['product_name'] = product.get('SKU Main Description', '')
         result['class_description'] = class_desc
         
         if verbose:
             print(f"    Found: {result['product_name']}")
-            print(f"    Class: {class_desc}, Tranche: {tranche}")
-        
-        # Step 2: Get product features and analyze ghost images
-        selected_urls = kwargs.get('selected_ghost_urls', [])
-        if verbose:
+            print(f"    Class: {class_desc}, Tranche: {ctx['tranche']}")
+        return ctx
+    
+    def _stage_fetch(self, ctx: dict) -> dict:
+        """Step 2a: Download the ghost images used for analysis and as references."""
+        for url in self._fetch_plan(ctx):
+            ctx['images'][url] = self.vision.fetch_image(url)
+        return ctx
+    
+    async def _astage_fetch(self, ctx: dict) -> dict:
+        """Async _stage_fetch(): downloads run concurrently."""
+        urls = self._fetch_plan(ctx)
+        images = await asyncio.gather(*(self.vision.afetch_image(url, ctx.get('http')) for url in urls))
+        ctx['images'].update(zip(urls, images))
+        return ctx
+    
+    def _fetch_plan(self, ctx: dict) -> list[str]:
+        """Choose reference URLs and return every URL the fetch stage must download."""
+        ghost_urls = ctx['ghost_urls']
+        selected_urls = ctx['selected_ghost_urls']
+        ctx['images'] = {}
+        ctx['reference_urls'] = []
+        
+        if ctx['verbose']:
             print(f"    Selected Context Config: {len(selected_urls) if selected_urls else 'Default (First 2)'} images")
             print(f"[2/5] Analyzing product features and ghost images")
         
-        features = self.data.get_product_features(product)
-        ghost_urls = self.data.get_ghost_image_urls(product)
+        if not ghost_urls or ctx['skip_vision']:
+            return []
         
-        visible_features = {'visible_features': [], 'unverified_features': []}
-        reference_images = []
+        # Reference images: selected ones, or the default first 2
+        if selected_urls and isinstance(selected_urls, list) and len(selected_urls) > 0:
+            ctx['reference_urls'] = [url for url in selected_urls if url in ghost_urls]  # Simple validation
+        else:
+            ctx['reference_urls'] = ghost_urls[:2]
         
-        if ghost_urls and not skip_vision:
+        # Vision analyzes the first 2 ghost images
+        return list(dict.fromkeys(ghost_urls[:2] + ctx['reference_urls']))
+    
+    def _stage_vision(self, ctx: dict) -> dict:
+        """Step 2b: Extract visible features from the fetched ghost images."""
+        visible_features = None
+        if ctx['ghost_urls'] and not ctx['skip_vision']:
             # Analyze all ghost images for robust feature extraction
             visible_features = self.vision.analyze_ghost_images(
-                image_urls=ghost_urls,
-                product_specs=features
+                image_urls=ctx['ghost_urls'],
+                product_specs=ctx['features'],
+                prefetched=ctx['images']
             )
-            
-            # Fetch reference images for generation context
-            if selected_urls and isinstance(selected_urls, list) and len(selected_urls) > 0:
-                 if verbose: print(f"    Using {len(selected_urls)} selected images for context.")
-                 for url in selected_urls:
-                     if url in ghost_urls: # Simple validation
-                         img_bytes = self.vision.fetch_image(url)
-                         if img_bytes:
-                             reference_images.append(img_bytes)
-            else:
-                # Default behavior: use up to 2
-                for url in ghost_urls[:2]:
-                    img_bytes = self.vision.fetch_image(url)
-                    if img_bytes:
-                        reference_images.append(img_bytes)
+        return self._apply_vision(ctx, visible_features)
+    
+    async def _astage_vision(self, ctx: dict) -> dict:
+        """Async _stage_vision() on the async Gemini client."""
+        visible_features = None
+        if ctx['ghost_urls'] and not ctx['skip_vision']:
+            visible_features = await self.vision.aanalyze_ghost_images(
+                image_urls=ctx['ghost_urls'],
+                product_specs=ctx['features'],
+                prefetched=ctx['images'],
+                http=ctx.get('http')
+            )
+        return self._apply_vision(ctx, visible_features)
+    
+    def _apply_vision(self, ctx: dict, visible_features: Optional[dict]) -> dict:
+        """Record vision results and pick reference images (None = vision skipped)."""
+        verbose = ctx['verbose']
+        reference_images = []
+        
+        if visible_features is not None:
+            # Reference images for generation context
+            if verbose and ctx['selected_ghost_urls']:
+                print(f"    Using {len(ctx['selected_ghost_urls'])} selected images for context.")
+            for url in ctx['reference_urls']:
+                img_bytes = ctx['images'].get(url)
+                if img_bytes:
+                    reference_images.append(img_bytes)
             
             if verbose:
-                print(f"    Analyzed {len(ghost_urls)} ghost images")
+                print(f"    Analyzed {len(ctx['ghost_urls'])} ghost images")
                 print(f"    Using {len(reference_images)} images as context for generation")
                 print(f"    Visible features: {len(visible_features.get('visible_features', []))}")
         else:
+            visible_features = {'visible_features': [], 'unverified_features': []}
             if verbose:
                 print(f"    Skipping vision analysis (no images or skip_vision=True)")
         
+        record_usage(self.usage_ledger, ctx, visible_features.pop('usage', []))
+        ctx['visible_features'] = visible_features
+        ctx['reference_images'] = reference_images
+        # Raw downloads are no longer needed; keep queued contexts small
+        ctx['images'] = {}
+        return ctx
+    
+    def _stage_compose(self, ctx: dict) -> dict:
+        """Steps 3-4: Compile governance constraints and compose prompts."""
+        verbose = ctx['verbose']
+        class_desc = ctx['class_desc']
+        
         # Step 3: Compile governance constraints with semantic context
         if verbose:
             print(f"[3/5] Compiling governance constraints")
         
-        feedback_data = self.feedback.get_refinements()
-        constraints = self.governance.compile_constraints(class_desc, feedback_data)
+        # Shared per-class compile; product additions are layered on top
+        with timed(ctx, 'governance'):
+            constraints = self.governance.get_constraints(
+                class_desc, self.feedback.get_refinements(), feedback_version=self.feedback.version
+            )
         
         # Add semantic context based on product specifications
-        constraints = self._enhance_with_semantic_context(constraints, features)
+        constraints = self._enhance_with_semantic_context(constraints, ctx['features'])
         
         if verbose:
             print(f"    Negative prompts: {len(constraints['negative_prompts'])}")
@@ -189,25 +367,74 @@ class ProductImageryWorkflow:
             'lifestyle_2': self.governance.get_scene_template(class_desc, 2),
         }
         
-        prompts = self.composer.compose_batch_prompts(
-            product=features,
-            visible_features=visible_features,
-            governance=constraints,
-            scene_templates=scene_templates
-        )
+        with timed(ctx, 'prompts'):
+            prompts = self.composer.compose_batch_prompts(
+                product=ctx['features'],
+                visible_features=ctx['visible_features'],
+                governance=constraints,
+                scene_templates=scene_templates
+            )
         
-        result['prompts'] = prompts
+        ctx['constraints'] = constraints
+        ctx['scene_templates'] = scene_templates
+        ctx['result']['prompts'] = prompts
         
         if verbose:
             for i, p in enumerate(prompts):
                 print(f"    Variation {i+1}: {p['positive_prompt'][:80]}...")
+        return ctx
+    
+    def _stage_generate(self, ctx: dict) -> dict:
+        """Step 5: Generate and save images for each prompt variation."""
+        for _ in self._iter_generate(ctx):
+            pass
+        
+        # Wait for this product's writes unless a batch flushes at the end
+        if not ctx['defer_flush']:
+            self.generator.flush()
+            reconcile_writes(ctx['result'], verbose=ctx['verbose'])
+        return ctx
+    
+    def _iter_generate(self, ctx: dict) -> Iterator[dict]:
+        """Generate the variations one by one, yielding each generate_and_save() result."""
+        journal = ctx.get('journal')
+        if journal and journal.resumed:
+            self.generator.reclaim_stale_counters(ctx['tranche'], ctx['cupid_name'])
+        
+        for request in self._generation_requests(ctx):
+            # Resumed batch: reuse a variation already saved under its key
+            gen_result = journal.replay_variation(ctx['product_id'], request, self.generator.output_base) if journal else None
+            if gen_result is None:
+                gen_result = self.generator.generate_and_save(**request)
+                if journal:
+                    journal.record_variation(ctx['product_id'], request, gen_result)
+            self._record_generation(ctx, gen_result)
+            yield gen_result
+        
+        # Generation is done with the reference bytes
+        ctx['reference_images'] = []
+    
+    async def _astage_generate(self, ctx: dict) -> dict:
+        """Async _stage_generate(): the variations generate concurrently."""
+        requests = self._generation_requests(ctx)
+        gen_results = await asyncio.gather(
+            *(self.generator.agenerate_and_save(**request) for request in requests)
+        )
+        for gen_result in gen_results:
+            self._record_generation(ctx, gen_result)
         
-        # Step 5: Generate images
-        if verbose:
-            print(f"[5/5] Generating images")
+        ctx['reference_images'] = []
         
-        # Step 5: Generate images
-        if verbose:
+        if not ctx['defer_flush']:
+            await asyncio.to_thread(self.generator.flush)
+            reconcile_writes(ctx['result'], verbose=ctx['verbose'])
+        return ctx
+    
+    def _generation_requests(self, ctx: dict) -> list[dict]:
+        """generate_and_save() arguments for each prompt variation."""
+        visible_features = ctx['visible_features']
+        
+        if ctx['verbose']:
             print(f"[5/5] Generating images")
         
         # Prepare trace metadata for audit logs
@@ -215,44 +442,58 @@ class ProductImageryWorkflow:
             "vision_analysis": {
                 "visible_features": visible_features.get('visible_features', []),
                 "unverified_features": visible_features.get('unverified_features', []),
-                "reference_images_count": len(reference_images)
+                "reference_images_count": len(ctx['reference_images'])
             },
             "governance": {
-                "constraints": constraints,
-                "scene_templates": scene_templates
+                "constraints": ctx['constraints'],
+                "scene_templates": ctx['scene_templates']
             },
             "product_context": {
-                "cupid_name": cupid_name,
-                "tranche": tranche,
-                "class_description": class_desc
-            }
+                "cupid_name": ctx['cupid_name'],
+                "tranche": ctx['tranche'],
+                "class_description": ctx['class_desc']
+            },
+            # Stage spans so far; the generator adds the generation call
+            "timings": list(ctx['result']['timings']),
+            "usage": list(ctx['result']['usage'])
         }
-
-        for prompt_data in prompts:
+        
+        requests = []
+        for index, prompt_data in enumerate(ctx['result']['prompts']):
             # Clone metadata for each generation to avoid mutation issues
             current_metadata = trace_metadata.copy()
             current_metadata['prompt_variation'] = prompt_data # Include specific prompt details
+            if ctx.get('batch_id'):
+                current_metadata['idempotency_key'] = idempotency_key(
+                    ctx['batch_id'], ctx['cupid_name'], index,
+                    prompt_data['positive_prompt'], prompt_data['negative_prompt']
+                )
             
-            gen_result = self.generator.generate_and_save(
-                prompt=prompt_data['positive_prompt'],
-                negative_prompt=prompt_data['negative_prompt'],
-                tranche=tranche,
-                cupid_name=cupid_name,
-                reference_images=reference_images,
-                metadata=current_metadata # Pass full trace
-            )
-            
-            if gen_result['success']:
-                result['images'].append(gen_result['path'])
-                if verbose:
-                    print(f"    ✓ Saved: {gen_result['path']}")
-            else:
-                result['errors'].append(gen_result.get('error', 'Unknown error'))
-                if verbose:
-                    print(f"    ✗ Failed: {gen_result.get('error')}")
-        
-        result['success'] = len(result['images']) > 0
-        return result
+            requests.append({
+                'prompt': prompt_data['positive_prompt'],
+                'negative_prompt': prompt_data['negative_prompt'],
+                'tranche': ctx['tranche'],
+                'cupid_name': ctx['cupid_name'],
+                'reference_images': ctx['reference_images'],
+                'metadata': current_metadata # Pass full trace
+            })
+        return requests
+    
+    def _record_generation(self, ctx: dict, gen_result: dict) -> None:
+        """Add one generate_and_save() result to the product result."""
+        result = ctx['result']
+        result['generations'].append(gen_result)
+        result['timings'].extend(generation_spans(gen_result))
+        record_usage(self.usage_ledger, ctx, [gen_result.get('usage')], image=gen_result.get('path'))
+        
+        if gen_result['success']:
+            result['images'].append(gen_result['path'])
+            if ctx['verbose']:
+                print(f"    ✓ Saved: {gen_result['path']}")
+        else:
+            result['errors'].append(gen_result.get('error', 'Unknown error'))
+            if ctx['verbose']:
+                print(f"    ✗ Failed: {gen_result.get('error')}")
     
     def _enhance_with_semantic_context(
         self, 
@@ -276,7 +517,10 @@ class ProductImageryWorkflow:
             "entire product visible in frame",
             "no part of product hidden or concealed",
         ]
-        constraints['required_elements'].extend(visibility_requirements)
+        # Layer onto the shared class snapshot: shallow copy, new tuple for
+        # the one list that grows
+        constraints = dict(constraints)
+        constraints['required_elements'] = tuple(constraints['required_elements']) + tuple(visibility_requirements)
         
         # Determine SCENE context (what's AROUND the visible product)
         product_type = specs.get('Product Type', '').lower()
@@ -316,18 +560,27 @@ class ProductImageryWorkflow:
         self,
         product_ids: list[str],
         verbose: bool = False,
-        stop_on_error: bool = False
+        stop_on_error: bool = False,
+        resume_batch_id: Optional[str] = None
     ) -> dict:
         """
         Run workflow for multiple products.
         
+        Products move through the stages as a pipeline (see pipeline.py),
+        so fetching and vision analysis for the next products overlap
+        image generation for the current one.
+        
         Args:
             product_ids: List of SKUs or cupidNames
             verbose: Print progress
-            stop_on_error: Stop if any product fails
+            stop_on_error: Stop feeding new products after a failure
+            resume_batch_id: Resume a journaled batch (product_ids is then
+                taken from the journal); finished products are skipped and
+                saved variations are not generated again
             
         Returns:
-            Batch result with summary and individual results
+            Batch result with summary, individual results and per-stage
+            pipeline metrics
         """
         batch_result = {
             'total': len(product_ids),
@@ -337,26 +590,181 @@ class ProductImageryWorkflow:
             'timestamp': datetime.now().isoformat()
         }
         
-        for i, product_id in enumerate(product_ids):
-            if verbose:
-                print(f"\n{'='*60}")
-                print(f"Processing {i+1}/{len(product_ids)}: {product_id}")
-                print('='*60)
-            
-            result = self.run(product_id, verbose=verbose)
-            batch_result['results'].append(result)
-            
+        journal, product_ids, finished = self._open_batch(product_ids, resume_batch_id)
+        if journal:
+            batch_result['total'] = len(product_ids)
+            batch_result['batch_id'] = journal.batch_id
+        pending_ids = [pid for pid in product_ids if pid not in finished]
+        
+        if verbose:
+            if journal:
+                print(f"Batch ID: {journal.batch_id} (resume with --resume {journal.batch_id})")
+            print(f"Processing {len(pending_ids)} products (pipelined), {len(finished)} already finished")
+        
+        # Writes overlap the next product; flushed once at batch end
+        results, metrics = run_batch_pipeline(
+            self,
+            pending_ids,
+            verbose=verbose,
+            stop_on_error=stop_on_error,
+            config=self.config.get('workflow', {}).get('pipeline'),
+            journal=journal
+        )
+        # Input order, with products finished by an earlier attempt in place
+        by_id = {r['product_id']: r for r in results}
+        batch_result['results'] = [
+            finished.get(pid) or by_id[pid] for pid in product_ids if pid in finished or pid in by_id
+        ]
+        batch_result['pipeline'] = metrics
+        batch_result['timing'] = summarize_timings(results)
+        batch_result['usage'] = summarize_usage(results, load_pricing(self.config))
+        if verbose:
+            print(format_timing_summary(batch_result['timing']))
+            print(format_usage_summary(batch_result['usage']))
+        
+        # Flush barrier: all images and audit logs on disk before returning
+        self.generator.flush()
+        for result in batch_result['results']:
+            reconcile_writes(result, verbose=verbose)
             if result['success']:
                 batch_result['success'] += 1
             else:
                 batch_result['failed'] += 1
-                if stop_on_error:
-                    if verbose:
-                        print(f"Stopping due to error: {result['errors']}")
-                    break
         
+        if journal:
+            journal.record_end(batch_result)
         return batch_result
     
+    def iter_batch(
+        self,
+        product_ids: list[str],
+        verbose: bool = False,
+        stop_on_error: bool = False,
+        resume_batch_id: Optional[str] = None
+    ) -> Iterator[dict]:
+        """
+        Streaming batch_run(): products run through the same pipeline, but
+        results are yielded as each product finishes instead of collected.
+        
+        For every finished product its writes are flushed, then one 'image'
+        record per variation and one 'product' record are yielded (see
+        run_iter()). Products already finished in a resumed batch yield only
+        their product record. The final record has 'type' 'batch' and the
+        summary counters plus pipeline metrics.
+        
+        Args:
+            product_ids: List of SKUs or cupidNames
+            verbose: Print progress
+            stop_on_error: Stop feeding new products after a failure
+            resume_batch_id: Resume a journaled batch (see batch_run())
+        """
+        summary = {
+            'type': 'batch',
+            'total': len(product_ids),
+            'success': 0,
+            'failed': 0,
+            'images': 0,
+            'image_failures': 0,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        journal, product_ids, finished = self._open_batch(product_ids, resume_batch_id)
+        if journal:
+            summary['total'] = len(product_ids)
+            summary['batch_id'] = journal.batch_id
+        
+        for result in finished.values():
+            summary['success'] += 1
+            yield product_record(result)
+        
+        timing_stats = TimingStats()
+        usage_stats = UsageStats(load_pricing(self.config))
+        stream = iter_batch_pipeline(
+            self,
+            [pid for pid in product_ids if pid not in finished],
+            verbose=verbose,
+            stop_on_error=stop_on_error,
+            config=self.config.get('workflow', {}).get('pipeline'),
+            journal=journal
+        )
+        while True:
+            try:
+                result = next(stream)
+            except StopIteration as stop:
+                summary['pipeline'] = stop.value
+                break
+            timing_stats.add_result(result)
+            usage_stats.add_result(result)
+            
+            # The product's images are on disk before anything is reported
+            self.generator.flush()
+            reconcile_writes(result, verbose=verbose)
+            
+            for variation, gen_result in enumerate(result['generations'], start=1):
+                record = image_record(result, gen_result, variation)
+                summary['images' if record['success'] else 'image_failures'] += 1
+                yield record
+            summary['success' if result['success'] else 'failed'] += 1
+            yield product_record(result)
+        
+        summary['timing'] = timing_stats.summary()
+        summary['usage'] = usage_stats.summary()
+        if verbose:
+            print(format_timing_summary(summary['timing']))
+            print(format_usage_summary(summary['usage']))
+        if journal:
+            journal.record_end(summary)
+        yield summary
+    
+    def _open_batch(
+        self,
+        product_ids: list[str],
+        resume_batch_id: Optional[str] = None
+    ) -> tuple[Optional[BatchJournal], list[str], dict[str, dict]]:
+        """
+        Start or resume the batch journal.
+        
+        Returns:
+            Tuple of (journal or None, product IDs, results of products an
+            earlier attempt already finished keyed by product ID)
+        """
+        journal = open_batch_journal(
+            product_ids,
+            resume_batch_id=resume_batch_id,
+            config=self.config.get('workflow', {}).get('journal'),
+            engine='v1'
+        )
+        finished = {}
+        if journal:
+            product_ids = journal.product_ids
+            for product_id in product_ids:
+                recorded = journal.finished_result(product_id)
+                if recorded:
+                    finished[product_id] = {'product_id': product_id, 'resumed': True, **recorded}
+        return journal, product_ids, finished
+    
+    async def abatch_run(
+        self,
+        product_ids: list[str],
+        verbose: bool = False,
+        stop_on_error: bool = False,
+        max_concurrency: Optional[int] = None
+    ) -> dict:
+        """
+        Async batch_run(): up to max_concurrency products in flight.
+        
+        Cancelling the calling task cancels every in-flight product.
+        
+        Returns:
+            Batch result with summary and individual results
+        """
+        if max_concurrency is None:
+            max_concurrency = self.config.get('workflow', {}).get('async_batch', {}).get('max_concurrency', 8)
+        return await abatch_run_workflow(
+            self, product_ids, max_concurrency=max_concurrency,
+            verbose=verbose, stop_on_error=stop_on_error
+        )
+    
     def run_by_tranche(
         self,
         tranche: str,
@@ -5,12 +5,18 @@ Enhanced workflow with:
 - V2 Image Generator (System Instructions)
 - V2 Prompt Composer (DoP language, Identity Locking)
 - Post-generation safety audit
+- Draft-then-finalize resolution mode
 """
 
+import asyncio
+import hashlib
+import json
 import os
+import random
+import time
 import yaml
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 from datetime import datetime
 
 # Load .env file if present
@@ -30,9 +36,21 @@ load_dotenv()
 from data_layer import ProductDataLayer, load_config
 from governance import GovernanceEngine
 from vision_analysis import VisionAnalyzer
+from ghost_cache import create_ghost_cache
 from prompt_composer_v2 import PromptComposerV2
-from image_generator_v2 import ImageGeneratorV2
+from image_generator_v2 import create_image_generator_v2
 from feedback import FeedbackManager
+from render_queue import product_render_logs
+from write_behind import atomic_write_json, reconcile_writes
+from pipeline import image_record, iter_batch_pipeline, product_record, run_batch_pipeline
+from batch_journal import BatchJournal, idempotency_key, open_batch_journal
+from async_workflow import abatch_run_workflow, arun_workflow
+from usage import (
+    UsageStats, create_usage_ledger, format_usage_summary, load_pricing, record_usage, summarize_usage
+)
+from timing import (
+    TimingStats, add_span, format_timing_summary, generation_spans, run_stage, summarize_timings, timed
+)
 
 
 class ProductImageryWorkflowV2:
@@ -62,30 +80,38 @@ class ProductImageryWorkflowV2:
         # Governance (same as V1)
         self.governance = GovernanceEngine()
         
-        # Vision analyzer (same as V1)
+        # Vision analyzer (same as V1); ghost images go through the shared local cache
         vision_model = self.config.get('models', {}).get('vision_analysis', 'gemini-2.5-flash')
-        self.vision = VisionAnalyzer(model_name=vision_model)
+        self.vision = VisionAnalyzer(
+            model_name=vision_model,
+            ghost_cache=create_ghost_cache(self.config.get('ghost_cache'))
+        )
         
         # V2 Prompt Composer
         self.composer = PromptComposerV2()
         
         # V2 Image Generator
         v2_config = self.config.get('generation', {}).get('v2', {})
-        self.generator = ImageGeneratorV2(
-            model_name=self.config.get('models', {}).get('image_generation', 'gemini-3-pro-image-preview'),
-            output_base=self.config.get('output', {}).get('base_path', './output'),
-            aspect_ratio=v2_config.get('aspect_ratio', '1:1'),
-            image_size=v2_config.get('image_size', '1K'),
-            counter_start=self.config.get('output', {}).get('counter_start', 101),
-            counter_max=self.config.get('output', {}).get('counter_max', 110),
-            safety_constitution_path=v2_config.get('system_instruction_file', 'safety_constitution.yaml')
-        )
+        self.generator = create_image_generator_v2(self.config)
         
         # Feedback manager (same as V1)
         self.feedback = FeedbackManager()
         
+        # Token usage ledger (None when usage.enabled is false)
+        self.usage_ledger = create_usage_ledger(self.config)
+        
         # Post-generation audit setting
         self.post_audit_enabled = v2_config.get('post_generation_audit', False)
+        
+        # Draft-then-finalize: drafts render small for review, approval
+        # re-renders at the target size
+        draft_config = v2_config.get('draft_mode', {})
+        self.draft_mode = draft_config.get('enabled', False)
+        self.draft_size = draft_config.get('draft_size', '1K')
+        self.final_size = draft_config.get('final_size', v2_config.get('image_size', '1K'))
+    
+    # Stage order for run() and the pipelined batch_run
+    PIPELINE_STAGES = ('lookup', 'fetch', 'vision', 'compose', 'generate', 'audit')
     
     def run(
         self, 
@@ -101,81 +127,231 @@ class ProductImageryWorkflowV2:
             product_id: SKU or cupidName
             skip_vision: Skip ghost image analysis
             verbose: Print detailed progress
+            defer_flush: (kwarg) Leave image/audit writes pending on the
+                write-behind queue; the caller must flush and reconcile
             
         Returns:
             Result dict with generated image paths and metadata
         """
-        result = {
+        ctx = self._new_context(product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+        for stage in self.PIPELINE_STAGES:
+            if ctx.get('done'):
+                break
+            ctx = run_stage(ctx, stage, getattr(self, f"_stage_{stage}"))
+        return self._finish_context(ctx)
+    
+    def run_iter(
+        self,
+        product_id: str,
+        skip_vision: bool = False,
+        verbose: bool = False,
+        on_stage: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> Iterator[dict]:
+        """
+        Streaming run(): yield a record for each image as soon as it is on
+        disk, then a product summary record after the audit (same as V1).
+        """
+        ctx = self._new_context(product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+        for stage in self.PIPELINE_STAGES:
+            if ctx.get('done'):
+                break
+            if on_stage:
+                on_stage(stage)
+            if stage != 'generate':
+                ctx = run_stage(ctx, stage, getattr(self, f"_stage_{stage}"))
+                continue
+            
+            start = time.monotonic()
+            for variation, gen_result in enumerate(self._iter_generate(ctx), start=1):
+                self.generator.flush()
+                reconcile_writes(ctx['result'], verbose=verbose)
+                yield image_record(ctx['result'], gen_result, variation)
+            add_span(ctx, 'stage', stage, time.monotonic() - start)
+        
+        yield product_record(self._finish_context(ctx))
+    
+    async def arun(
+        self,
+        product_id: str,
+        skip_vision: bool = False,
+        verbose: bool = False,
+        **kwargs
+    ) -> dict:
+        """
+        Async run(): same stages, with network I/O on httpx and the async
+        Gemini client (same as V1).
+        """
+        return await arun_workflow(self, product_id, skip_vision=skip_vision, verbose=verbose, **kwargs)
+    
+    def _new_context(
+        self,
+        product_id: str,
+        skip_vision: bool = False,
+        verbose: bool = False,
+        **kwargs
+    ) -> dict:
+        """Create the per-product state passed from stage to stage."""
+        return {
             'product_id': product_id,
-            'success': False,
-            'images': [],
-            'prompts': [],
-            'errors': [],
-            'engine_version': self.engine_version,
-            'timestamp': datetime.now().isoformat()
+            'skip_vision': skip_vision,
+            'verbose': verbose,
+            'selected_ghost_urls': kwargs.get('selected_ghost_urls', []),
+            'defer_flush': kwargs.get('defer_flush', False),
+            'done': False,
+            'result': {
+                'product_id': product_id,
+                'success': False,
+                'images': [],
+                'prompts': [],
+                'errors': [],
+                'generations': [],
+                'timings': [],
+                'usage': [],
+                'engine_version': self.engine_version,
+                'cached_tokens': 0,
+                'timestamp': datetime.now().isoformat()
+            }
         }
+    
+    def _finish_context(self, ctx: dict) -> dict:
+        """Finalize and return the result of a processed context."""
+        result = ctx['result']
+        result['success'] = len(result['images']) > 0
+        return result
+    
+    def _stage_lookup(self, ctx: dict) -> dict:
+        """Step 1: Look up the product row and its ghost image URLs."""
+        result = ctx['result']
+        verbose = ctx['verbose']
         
-        # Step 1: Lookup product
         if verbose:
-            print(f"[V2][1/6] Looking up product: {product_id}")
+            print(f"[V2][1/6] Looking up product: {ctx['product_id']}")
         
-        product = self.data.get_product(product_id)
+        product = self.data.get_product(ctx['product_id'])
         if not product:
-            result['errors'].append(f"Product not found: {product_id}")
-            return result
+            result['errors'].append(f"Product not found: {ctx['product_id']}")
+            ctx['done'] = True
+            return ctx
         
-        cupid_name = product.get('cupidName', product_id)
-        tranche = product.get('Tranche', 'Unknown')
         class_desc = product.get('Class Description', '')
+        ctx['cupid_name'] = product.get('cupidName', ctx['product_id'])
+        ctx['tranche'] = product.get('Tranche', 'Unknown')
+        ctx['class_desc'] = class_desc
+        ctx['features'] = self.data.get_product_features(product)
+        ctx['ghost_urls'] = self.data.get_ghost_image_urls(product)
         
-        result['cupid_name'] = cupid_name
-        result['tranche'] = tranche
+        result['cupid_name'] = ctx['cupid_name']
+        result['tranche'] = ctx['tranche']
         result['product_name'] = product.get('SKU Main Description', '')
         result['class_description'] = class_desc
         
         if verbose:
             print(f"    Found: {result['product_name']}")
-            print(f"    Class: {class_desc}, Tranche: {tranche}")
+            print(f"    Class: {class_desc}, Tranche: {ctx['tranche']}")
+        return ctx
+    
+    def _stage_fetch(self, ctx: dict) -> dict:
+        """Step 2a: Download the ghost images used for analysis and as references."""
+        for url in self._fetch_plan(ctx):
+            ctx['images'][url] = self.vision.fetch_image(url)
+        return ctx
+    
+    async def _astage_fetch(self, ctx: dict) -> dict:
+        """Async _stage_fetch(): downloads run concurrently."""
+        urls = self._fetch_plan(ctx)
+        images = await asyncio.gather(*(self.vision.afetch_image(url, ctx.get('http')) for url in urls))
+        ctx['images'].update(zip(urls, images))
+        return ctx
+    
+    def _fetch_plan(self, ctx: dict) -> list[str]:
+        """Choose reference URLs and return every URL the fetch stage must download."""
+        ghost_urls = ctx['ghost_urls']
+        selected_urls = ctx['selected_ghost_urls']
+        ctx['images'] = {}
+        ctx['reference_urls'] = []
         
-        # Step 2: Get product features and analyze ghost images
-        selected_urls = kwargs.get('selected_ghost_urls', [])
-        if verbose:
+        if ctx['verbose']:
             print(f"[V2][2/6] Analyzing product features (up to 14 images supported)")
         
-        features = self.data.get_product_features(product)
-        ghost_urls = self.data.get_ghost_image_urls(product)
+        if not ghost_urls or ctx['skip_vision']:
+            return []
         
-        visible_features = {'visible_features': [], 'unverified_features': []}
-        reference_images = []
+        # V2: Support up to 14 reference images
+        urls_to_fetch = selected_urls if (selected_urls and len(selected_urls) > 0) else ghost_urls[:5]
+        ctx['reference_urls'] = [url for url in urls_to_fetch[:14] if url in ghost_urls]
         
-        if ghost_urls and not skip_vision:
+        # Vision analyzes the first 2 ghost images
+        return list(dict.fromkeys(ghost_urls[:2] + ctx['reference_urls']))
+    
+    def _stage_vision(self, ctx: dict) -> dict:
+        """Step 2b: Extract visible features from the fetched ghost images."""
+        visible_features = None
+        if ctx['ghost_urls'] and not ctx['skip_vision']:
             visible_features = self.vision.analyze_ghost_images(
-                image_urls=ghost_urls,
-                product_specs=features
+                image_urls=ctx['ghost_urls'],
+                product_specs=ctx['features'],
+                prefetched=ctx['images']
             )
-            
-            # V2: Support up to 14 reference images
-            urls_to_fetch = selected_urls if (selected_urls and len(selected_urls) > 0) else ghost_urls[:5]
-            
-            for url in urls_to_fetch[:14]:
-                if url in ghost_urls:
-                    img_bytes = self.vision.fetch_image(url)
-                    if img_bytes:
-                        reference_images.append(img_bytes)
+        return self._apply_vision(ctx, visible_features)
+    
+    async def _astage_vision(self, ctx: dict) -> dict:
+        """Async _stage_vision() on the async Gemini client."""
+        visible_features = None
+        if ctx['ghost_urls'] and not ctx['skip_vision']:
+            visible_features = await self.vision.aanalyze_ghost_images(
+                image_urls=ctx['ghost_urls'],
+                product_specs=ctx['features'],
+                prefetched=ctx['images'],
+                http=ctx.get('http')
+            )
+        return self._apply_vision(ctx, visible_features)
+    
+    def _apply_vision(self, ctx: dict, visible_features: Optional[dict]) -> dict:
+        """Record vision results and pick reference images (None = vision skipped)."""
+        verbose = ctx['verbose']
+        reference_images = []
+        reference_urls = []
+        
+        if visible_features is not None:
+            for url in ctx['reference_urls']:
+                img_bytes = ctx['images'].get(url)
+                if img_bytes:
+                    reference_images.append(img_bytes)
+                    reference_urls.append(url)
             
             if verbose:
-                print(f"    Analyzed {len(ghost_urls)} ghost images")
+                print(f"    Analyzed {len(ctx['ghost_urls'])} ghost images")
                 print(f"    Using {len(reference_images)} images for Identity Locking")
                 print(f"    Visible features: {len(visible_features.get('visible_features', []))}")
                 print(f"    Unverified features: {len(visible_features.get('unverified_features', []))}")
+        else:
+            visible_features = {'visible_features': [], 'unverified_features': []}
+        
+        record_usage(self.usage_ledger, ctx, visible_features.pop('usage', []))
+        ctx['visible_features'] = visible_features
+        ctx['reference_images'] = reference_images
+        ctx['reference_urls'] = reference_urls
+        # Raw downloads are no longer needed; keep queued contexts small
+        ctx['images'] = {}
+        return ctx
+    
+    def _stage_compose(self, ctx: dict) -> dict:
+        """Steps 3-4: Compile governance constraints and compose V2 prompts."""
+        result = ctx['result']
+        verbose = ctx['verbose']
+        class_desc = ctx['class_desc']
         
         # Step 3: Compile governance constraints
         if verbose:
             print(f"[V2][3/6] Compiling governance constraints")
         
-        feedback_data = self.feedback.get_refinements()
-        constraints = self.governance.compile_constraints(class_desc, feedback_data)
-        constraints = self._enhance_with_semantic_context(constraints, features)
+        # Shared per-class compile; product additions are layered on top
+        with timed(ctx, 'governance'):
+            constraints = self.governance.get_constraints(
+                class_desc, self.feedback.get_refinements(), feedback_version=self.feedback.version
+            )
+        constraints = self._enhance_with_semantic_context(constraints, ctx['features'])
         
         if verbose:
             print(f"    Negative prompts: {len(constraints['negative_prompts'])}")
@@ -192,12 +368,12 @@ class ProductImageryWorkflowV2:
             error_msg = f"CLASS MAPPING MISSING: '{class_desc}' is not defined in governance_rules.yaml. Please add this class to the class_mapping section."
             result['errors'].append(error_msg)
             result['class_mapping_missing'] = True
+            ctx['done'] = True
             if verbose:
                 print(f"    ⚠️  ERROR: {error_msg}")
-            return result
+            return ctx
         
         # DIVERSITY FIX: Pre-select TWO DIFFERENT templates to guarantee variety
-        import random
         if len(all_options) >= 2:
             selected_templates = random.sample(all_options, 2)
             template_1 = selected_templates[0]
@@ -218,17 +394,62 @@ class ProductImageryWorkflowV2:
             'lifestyle_2': template_2,  # Different pre-selected template
         }
         
-        prompts = self.composer.compose_batch_prompts(
-            product=features,
-            visible_features=visible_features,
-            governance=constraints,
-            scene_templates=scene_templates
-        )
+        with timed(ctx, 'prompts'):
+            prompts = self.composer.compose_batch_prompts(
+                product=ctx['features'],
+                visible_features=ctx['visible_features'],
+                governance=constraints,
+                scene_templates=scene_templates
+            )
         
+        ctx['constraints'] = constraints
+        ctx['scene_templates'] = scene_templates
         result['prompts'] = prompts
+        return ctx
+    
+    def _stage_generate(self, ctx: dict) -> dict:
+        """Step 5: Generate and save images with the V2 generator."""
+        for _ in self._iter_generate(ctx):
+            pass
+        return ctx
+    
+    def _iter_generate(self, ctx: dict) -> Iterator[dict]:
+        """Generate the variations one by one, yielding each result (same as V1)."""
+        journal = ctx.get('journal')
+        if journal and journal.resumed:
+            self.generator.reclaim_stale_counters(ctx['tranche'], ctx['cupid_name'])
         
-        # Step 5: Generate images with V2 generator
-        if verbose:
+        for request in self._generation_requests(ctx):
+            # Resumed batch: reuse a variation already saved under its key
+            gen_result = journal.replay_variation(ctx['product_id'], request, self.generator.output_base) if journal else None
+            if gen_result is None:
+                gen_result = self.generator.generate_and_save(**request)
+                if journal:
+                    journal.record_variation(ctx['product_id'], request, gen_result)
+            self._record_generation(ctx, gen_result)
+            yield gen_result
+        
+        # Generation is done with the reference bytes
+        ctx['reference_images'] = []
+    
+    async def _astage_generate(self, ctx: dict) -> dict:
+        """Async _stage_generate(): the variations generate concurrently."""
+        requests = self._generation_requests(ctx)
+        gen_results = await asyncio.gather(
+            *(self.generator.agenerate_and_save(**request) for request in requests)
+        )
+        for gen_result in gen_results:
+            self._record_generation(ctx, gen_result)
+        
+        ctx['reference_images'] = []
+        return ctx
+    
+    def _generation_requests(self, ctx: dict) -> list[dict]:
+        """generate_and_save() arguments for each prompt variation."""
+        visible_features = ctx['visible_features']
+        reference_images = ctx['reference_images']
+        
+        if ctx['verbose']:
             print(f"[V2][5/6] Generating images (System Instructions enabled)")
         
         # Prepare trace metadata
@@ -239,40 +460,81 @@ class ProductImageryWorkflowV2:
                 "reference_images_count": len(reference_images)
             },
             "governance": {
-                "constraints": constraints,
-                "scene_templates": scene_templates
+                "constraints": ctx['constraints'],
+                "scene_templates": ctx['scene_templates']
             },
             "product_context": {
-                "cupid_name": cupid_name,
-                "tranche": tranche,
-                "class_description": class_desc
+                "cupid_name": ctx['cupid_name'],
+                "tranche": ctx['tranche'],
+                "class_description": ctx['class_desc']
             },
-            "engine_version": self.engine_version
+            "engine_version": self.engine_version,
+            # Exact references so a finalize re-render can reproduce the draft
+            "reference_images": {
+                "urls": ctx['reference_urls'],
+                "sha256": [hashlib.sha256(b).hexdigest() for b in reference_images]
+            },
+            "timings": list(ctx['result']['timings']),
+            "usage": list(ctx['result']['usage'])
         }
         
-        for prompt_data in prompts:
+        image_size = self.draft_size if self.draft_mode else None
+        
+        requests = []
+        for index, prompt_data in enumerate(ctx['result']['prompts']):
             current_metadata = trace_metadata.copy()
             current_metadata['prompt_variation'] = prompt_data
-            
-            gen_result = self.generator.generate_and_save(
-                prompt=prompt_data['positive_prompt'],
-                negative_prompt=prompt_data['negative_prompt'],
-                tranche=tranche,
-                cupid_name=cupid_name,
-                reference_images=reference_images,
-                metadata=current_metadata
+            current_metadata['prompt_fingerprint'] = self._prompt_fingerprint(
+                prompt_data['positive_prompt'], prompt_data['negative_prompt']
             )
+            if self.draft_mode:
+                current_metadata['render_phase'] = 'draft'
+                current_metadata['target_image_size'] = self.final_size
+            if ctx.get('batch_id'):
+                current_metadata['idempotency_key'] = idempotency_key(
+                    ctx['batch_id'], ctx['cupid_name'], index,
+                    prompt_data['positive_prompt'], prompt_data['negative_prompt']
+                )
             
-            if gen_result['success']:
-                result['images'].append(gen_result['path'])
-                if verbose:
-                    print(f"    ✓ Saved: {gen_result['path']}")
-            else:
-                result['errors'].append(gen_result.get('error', 'Unknown error'))
-                if verbose:
-                    print(f"    ✗ Failed: {gen_result.get('error')}")
+            requests.append({
+                'prompt': prompt_data['positive_prompt'],
+                'negative_prompt': prompt_data['negative_prompt'],
+                'tranche': ctx['tranche'],
+                'cupid_name': ctx['cupid_name'],
+                'reference_images': reference_images,
+                'metadata': current_metadata,
+                'image_size': image_size
+            })
+        return requests
+    
+    def _record_generation(self, ctx: dict, gen_result: dict) -> None:
+        """Add one generate_and_save() result to the product result."""
+        result = ctx['result']
+        result['generations'].append(gen_result)
+        result['timings'].extend(generation_spans(gen_result))
+        record_usage(self.usage_ledger, ctx, [gen_result.get('usage')], image=gen_result.get('path'))
+        
+        result['cached_tokens'] += gen_result.get('cached_tokens', 0)
+        
+        if gen_result['success']:
+            result['images'].append(gen_result['path'])
+            if ctx['verbose']:
+                print(f"    ✓ Saved: {gen_result['path']} (cached tokens: {gen_result.get('cached_tokens', 0)})")
+        else:
+            result['errors'].append(gen_result.get('error', 'Unknown error'))
+            if ctx['verbose']:
+                print(f"    ✗ Failed: {gen_result.get('error')}")
+    
+    def _stage_audit(self, ctx: dict) -> dict:
+        """Step 6: Post-generation safety audit (if enabled)."""
+        result = ctx['result']
+        verbose = ctx['verbose']
+        
+        # The audit reads the saved files, so it needs them on disk first
+        if self.post_audit_enabled or not ctx['defer_flush']:
+            self.generator.flush()
+            reconcile_writes(result, verbose=verbose)
         
-        # Step 6: Post-generation audit (if enabled)
         if self.post_audit_enabled and result['images']:
             if verbose:
                 print(f"[V2][6/6] Running post-generation safety audit (Flash Check)")
@@ -280,6 +542,7 @@ class ProductImageryWorkflowV2:
             audit_results = []
             for image_path in result['images']:
                 audit = self.vision.audit_generated_image(image_path)
+                record_usage(self.usage_ledger, ctx, [audit.get('usage')], image=image_path)
                 audit_results.append({
                     'image': image_path,
                     'safe': audit.get('safe', True),
@@ -301,10 +564,440 @@ class ProductImageryWorkflowV2:
         else:
             if verbose:
                 print(f"[V2][6/6] Post-generation audit: Skipped")
+        return ctx
+    
+    def batch_run(
+        self,
+        product_ids: list[str],
+        verbose: bool = False,
+        stop_on_error: bool = False,
+        resume_batch_id: Optional[str] = None
+    ) -> dict:
+        """
+        Run V2 workflow for multiple products as a staged pipeline, journaled
+        and resumable with resume_batch_id (same as V1).
         
-        result['success'] = len(result['images']) > 0
+        Returns:
+            Batch result with summary, individual results and per-stage
+            pipeline metrics
+        """
+        batch_result = {
+            'total': len(product_ids),
+            'success': 0,
+            'failed': 0,
+            'results': [],
+            'engine_version': self.engine_version,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        journal, product_ids, finished = self._open_batch(product_ids, resume_batch_id)
+        if journal:
+            batch_result['total'] = len(product_ids)
+            batch_result['batch_id'] = journal.batch_id
+        pending_ids = [pid for pid in product_ids if pid not in finished]
+        
+        if verbose:
+            if journal:
+                print(f"Batch ID: {journal.batch_id} (resume with --resume {journal.batch_id})")
+            print(f"[V2] Processing {len(pending_ids)} products (pipelined), {len(finished)} already finished")
+        
+        results, metrics = run_batch_pipeline(
+            self,
+            pending_ids,
+            verbose=verbose,
+            stop_on_error=stop_on_error,
+            config=self.config.get('workflow', {}).get('pipeline'),
+            journal=journal
+        )
+        # Input order, with products finished by an earlier attempt in place
+        by_id = {r['product_id']: r for r in results}
+        batch_result['results'] = [
+            finished.get(pid) or by_id[pid] for pid in product_ids if pid in finished or pid in by_id
+        ]
+        batch_result['pipeline'] = metrics
+        batch_result['timing'] = summarize_timings(results)
+        batch_result['usage'] = summarize_usage(results, load_pricing(self.config))
+        if verbose:
+            print(format_timing_summary(batch_result['timing']))
+            print(format_usage_summary(batch_result['usage']))
+        batch_result['cached_tokens'] = sum(r.get('cached_tokens', 0) for r in results)
+        
+        # Flush barrier: all images and audit logs on disk before returning
+        self.generator.flush()
+        for result in batch_result['results']:
+            reconcile_writes(result, verbose=verbose)
+            if result['success']:
+                batch_result['success'] += 1
+            else:
+                batch_result['failed'] += 1
+        
+        if journal:
+            journal.record_end(batch_result)
+        return batch_result
+    
+    def iter_batch(
+        self,
+        product_ids: list[str],
+        verbose: bool = False,
+        stop_on_error: bool = False,
+        resume_batch_id: Optional[str] = None
+    ) -> Iterator[dict]:
+        """
+        Streaming batch_run(): yield 'image' and 'product' records as each
+        product finishes, then a 'batch' summary record (same as V1).
+        """
+        summary = {
+            'type': 'batch',
+            'total': len(product_ids),
+            'success': 0,
+            'failed': 0,
+            'images': 0,
+            'image_failures': 0,
+            'cached_tokens': 0,
+            'engine_version': self.engine_version,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        journal, product_ids, finished = self._open_batch(product_ids, resume_batch_id)
+        if journal:
+            summary['total'] = len(product_ids)
+            summary['batch_id'] = journal.batch_id
+        
+        for result in finished.values():
+            summary['success'] += 1
+            yield product_record(result)
+        
+        timing_stats = TimingStats()
+        usage_stats = UsageStats(load_pricing(self.config))
+        stream = iter_batch_pipeline(
+            self,
+            [pid for pid in product_ids if pid not in finished],
+            verbose=verbose,
+            stop_on_error=stop_on_error,
+            config=self.config.get('workflow', {}).get('pipeline'),
+            journal=journal
+        )
+        while True:
+            try:
+                result = next(stream)
+            except StopIteration as stop:
+                summary['pipeline'] = stop.value
+                break
+            timing_stats.add_result(result)
+            usage_stats.add_result(result)
+            
+            # The product's images are on disk before anything is reported
+            self.generator.flush()
+            reconcile_writes(result, verbose=verbose)
+            
+            for variation, gen_result in enumerate(result['generations'], start=1):
+                record = image_record(result, gen_result, variation)
+                summary['images' if record['success'] else 'image_failures'] += 1
+                yield record
+            summary['success' if result['success'] else 'failed'] += 1
+            summary['cached_tokens'] += result.get('cached_tokens', 0)
+            yield product_record(result)
+        
+        summary['timing'] = timing_stats.summary()
+        summary['usage'] = usage_stats.summary()
+        if verbose:
+            print(format_timing_summary(summary['timing']))
+            print(format_usage_summary(summary['usage']))
+        if journal:
+            journal.record_end(summary)
+        yield summary
+    
+    def _open_batch(
+        self,
+        product_ids: list[str],
+        resume_batch_id: Optional[str] = None
+    ) -> tuple[Optional[BatchJournal], list[str], dict[str, dict]]:
+        """Start or resume the batch journal (same as V1)."""
+        journal = open_batch_journal(
+            product_ids,
+            resume_batch_id=resume_batch_id,
+            config=self.config.get('workflow', {}).get('journal'),
+            engine=self.engine_version
+        )
+        finished = {}
+        if journal:
+            product_ids = journal.product_ids
+            for product_id in product_ids:
+                recorded = journal.finished_result(product_id)
+                if recorded:
+                    finished[product_id] = {'product_id': product_id, 'resumed': True, **recorded}
+        return journal, product_ids, finished
+    
+    async def abatch_run(
+        self,
+        product_ids: list[str],
+        verbose: bool = False,
+        stop_on_error: bool = False,
+        max_concurrency: Optional[int] = None
+    ) -> dict:
+        """Async batch_run() with bounded concurrency and cancellation (same as V1)."""
+        if max_concurrency is None:
+            max_concurrency = self.config.get('workflow', {}).get('async_batch', {}).get('max_concurrency', 8)
+        batch_result = await abatch_run_workflow(
+            self, product_ids, max_concurrency=max_concurrency,
+            verbose=verbose, stop_on_error=stop_on_error
+        )
+        batch_result['engine_version'] = self.engine_version
+        batch_result['cached_tokens'] = sum(r.get('cached_tokens', 0) for r in batch_result['results'])
+        return batch_result
+    
+    def run_by_tranche(
+        self,
+        tranche: str,
+        limit: Optional[int] = None,
+        verbose: bool = False
+    ) -> dict:
+        """Run V2 workflow for all products in a tranche."""
+        products = self.data.get_products_by_tranche(tranche, limit=limit)
+        product_ids = [p['cupidName'] for p in products if p.get('cupidName')]
+        
+        if verbose:
+            print(f"Found {len(product_ids)} products in {tranche}")
+        
+        return self.batch_run(product_ids, verbose=verbose)
+    
+    def run_by_class(
+        self,
+        class_description: str,
+        limit: Optional[int] = None,
+        verbose: bool = False
+    ) -> dict:
+        """Run V2 workflow for all products in a class."""
+        products = self.data.get_products_by_class(class_description, limit=limit)
+        product_ids = [p['cupidName'] for p in products if p.get('cupidName')]
+        
+        if verbose:
+            print(f"Found {len(product_ids)} products in {class_description}")
+        
+        return self.batch_run(product_ids, verbose=verbose)
+    
+    @staticmethod
+    def _prompt_fingerprint(positive_prompt: str, negative_prompt: str) -> str:
+        """Stable identifier of a prompt pair, used for draft/final lineage."""
+        digest = hashlib.sha256(f"{positive_prompt}\0{negative_prompt}".encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    def finalize(self, cupid_name: str, verbose: bool = False) -> dict:
+        """
+        Re-render a product's unfinalized drafts at the target size.
+        
+        Each draft is rendered again with the prompt, scene and reference
+        images recorded in its audit log. The final image's log carries a
+        'lineage' block pointing at the draft, and the draft's log gains a
+        'finalized_as' pointer. Drafts older than the product's latest final
+        render are left alone.
+        
+        Returns:
+            Result dict with 'images' (final paths) and 'errors'
+        """
+        result = {
+            'cupid_name': cupid_name,
+            'success': False,
+            'images': [],
+            'errors': [],
+            'engine_version': self.engine_version,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        drafts = []
+        for log_path, audit in product_render_logs(self.generator.output_base, cupid_name):
+            if audit.get('render_phase') == 'final':
+                # Already has a final render; only later drafts need one
+                drafts = []
+            elif audit.get('render_phase') == 'draft' and not audit.get('finalized_as'):
+                drafts.append((log_path, audit))
+        
+        if not drafts:
+            result['no_drafts'] = True
+            return result
+        
+        if verbose:
+            print(f"[V2][finalize] {cupid_name}: {len(drafts)} draft(s) -> {self.final_size}")
+        
+        fetched = {}
+        for log_path, draft in drafts:
+            gen_result = self._rerender_from_log(
+                log_path, draft, image_size=self.final_size, render_phase='final', fetched=fetched
+            )
+            
+            if not gen_result['success']:
+                result['errors'].append(f"{log_path.name}: {gen_result.get('error', 'Unknown error')}")
+                if verbose:
+                    print(f"    ✗ Failed: {log_path.name}: {gen_result.get('error')}")
+                continue
+            
+            draft['finalized_as'] = {
+                'image': gen_result['path'],
+                'log': gen_result['metadata_path'],
+                'image_size': self.final_size,
+                'finalized_at': datetime.now().isoformat()
+            }
+            atomic_write_json(log_path, draft)
+            result['images'].append(gen_result['path'])
+            if verbose:
+                print(f"    ✓ {draft.get('image_file')} -> {gen_result['path']}")
+        
+        result['success'] = len(result['images']) > 0 and not result['errors']
         return result
     
+    def process_finalize_queue(self, cupid_name: Optional[str] = None, verbose: bool = False) -> dict:
+        """
+        Run pending finalize jobs queued by FeedbackManager approvals.
+        
+        Returns:
+            Summary dict with 'total', 'success', 'failed' and 'results'
+        """
+        queue = self.feedback.render_queue
+        jobs = queue.pending('finalize', cupid_name)
+        summary = {'total': len(jobs), 'success': 0, 'failed': 0, 'results': []}
+        
+        for job in jobs:
+            result = self.finalize(job['cupid_name'], verbose=verbose)
+            summary['results'].append(result)
+            if result.get('no_drafts'):
+                # Nothing left to promote (already finalized or not a draft run)
+                queue.mark_done(job['job_id'], {'images': [], 'note': 'no unfinalized drafts'})
+                summary['success'] += 1
+            elif result['success']:
+                queue.mark_done(job['job_id'], {'images': result['images']})
+                summary['success'] += 1
+            else:
+                queue.mark_failed(job['job_id'], "; ".join(result['errors']))
+                summary['failed'] += 1
+        
+        return summary
+    
+    def _rerender_from_log(
+        self,
+        log_path: Path,
+        audit: dict,
+        image_size: str,
+        render_phase: str,
+        fetched: Optional[dict] = None
+    ) -> dict:
+        """
+        Render an image again on the primary model from its audit log.
+        
+        Uses the logged prompt pair, scene/governance trace and reference
+        URLs, and records lineage back to the source image.
+        
+        Returns:
+            generate_and_save result (already flushed to disk)
+        """
+        fetched = fetched if fetched is not None else {}
+        prompts = audit.get('prompts', {})
+        positive = prompts.get('positive', '')
+        negative = prompts.get('negative', '')
+        
+        fingerprint = self._prompt_fingerprint(positive, negative)
+        if audit.get('prompt_fingerprint') and audit['prompt_fingerprint'] != fingerprint:
+            return {'success': False, 'error': 'Prompt fingerprint mismatch'}
+        
+        # Same references as the source; flag drift if Scene7 content changed
+        refs = audit.get('reference_images', {})
+        reference_images = []
+        for url in refs.get('urls', []):
+            if url not in fetched:
+                fetched[url] = self.vision.fetch_image(url)
+            if fetched[url]:
+                reference_images.append(fetched[url])
+        reference_drift = [hashlib.sha256(b).hexdigest() for b in reference_images] != refs.get('sha256', [])
+        
+        tranche = audit.get('tranche', 'Unknown')
+        metadata = {
+            key: audit[key]
+            for key in ('vision_analysis', 'governance', 'product_context', 'prompt_variation', 'reference_images')
+            if key in audit
+        }
+        metadata.update({
+            'engine_version': self.engine_version,
+            'prompt_fingerprint': fingerprint,
+            'render_phase': render_phase,
+            'lineage': {
+                'parent_image': f"{tranche}/{audit.get('image_file', '')}",
+                'parent_log': str(log_path),
+                'parent_model': audit.get('model_id', audit.get('model')),
+                'parent_image_size': audit.get('image_size'),
+                'prompt_fingerprint': fingerprint,
+                'reference_drift': reference_drift,
+            }
+        })
+        
+        gen_result = self.generator.generate_and_save(
+            prompt=positive,
+            negative_prompt=negative,
+            tranche=tranche,
+            cupid_name=audit.get('cupid_name', ''),
+            reference_images=reference_images,
+            metadata=metadata,
+            image_size=image_size,
+            allow_fallback=False
+        )
+        self.generator.flush()
+        return gen_result
+    
+    def process_rerender_queue(self, cupid_name: Optional[str] = None, verbose: bool = False) -> dict:
+        """
+        Re-render fallback-model images on the primary model.
+        
+        Stops early while the primary model is still unhealthy, leaving the
+        remaining jobs queued for a later run.
+        
+        Returns:
+            Summary dict with 'total', 'success', 'failed', 'deferred' and 'results'
+        """
+        queue = self.feedback.render_queue
+        jobs = queue.pending('rerender_primary', cupid_name)
+        summary = {'total': len(jobs), 'success': 0, 'failed': 0, 'deferred': 0, 'results': []}
+        router = self.generator.router
+        
+        for i, job in enumerate(jobs):
+            reason = router.unhealthy_reason(router.primary_model)
+            if reason:
+                summary['deferred'] = len(jobs) - i
+                if verbose:
+                    print(f"[V2][rerender] Primary model {reason}; deferring {summary['deferred']} job(s)")
+                break
+            
+            log_path = Path(job['payload'].get('log', ''))
+            if not log_path.exists():
+                queue.mark_done(job['job_id'], {'note': 'source log missing'})
+                continue
+            
+            with open(log_path) as f:
+                audit = json.load(f)
+            
+            # Keep the size the fallback image was requested at
+            image_size = audit.get('image_size') or self.generator.image_size
+            gen_result = self._rerender_from_log(log_path, audit, image_size=image_size,
+                                                 render_phase=audit.get('render_phase', 'rerender'))
+            summary['results'].append(gen_result)
+            
+            if gen_result['success']:
+                audit['rerendered_as'] = {
+                    'image': gen_result['path'],
+                    'log': gen_result['metadata_path'],
+                    'model': router.primary_model,
+                    'rerendered_at': datetime.now().isoformat()
+                }
+                atomic_write_json(log_path, audit)
+                queue.mark_done(job['job_id'], {'image': gen_result['path']})
+                summary['success'] += 1
+                if verbose:
+                    print(f"    ✓ {log_path.name} -> {gen_result['path']}")
+            else:
+                queue.mark_failed(job['job_id'], gen_result.get('error', 'Unknown error'))
+                summary['failed'] += 1
+                if verbose:
+                    print(f"    ✗ Failed: {log_path.name}: {gen_result.get('error')}")
+        
+        return summary
+    
     def _enhance_with_semantic_context(
         self, 
         constraints: dict, 
@@ -319,7 +1012,9 @@ class ProductImageryWorkflowV2:
             "product prominently displayed",
             "entire product visible in frame",
         ]
-        constraints['required_elements'].extend(visibility_requirements)
+        # Layer onto the shared class snapshot
+        constraints = dict(constraints)
+        constraints['required_elements'] = tuple(constraints['required_elements']) + tuple(visibility_requirements)
         
         constraints['semantic_requirements'] = {
             'product_fully_visible': True,
@@ -0,0 +1,190 @@
+"""
+Write-Behind Persistence for AI Product Imagery Workflow
+
+Moves image and audit-log writes off the generation thread onto a
+background worker so the next variation can start while the previous one
+is still being persisted. All writes are atomic (temp file + rename), so a
+reader never sees a half-written image or log.
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write bytes to path via a temp file in the same directory and rename."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_json(path: Path, data: dict, indent: Optional[int] = 2) -> None:
+    """Serialize data as JSON and write it atomically."""
+    atomic_write_bytes(path, json.dumps(data, indent=indent).encode('utf-8'))
+
+
+def reconcile_writes(result: dict, verbose: bool = False) -> None:
+    """
+    Apply write-behind outcomes to a workflow run result after a flush.
+
+    Images whose files failed to persist are dropped from 'images' and
+    their save error is recorded.
+    """
+    for gen_result in result.get('generations', []):
+        if gen_result.get('persisted') is False and gen_result.get('path') in result['images']:
+            result['images'].remove(gen_result['path'])
+            result['errors'].append(gen_result.get('error', 'Failed to save'))
+            if verbose:
+                print(f"    ✗ Write failed: {gen_result['path']}: {gen_result.get('error')}")
+
+    result['success'] = len(result['images']) > 0
+
+
+class WriteBehindQueue:
+    """
+    Bounded background queue of file writes.
+
+    - Back-pressure: submit() blocks once max_pending jobs are queued
+    - Flush barrier: flush() waits until every submitted job has finished
+    - Failure reporting: each job's on_done callback receives the exception
+      (or None), and flush() returns the failures since the last flush
+    """
+
+    def __init__(self, max_pending: int = 8, enabled: bool = True):
+        """
+        Initialize write-behind queue.
+
+        Args:
+            max_pending: Maximum queued jobs before submit() blocks
+            enabled: If False, writes run synchronously on the caller's thread
+        """
+        self.enabled = enabled
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+        self._created_dirs: set[Path] = set()
+        self._failures: list[dict] = []
+        self._failures_lock = threading.Lock()
+
+    def submit(
+        self,
+        writes: list[tuple[Path, Union[bytes, dict]]],
+        on_done: Optional[Callable[[Optional[Exception]], None]] = None,
+        prepare: Optional[Callable[[list], list]] = None
+    ) -> None:
+        """
+        Queue a group of writes, performed in order on the worker.
+
+        Args:
+            writes: (path, payload) pairs; bytes are written raw, dicts as JSON
+            on_done: Called with None on success or the exception on failure
+            prepare: Optional transform run on the worker before writing
+                (e.g. transcoding), receiving and returning the writes list
+        """
+        job = (list(writes), on_done, prepare)
+        if not self.enabled:
+            self._run_job(job)
+            return
+
+        self._ensure_worker()
+        self._queue.put(job)
+
+    def flush(self) -> list[dict]:
+        """
+        Block until all queued writes are persisted.
+
+        Returns:
+            List of {'paths', 'error'} dicts for writes that failed since the
+            previous flush
+        """
+        if self.enabled and self._worker:
+            self._queue.join()
+
+        with self._failures_lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs waiting for the worker."""
+        return self._queue.qsize()
+
+    def _ensure_worker(self) -> None:
+        """Start the background worker on first use."""
+        with self._worker_lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(
+                target=self._worker_loop,
+                name="write-behind",
+                daemon=True
+            )
+            self._worker.start()
+
+    def _worker_loop(self) -> None:
+        """Persist queued jobs forever."""
+        while True:
+            job = self._queue.get()
+            try:
+                self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job: tuple) -> None:
+        """Perform one job's writes and report the outcome."""
+        writes, on_done, prepare = job
+        error = None
+        try:
+            if prepare:
+                writes = prepare(writes)
+            for path, payload in writes:
+                path = Path(path)
+                self._ensure_dir(path.parent)
+                if isinstance(payload, dict):
+                    atomic_write_json(path, payload)
+                else:
+                    atomic_write_bytes(path, payload)
+        except Exception as e:
+            error = e
+            with self._failures_lock:
+                self._failures.append({
+                    'paths': [str(p) for p, _ in writes],
+                    'error': str(e)
+                })
+
+        if on_done:
+            try:
+                on_done(error)
+            except Exception as e:
+                print(f"Warning: write-behind callback failed: {e}")
+
+    def _ensure_dir(self, directory: Path) -> None:
+        """mkdir once per directory for the life of the queue."""
+        if directory in self._created_dirs:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        self._created_dirs.add(directory)
+
+
+def create_write_behind_queue(config: Optional[dict] = None) -> WriteBehindQueue:
+    """Factory function to create WriteBehindQueue from output.write_behind config."""
+    config = config or {}
+    return WriteBehindQueue(
+        max_pending=int(config.get('max_pending', 8)),
+        enabled=config.get('enabled', True)
+    )